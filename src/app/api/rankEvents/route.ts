@@ -480,6 +480,51 @@ if (vendorPrefsLowerCategory.size > 0 && eventTagsLowerCategory.length > 0) {
 };
 
 
+// --- Precomputed Rankings ---
+// The scraper's scoring job (src/utils/scraper/scoring.py) scores every vendor against
+// every upcoming eventsFormatted doc in batch with the same factors as calculateEventScore,
+// and keeps each vendor's top list in vendorEventRankings/{vendorId} as
+// { lastRanked, rankedEvents: [{ id, score, scoreBreakdown }] }.
+// Returns those events shaped like the per-request path below, or null when the
+// vendor hasn't been ranked yet.
+const toJsonTimestamp = (value: unknown) =>
+    value instanceof Timestamp ? { seconds: value.seconds, nanoseconds: value.nanoseconds } : null;
+
+interface PrecomputedRanking {
+    id: string;
+    score: number;
+    scoreBreakdown: ScoreBreakdown;
+}
+
+async function loadPrecomputedRankings(vendorId: string) {
+    const rankingDoc = await adminDb.collection("vendorEventRankings").doc(vendorId).get();
+    const ranked = rankingDoc.data()?.rankedEvents as PrecomputedRanking[] | undefined;
+    // Lists written before the job stored breakdowns are scored per request until it reruns
+    if (!Array.isArray(ranked) || ranked.length === 0 || !ranked.every(item => item.scoreBreakdown)) {
+        return null;
+    }
+
+    const eventDocs = await adminDb.getAll(
+        ...ranked.map(item => adminDb.collection("eventsFormatted").doc(item.id))
+    );
+    return eventDocs
+        .map((doc, i) => ({ doc, ranking: ranked[i] }))
+        .filter(({ doc }) => doc.exists) // deleted since the last scoring run
+        .map(({ doc, ranking }) => {
+            const { id: _, ...data } = doc.data() as EventFormatted;
+            return {
+                ...data,
+                id: doc.id,
+                score: ranking.score,
+                startDate: toJsonTimestamp(data.startDate),
+                endDate: toJsonTimestamp(data.endDate),
+                timestamp: toJsonTimestamp(data.timestamp),
+                scoreBreakdown: ranking.scoreBreakdown,
+            };
+        });
+}
+
+
 // --- API Route Handler (POST) ---
 // --- API Route Handler (POST) ---
 export async function POST(request: Request) {
@@ -511,6 +556,13 @@ export async function POST(request: Request) {
      }
 
 
+    // Use the batch rankings when the scoring job has ranked this vendor,
+    // scoring events per request below is the fallback for vendors it hasn't reached yet
+    const precomputed = await loadPrecomputedRankings(vendorId);
+    if (precomputed) {
+      return NextResponse.json({ rankedEvents: precomputed });
+    }
+
     // Get all events
     // Consider adding filtering here (e.g., future events, location proximity) for efficiency
     const eventsSnapshot = await adminDb.collection("eventsFormatted").limit(10).get();
@@ -64,7 +64,7 @@ export const EventCard: React.FC<EventCardProps> = ({
         <div className="image-container">
           {event.image ? (
             <Image
-              src={event.image}
+              src={event.thumbnail || event.image}
               alt={event.name}
               layout="fill"
               objectFit="cover"
@@ -78,7 +78,7 @@ export function EventCardHost({ event, rank, showRank }: EventProps) {
       >
         {event.image ? (
           <img
-            src={event.image}
+            src={event.thumbnail || event.image}
             alt={event.name}
             style={{ width: "100%", height: "100%", objectFit: "cover" }}
           />
@@ -2,6 +2,7 @@ export interface Event {
   id: string;
   name: string;
   image: string;
+  thumbnail?: string;
   location: {
     city: string;
     state: string;
@@ -1,7 +1,52 @@
 import argparse
+import json
+import math
+import time
+from collections import Counter
+from datetime import datetime, timezone
 
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from batch_writer import BatchWriter
+from dates import parse_event_date
+from fingerprint import field_hash, fingerprint
+from geocoder import geohash, make_geocoder, place_key
+from images import make_image_ingest
+from metrics import metrics
+from sinks import STAGING_SQLITE_PATH, FirestoreSink, open_staging, sync_staged
+
+
+# the only fields check_firebase prints, nothing else is read
+CHECK_FIELDS = ["name", "location", "date", "category"]
+
+# documents per cursor page when listing
+CHECK_PAGE_SIZE = 300
+
+# document refs per cursor page when deleting, each page is one batch
+DELETE_PAGE_SIZE = 500
+
+# delete batches committed at once
+DELETE_WORKERS = 16
+
+# what normalize_dates reads, the date string plus what to keep fingerprints right
+DATE_FIELDS = ["date", "source", "fieldHashes"]
+
+# events still holding the {"seconds": 0} placeholder, a real timestamp has
+# no startDate.seconds field so those never match
+UNPARSED_FILTER = ("startDate.seconds", "==", 0)
+
+# what geocode_events reads
+GEOCODE_FIELDS = ["location", "geohash", "fieldHashes"]
+
+# what thumbnail_events reads
+THUMBNAIL_FIELDS = ["image", "thumbnail", "fieldHashes"]
+
+# filters firestore adds to the query's order by, a start_after() cursor then
+# needs those fields' values from the last document
+INEQUALITY_OPS = {"<", "<=", ">", ">=", "!=", "not-in"}
 
 
 def init_firebase_admin():
@@ -19,12 +64,56 @@ class FirebaseOperations:
         self.db = firestore.client()
         self.events_ref = self.db.collection("events")
 
-    def check_firebase(self):
-        docs = self.events_ref.stream()
+    # filters = [(field, op, value)], e.g. [("location.state", "==", "NY")]
+    def _query(self, filters=()):
+        query = self.events_ref
+        for field, op, value in filters:
+            query = query.where(filter=FieldFilter(field, op, value))
+        return query
+
+    # _query projected to fields, plus any inequality filtered field so _pages
+    # can build its cursor from the last document of a page
+    def _select(self, filters, fields):
+        ordered = [field for field, op, _ in filters if op in INEQUALITY_OPS]
+        return self._query(filters).select(list(dict.fromkeys([*fields, *ordered])))
+
+    # aggregation query, counted on the server without reading the documents
+    def count_events(self, filters=()):
+        result = self._query(filters).count(alias="count").get()
+        count = result[0][0].value
+        # billed one read per 1000 index entries
+        metrics.inc("firestore_reads_total", max(1, math.ceil(count / 1000)), op="count")
+        return count
+
+    # one cursor page of documents at a time, so only a page is ever held in
+    # memory and no stream stays open for the whole run
+    def _pages(self, query, limit=None, page_size=CHECK_PAGE_SIZE, op="check"):
+        last = None
+        listed = 0
+        while limit is None or listed < limit:
+            size = page_size if limit is None else min(page_size, limit - listed)
+            page = query.limit(size)
+            if last is not None:
+                page = page.start_after(last)
+            docs = list(page.stream())
+            metrics.inc("firestore_reads_total", len(docs), op=op)
+            if docs:
+                yield docs
+            listed += len(docs)
+            if len(docs) < size:
+                break
+            last = docs[-1]
+
+    # projected to the printed fields
+    def list_events(self, limit=None, filters=(), page_size=CHECK_PAGE_SIZE):
+        query = self._select(filters, CHECK_FIELDS)
+        for docs in self._pages(query, limit, page_size):
+            yield from docs
 
+    def check_firebase(self, limit=None, filters=()):
         print("Events in database:")
         print("")
-        for doc in docs:
+        for doc in self.list_events(limit, filters):
             event_data = doc.to_dict()
             print(f"Document ID: {doc.id}")
             print(f"Name: {event_data.get('name')}")
@@ -33,24 +122,138 @@ class FirebaseOperations:
             print(f"Categories: {event_data.get('category')}")
             print("")
 
-        events_count = len(list(self.events_ref.stream()))
+        events_count = self.count_events(filters)
         print(f"Total events found: {events_count}")
         return events_count
 
+    # push a local staging run (SCRAPER_SINK=sqlite/jsonl) into the events
+    # collection, only new events and changed fields are written, then the
+    # vendor rankings pick up whatever the sync wrote
+    def sync_staging(self, staging_path=STAGING_SQLITE_PATH):
+        from scoring import score_events
+
+        started = datetime.now(timezone.utc)
+        with open_staging(staging_path) as staging, FirestoreSink(self.db) as target:
+            counts = sync_staged(staging, target)
+        score_events(self.db, since=started)
+        return counts
+
+    # backfill startDate/endDate on events stored before ingest parsed dates
+    # fieldHashes/fingerprint are patched too so the next scrape sees them as unchanged
+    def normalize_dates(self, filters=(), page_size=DELETE_PAGE_SIZE):
+        query = self._select([*filters, UNPARSED_FILTER], DATE_FIELDS)
+        counts = Counter()
+        with BatchWriter(self.db, chunk_size=page_size, label="date updates") as writer:
+            for docs in self._pages(query, page_size=page_size, op="normalize_dates"):
+                for doc in docs:
+                    data = doc.to_dict()
+                    start, end = parse_event_date(data.get("date"), data.get("source"))
+                    if start is None:
+                        counts["unparsed"] += 1
+                        continue
+                    update = {"startDate": start, "endDate": end or start}
+                    writer.update(doc.reference, _with_hashes(data, update))
+                    counts["updated"] += 1
+        print(f"Parsed dates for {counts['updated']} events, {counts['unparsed']} unparseable")
+        return counts
+
+    # backfill geo/geohash on events stored before ingest geocoded them, one
+    # batch of lookups per page for the places the geocoder hasnt seen yet
+    def geocode_events(self, filters=(), page_size=DELETE_PAGE_SIZE):
+        geocoder = make_geocoder()
+        if geocoder is None:
+            print("Geocoder is off (SCRAPER_GEOCODER=off)")
+            return Counter()
+        query = self._select(filters, GEOCODE_FIELDS)
+        counts = Counter()
+        writer = BatchWriter(self.db, chunk_size=page_size, label="geocode updates")
+        with geocoder, writer:
+            for docs in self._pages(query, page_size=page_size, op="geocode"):
+                pending = []
+                for doc in docs:
+                    data = doc.to_dict()
+                    if data.get("geohash"):
+                        counts["skipped"] += 1
+                    else:
+                        pending.append((doc, data, place_key(data.get("location"))))
+                places = geocoder.geocode_many(key for _, _, key in pending)
+                for doc, data, key in pending:
+                    coordinates = places.get(key)
+                    if coordinates is None:
+                        counts["unresolved"] += 1
+                        continue
+                    lat, lng = coordinates
+                    update = {"geo": {"lat": lat, "lng": lng}, "geohash": geohash(lat, lng)}
+                    writer.update(doc.reference, _with_hashes(data, update))
+                    counts["updated"] += 1
+        print(
+            f"Geocoded {counts['updated']} events, {counts['unresolved']} unresolved, "
+            f"{counts['skipped']} already had a geohash"
+        )
+        return counts
+
+    # backfill thumbnails on events stored before ingest made them, each page's
+    # images are downloaded together, urls seen before cost nothing
+    def thumbnail_events(self, filters=(), page_size=DELETE_PAGE_SIZE):
+        images = make_image_ingest()
+        if images is None:
+            print("Thumbnails are off (SCRAPER_THUMBNAILS=off or no Pillow)")
+            return Counter()
+        query = self._select(filters, THUMBNAIL_FIELDS)
+        counts = Counter()
+        writer = BatchWriter(self.db, chunk_size=page_size, label="thumbnail updates")
+        with images, writer:
+            for docs in self._pages(query, page_size=page_size, op="thumbnails"):
+                pending = []
+                for doc in docs:
+                    data = doc.to_dict()
+                    if data.get("thumbnail") or not data.get("image"):
+                        counts["skipped"] += 1
+                    else:
+                        pending.append((doc, data))
+                paths = images.thumbnail_many(data["image"] for _, data in pending)
+                for doc, data in pending:
+                    path = paths.get(data["image"])
+                    if not path:
+                        counts["failed"] += 1
+                        continue
+                    writer.update(doc.reference, _with_hashes(data, {"thumbnail": path}))
+                    counts["updated"] += 1
+        print(
+            f"Made thumbnails for {counts['updated']} events, {counts['failed']} failed, "
+            f"{counts['skipped']} had one or no image"
+        )
+        return counts
+
     # NOTE: delete later maybe, need now when schema and stuff changing a lot
-    def empty_firebase_events(self):
+    # pages through document refs only (projected to the document id and any
+    # inequality filtered field, an empty select() would return every field)
+    # and deletes each page as its own batch, batches commit in parallel
+    # filters narrow it down, e.g. [("source", "==", "zapp")]
+    # total is count_events(filters) when the caller already has it
+    def empty_firebase_events(self, filters=(), page_size=DELETE_PAGE_SIZE, total=None):
         try:
-            docs = self.events_ref.stream()
-
-            batch = self.db.batch()
-            count = 0
+            if total is None:
+                total = self.count_events(filters)
+            query = self._select(filters, [FieldPath.document_id()])
+            started = time.monotonic()
+            queued = 0
 
-            for doc in docs:
-                batch.delete(self.events_ref.document(doc.id))
-                count += 1
+            with BatchWriter(
+                self.db, chunk_size=page_size, max_workers=DELETE_WORKERS, label="deletes"
+            ) as writer:
+                for docs in self._pages(query, page_size=page_size, op="empty_events"):
+                    for doc in docs:
+                        writer.delete(doc.reference)
+                    queued += len(docs)
+                    elapsed = time.monotonic() - started
+                    print(
+                        f"Queued {queued}/{total} deletes, {writer.committed} done "
+                        f"({writer.committed / elapsed if elapsed else 0:.0f}/s)"
+                    )
+            count = writer.committed
 
             if count > 0:
-                batch.commit()
                 print(f"Successfully deleted {count} events from database")
             else:
                 print("No events found to delete")
@@ -62,30 +265,109 @@ class FirebaseOperations:
             return 0
 
 
+# update plus fieldHashes/fingerprint patched to match, so the next scrape of
+# the event doesnt see the backfilled fields as changed
+def _with_hashes(data, update):
+    hashes = data.get("fieldHashes")
+    if not hashes:
+        return update
+    hashes = {**hashes, **{field: field_hash(value) for field, value in update.items()}}
+    return {**update, "fieldHashes": hashes, "fingerprint": fingerprint(hashes)}
+
+
+# "location.state == NY" -> ("location.state", "==", "NY"), values are json
+# when they parse as json so numbers/booleans/lists work too
+def parse_filter(text):
+    field, op, value = text.split(None, 2)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return field, op, value
+
+
+# "2025-04-01" or a full iso timestamp, utc unless it says otherwise
+def parse_date(text):
+    value = datetime.fromisoformat(text)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def build_filters(args):
+    filters = list(args.where)
+    if args.source:
+        filters.append(("source", "==", args.source))
+    if args.scraped_after:
+        filters.append(("scrapedAt", ">=", args.scraped_after))
+    if args.scraped_before:
+        filters.append(("scrapedAt", "<", args.scraped_before))
+    return filters
+
+
 """
 to mimic node command calling
 easier
 Start venv and run these
 python3 FirebaseOperations.py check
-python3 FirebaseOperations.py check
+python3 FirebaseOperations.py check --limit 20 --where "location.state == NY"
+python3 FirebaseOperations.py empty_events --source zapp --scraped-before 2025-05-01
+python3 FirebaseOperations.py sync --staging ./.scraper_cache/staging.jsonl
+python3 FirebaseOperations.py dates --source eventbrite
+SCRAPER_GEOCODER=gazetteer python3 FirebaseOperations.py geocode
+SCRAPER_THUMBNAILS=storage python3 FirebaseOperations.py thumbnails --source eventbrite
 """
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Firebase Operations")
     parser.add_argument(
         "operation",
-        choices=["check", "empty_events"],
-        help="Operation to perform (check: view events, empty: delete all events)",
+        choices=["check", "empty_events", "sync", "dates", "geocode", "thumbnails"],
+        help="Operation to perform (check: view events, empty: delete all events, "
+        "sync: push staged events, dates: parse startDate/endDate for old events, "
+        "geocode: add geohashes to old events, thumbnails: make thumbnails for old events)",
+    )
+    parser.add_argument("--limit", type=int, help="check: list at most this many events")
+    parser.add_argument(
+        "--where",
+        action="append",
+        type=parse_filter,
+        default=[],
+        help='check/empty_events/dates/geocode/thumbnails: filter like "location.state == NY", '
+        "can repeat",
+    )
+    parser.add_argument("--source", help="only events from eventeny, eventbrite or zapp")
+    parser.add_argument("--scraped-after", type=parse_date, help="only events scraped since")
+    parser.add_argument("--scraped-before", type=parse_date, help="only events scraped before")
+    parser.add_argument(
+        "--staging",
+        default=STAGING_SQLITE_PATH,
+        help="staging store for sync, .sqlite or .jsonl",
     )
 
     args = parser.parse_args()
 
     firebase_ops = FirebaseOperations()
 
+    filters = build_filters(args)
+
     if args.operation == "check":
-        firebase_ops.check_firebase()
+        firebase_ops.check_firebase(args.limit, filters)
+    elif args.operation == "sync":
+        firebase_ops.sync_staging(args.staging)
+    elif args.operation == "dates":
+        firebase_ops.normalize_dates(filters)
+    elif args.operation == "geocode":
+        firebase_ops.geocode_events(filters)
+    elif args.operation == "thumbnails":
+        firebase_ops.thumbnail_events(filters)
     elif args.operation == "empty_events":
-        confirmation = input("Are you sure, DELETING ALL EVENTS?! (yes/no): ")
+        matching = firebase_ops.count_events(filters)
+        if filters:
+            question = f"Are you sure, DELETING {matching} EVENTS matching {filters}?!"
+        else:
+            question = f"Are you sure, DELETING ALL {matching} EVENTS?!"
+        confirmation = input(f"{question} (yes/no): ")
         if confirmation.lower() == "yes":
-            firebase_ops.empty_firebase_events()
+            firebase_ops.empty_firebase_events(filters, total=matching)
         else:
             print("Operation cancelled.")
+
+    metrics.write_report()
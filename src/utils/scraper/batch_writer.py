@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# firestore rejects batches with more operations than this
+MAX_BATCH_SIZE = 500
+
+
+class BatchWriter:
+    """
+    Queues set/update/delete calls and commits them in chunks of chunk_size
+    chunks are committed on a thread pool with at most max_workers in flight,
+    failed chunks are retried with exponential backoff
+    use as: with BatchWriter(db) as writer: writer.set(ref, data)
+    """
+
+    def __init__(
+        self,
+        db,
+        chunk_size=MAX_BATCH_SIZE,
+        max_workers=8,
+        max_retries=5,
+        flush_interval=None,
+        label="writes",
+    ):
+        self.db = db
+        self.chunk_size = min(chunk_size, MAX_BATCH_SIZE)
+        self.max_retries = max_retries
+        # seconds, commit a partial chunk this often so writes show up early
+        self.flush_interval = flush_interval
+        self.label = label
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # caps queued chunks too, so a fast producer cant pile up memory
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._futures = []
+        self._lock = threading.Lock()
+        self.committed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_submit = self.started
+        self._pending_lock = threading.Lock()
+        self._closed = threading.Event()
+        if flush_interval is not None:
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def set(self, ref, data, merge=False):
+        self._add(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self._add(("update", ref, data, None))
+
+    def delete(self, ref):
+        self._add(("delete", ref, None, None))
+
+    def _add(self, op):
+        with self._pending_lock:
+            self._pending.append(op)
+            if len(self._pending) >= self.chunk_size:
+                self._submit()
+
+    # so events show up in the app even when the producer goes quiet for a while
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._pending_lock:
+                stale = time.monotonic() - self._last_submit >= self.flush_interval
+                if self._pending and stale:
+                    self._submit()
+
+    # caller holds _pending_lock
+    def _submit(self):
+        chunk, self._pending = self._pending, []
+        self._last_submit = time.monotonic()
+        self._slots.acquire()
+        self._futures.append(self._executor.submit(self._commit_chunk, chunk))
+
+    def _commit_chunk(self, chunk):
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    batch = self.db.batch()
+                    for kind, ref, data, merge in chunk:
+                        if kind == "set":
+                            batch.set(ref, data, merge=merge)
+                        elif kind == "update":
+                            batch.update(ref, data)
+                        else:
+                            batch.delete(ref)
+                    batch.commit()
+                    metrics.observe(
+                        "batch_commit_seconds", time.perf_counter() - started, label=self.label
+                    )
+                    self._record(len(chunk), 0)
+                    return True
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        print(f"Giving up on chunk of {len(chunk)} {self.label}: {e}")
+                        self._record(0, len(chunk))
+                        return False
+                    delay = min(30, 2**attempt) + random.uniform(0, 1)
+                    print(f"Chunk commit failed ({e}), retrying in {delay:.1f}s")
+                    metrics.inc("batch_commit_retries_total", label=self.label)
+                    metrics.inc("sleep_seconds_total", delay, reason="batch_retry")
+                    time.sleep(delay)
+        finally:
+            self._slots.release()
+
+    def _record(self, committed, failed):
+        if committed:
+            metrics.inc("firestore_writes_total", committed, label=self.label)
+        if failed:
+            metrics.inc("firestore_write_failures_total", failed, label=self.label)
+        with self._lock:
+            self.committed += committed
+            self.failed += failed
+            elapsed = time.monotonic() - self.started
+            rate = self.committed / elapsed if elapsed else 0
+            print(f"{self.committed} {self.label} committed ({rate:.0f}/s)")
+
+    # commit whatever is queued and wait for every chunk to land
+    def flush(self):
+        with self._pending_lock:
+            if self._pending:
+                self._submit()
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return self.committed
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+        self._executor.shutdown()
+        elapsed = time.monotonic() - self.started
+        if self.committed or self.failed:
+            print(
+                f"Done: {self.committed} {self.label} committed, {self.failed} failed "
+                f"in {elapsed:.1f}s"
+            )
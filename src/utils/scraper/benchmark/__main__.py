@@ -0,0 +1,383 @@
+"""
+Offline benchmark for the scrapers and the ingest loop
+scrape_eventeny, scrape_eventbrite and scrape_zapp (headless chrome, skipped
+with --skip-zapp) run against a local replay server serving the pages in
+benchmark/fixtures, and ingest_events writes
+into an in-memory firestore, geocoding against fixtures/gazetteer.csv, so
+nothing touches the live sites, the geocoder or the db.
+Reports pages/sec, parse ms per page, peak RSS and events/sec per stage
+
+run from src/utils/scraper:
+python3 -m benchmark
+python3 -m benchmark --latency 0.2 --error-rate 0.05 --json bench.json
+python3 -m benchmark --baseline bench.json   # exit 1 if a stage got slower
+
+fixtures are re-recorded from the live sites with python3 -m benchmark.record
+"""
+
+import argparse
+import contextlib
+import copy
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import fetcher
+import scraper
+from benchmark.fake_firestore import FakeFirestore
+from benchmark.replay_server import FIXTURES_DIR, ReplayServer
+from geocoder import Gazetteer, GeocodeCache, Geocoder
+from known_events import KnownEvents
+from metrics import metrics
+from rate_limiter import HostRateLimiter
+from sinks import FirestoreSink, SQLiteSink, sync_staged
+
+# rates so high the limiter never waits, the scrapers are what gets measured
+UNLIMITED_RATE = (1_000_000.0, 1_000_000)
+
+# stage fields compared against --baseline, higher is better for all of them
+THROUGHPUT_FIELDS = ["pages_per_sec", "events_per_sec"]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class ParseTimer:
+    """Wall time spent building parse trees, summed over every call"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.seconds = 0.0
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.calls += 1
+                    self.seconds += elapsed
+
+        return timed
+
+    @property
+    def ms_per_parse(self):
+        return self.seconds * 1000 / self.calls if self.calls else 0.0
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds else 0.0
+
+
+def run_scrape(name, site, scrape, server, timer, verbose):
+    server.reset_counts()
+    timer.reset()
+    start = time.perf_counter()
+    with quiet(verbose):
+        events = list(scrape(KnownEvents()))
+    seconds = time.perf_counter() - start
+    pages = server.requests[site]
+    return {
+        "stage": name,
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "errors": server.errors[site],
+        "bytes": server.bytes[site],
+        "pages_per_sec": _rate(pages, seconds),
+        "parse_ms_per_page": round(timer.ms_per_parse, 3),
+        "events": len(events),
+        "events_per_sec": _rate(len(events), seconds),
+        "peak_rss_mb": peak_rss_mb(),
+    }, events
+
+
+# selenium goes to ZAPP_SEARCH_URL/ZAPP_EVENT_URL itself, not through the
+# fetcher, so those are pointed at the replay server directly while zapp runs
+@contextlib.contextmanager
+def zapp_on(server):
+    saved = scraper.ZAPP_SEARCH_URL, scraper.ZAPP_EVENT_URL
+    site = f"{server.base_url}/zapplication.org"
+    scraper.ZAPP_SEARCH_URL = f"{site}/participating-events.php"
+    scraper.ZAPP_EVENT_URL = f"{site}/event-info.php?ID={{event_id}}"
+    try:
+        yield
+    finally:
+        scraper.ZAPP_SEARCH_URL, scraper.ZAPP_EVENT_URL = saved
+
+
+def _firestore_counts(db):
+    return {
+        "firestore_reads": db.reads,
+        "firestore_writes": db.writes,
+        "firestore_commits": db.commits,
+    }
+
+
+# db is the fake behind the sink, None for local sinks
+def run_ingest(name, sink, events, verbose, geocoder, db=None):
+    if db:
+        db.reset_counts()
+    events = copy.deepcopy(events)
+    start = time.perf_counter()
+    with quiet(verbose), sink:
+        scraper.ingest_events(iter(events), sink, sink.known_events(), geocoder)
+    seconds = time.perf_counter() - start
+    return {
+        "stage": name,
+        "seconds": round(seconds, 3),
+        "events": len(events),
+        "events_per_sec": _rate(len(events), seconds),
+        **(_firestore_counts(db) if db else {}),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_sync(staging, db, verbose):
+    db.reset_counts()
+    start = time.perf_counter()
+    with quiet(verbose), staging, FirestoreSink(db) as target:
+        counts = sync_staged(staging, target)
+    seconds = time.perf_counter() - start
+    events = sum(counts.values())
+    return {
+        "stage": "sync_staged",
+        "seconds": round(seconds, 3),
+        "events": events,
+        "events_per_sec": _rate(events, seconds),
+        **_firestore_counts(db),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# whole __main__ flow: sources merged, ingested as they stream in
+def run_pipeline(db, server, sources, verbose, geocoder):
+    server.reset_counts()
+    db.reset_counts()
+    sink = FirestoreSink(db)
+    known_events = sink.known_events()
+    counted = []
+
+    def counting(events):
+        for event in events:
+            counted.append(None)
+            yield event
+
+    start = time.perf_counter()
+    with quiet(verbose), sink:
+        merged = scraper.merge_sources(
+            {name: (lambda scrape=scrape: scrape(known_events)) for name, scrape in sources}
+        )
+        scraper.ingest_events(counting(merged), sink, known_events, geocoder)
+    seconds = time.perf_counter() - start
+    pages = sum(server.requests.values())
+    return {
+        "stage": "pipeline",
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "pages_per_sec": _rate(pages, seconds),
+        "events": len(counted),
+        "events_per_sec": _rate(len(counted), seconds),
+        "firestore_writes": db.writes,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(stages):
+    columns = [
+        "stage",
+        "seconds",
+        "pages",
+        "pages_per_sec",
+        "parse_ms_per_page",
+        "events",
+        "events_per_sec",
+        "peak_rss_mb",
+    ]
+    rows = [[str(stage.get(column, "")) for column in columns] for stage in stages]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+# stages whose throughput dropped more than tolerance against the baseline run
+def regressions(stages, baseline, tolerance):
+    previous = {stage["stage"]: stage for stage in baseline["stages"]}
+    found = []
+    for stage in stages:
+        old = previous.get(stage["stage"])
+        if not old:
+            continue
+        for field in THROUGHPUT_FIELDS:
+            if old.get(field) and stage.get(field) is not None:
+                if stage[field] < old[field] * (1 - tolerance):
+                    found.append(f"{stage['stage']} {field}: {old[field]} -> {stage[field]}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency +- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503s")
+    parser.add_argument("--pages", type=int, default=3, help="eventbrite result pages per search")
+    parser.add_argument("--commit-latency", type=float, default=0.02, help="seconds per batch commit")
+    parser.add_argument(
+        "--live-rate-limits",
+        action="store_true",
+        help="keep scraper.RATE_LIMITS instead of running unthrottled",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop")
+    parser.add_argument("--verbose", action="store_true", help="keep the scrapers' output")
+    parser.add_argument(
+        "--skip-zapp", action="store_true", help="leave out zapp, it needs chrome installed"
+    )
+    args = parser.parse_args()
+
+    timer = ParseTimer()
+
+    scratch = tempfile.mkdtemp(prefix="scraper-bench-")
+    # no http cache and no checkpoints (scraper.frontier is never started),
+    # every page is a real fetch from the replay server
+    scraper.response_cache = None
+    scraper.EVENTBRITE_DEPTHS_PATH = os.path.join(scratch, "eventbrite_depths.json")
+    if not args.live_rate_limits:
+        scraper.rate_limiter = HostRateLimiter({}, default=UNLIMITED_RATE)
+    scraper.make_soup = timer.wrap(scraper.make_soup)
+    scraper.parse_subtree = timer.wrap(scraper.parse_subtree)
+    geocoder = Geocoder(
+        Gazetteer(os.path.join(FIXTURES_DIR, "gazetteer.csv")),
+        GeocodeCache(os.path.join(scratch, "geocode.sqlite")),
+    )
+
+    server = ReplayServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        pages=args.pages,
+        seed=args.seed,
+    )
+    stages = []
+    with server:
+        fetcher.ORIGIN_OVERRIDES.update(server.origin_overrides())
+        print(f"Replay server on {server.base_url}")
+
+        eventeny, eventeny_events = run_scrape(
+            "scrape_eventeny", "eventeny.com", scraper.scrape_eventeny, server, timer, args.verbose
+        )
+        stages.append(eventeny)
+        eventbrite, eventbrite_events = run_scrape(
+            "scrape_eventbrite",
+            "eventbrite.com",
+            scraper.scrape_eventbrite,
+            server,
+            timer,
+            args.verbose,
+        )
+        stages.append(eventbrite)
+        events = eventeny_events + eventbrite_events
+        sources = [("eventeny", scraper.scrape_eventeny), ("eventbrite", scraper.scrape_eventbrite)]
+
+        if not args.skip_zapp:
+            with zapp_on(server):
+                zapp, zapp_events = run_scrape(
+                    "scrape_zapp",
+                    "zapplication.org",
+                    scraper.scrape_zapp,
+                    server,
+                    timer,
+                    args.verbose,
+                )
+            if not zapp["pages"]:
+                print("scrape_zapp fetched nothing, is chrome installed? (--skip-zapp)")
+            stages.append(zapp)
+            events += zapp_events
+            sources.append(("zapp", scraper.scrape_zapp))
+        db = FakeFirestore(commit_latency=args.commit_latency)
+        stages.append(
+            run_ingest("ingest_new", FirestoreSink(db), events, args.verbose, geocoder, db)
+        )
+        # same events again, all stored with matching fingerprints
+        stages.append(
+            run_ingest("ingest_unchanged", FirestoreSink(db), events, args.verbose, geocoder, db)
+        )
+
+        # staged locally, then pushed to an empty firestore
+        staging_path = os.path.join(scratch, "staging.sqlite")
+        stages.append(
+            run_ingest("ingest_sqlite", SQLiteSink(staging_path), events, args.verbose, geocoder)
+        )
+        sync_db = FakeFirestore(commit_latency=args.commit_latency)
+        stages.append(run_sync(SQLiteSink(staging_path), sync_db, args.verbose))
+
+        with zapp_on(server):
+            stages.append(
+                run_pipeline(
+                    FakeFirestore(commit_latency=args.commit_latency),
+                    server,
+                    sources,
+                    args.verbose,
+                    geocoder,
+                )
+            )
+        fetcher.ORIGIN_OVERRIDES.clear()
+    geocoder.close()
+
+    report = {
+        "settings": vars(args),
+        "stages": stages,
+        "metrics": metrics.report(),
+    }
+    print_report(stages)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(stages, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import copy
+import threading
+import time
+import uuid
+
+
+class NotFound(Exception):
+    pass
+
+
+def _merge(target, data):
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _field(data, path):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _set_field(data, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        data = data.setdefault(part, {})
+    data[last] = copy.deepcopy(value)
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the firestore client, covers the calls the scraper,
+    BatchWriter, FirebaseOperations and scoring make: collection(), document(),
+    select()/where()/limit()/start_after()/stream(), count(), get_all() and batch()
+    reads/writes/commits are counted like firestore bills them, commit_latency
+    seconds are slept per batch commit to look like a round trip
+    """
+
+    def __init__(self, commit_latency=0.0):
+        self.commit_latency = commit_latency
+        self._collections = {}
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    # missing documents come back as snapshots that dont exist, like the client
+    def get_all(self, references, field_paths=None):
+        for reference in references:
+            snapshot = reference.get()
+            if field_paths and snapshot.exists:
+                projected = {}
+                for path in field_paths:
+                    value = _field(snapshot._data, path)
+                    if value is not None:
+                        _set_field(projected, path, value)
+                snapshot._data = projected
+            yield snapshot
+
+    def _docs(self, collection):
+        return self._collections.setdefault(collection, {})
+
+    def _count(self, reads=0, writes=0, commits=0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.commits += commits
+
+    def reset_counts(self):
+        with self._lock:
+            self.reads = self.writes = self.commits = 0
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return copy.deepcopy(_field(self._data, field))
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection}/{self.id}"
+
+    def get(self):
+        self._db._count(reads=1)
+        with self._db._lock:
+            data = copy.deepcopy(self._db._docs(self._collection).get(self.id))
+        return FakeDocumentSnapshot(self, data)
+
+    def set(self, data, merge=False):
+        self._db._count(writes=1)
+        self._apply("set", data, merge)
+
+    def update(self, data):
+        self._db._count(writes=1)
+        self._apply("update", data)
+
+    def delete(self):
+        self._db._count(writes=1)
+        self._apply("delete")
+
+    # caller counts the write
+    def _apply(self, kind, data=None, merge=False):
+        with self._db._lock:
+            docs = self._db._docs(self._collection)
+            if kind == "delete":
+                docs.pop(self.id, None)
+            elif kind == "set":
+                # merge=[paths] replaces just those fields, whole
+                if isinstance(merge, list):
+                    doc = docs.setdefault(self.id, {})
+                    for path in merge:
+                        _set_field(doc, path, _field(data, path))
+                elif merge and self.id in docs:
+                    _merge(docs[self.id], data)
+                else:
+                    docs[self.id] = copy.deepcopy(data)
+            else:
+                if self.id not in docs:
+                    raise NotFound(f"No document to update: {self.path}")
+                for path, value in data.items():
+                    _set_field(docs[self.id], path, value)
+
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or "count"
+
+    # one read per 1000 matches, like firestore bills a count
+    def get(self):
+        with self._query._db._lock:
+            items = list(self._query._db._docs(self._query._collection).values())
+        count = sum(1 for data in items if self._query._matches(data))
+        self._query._db._count(reads=max(1, -(-count // 1000)))
+        return [[FakeAggregationResult(self._alias, count)]]
+
+
+class FakeQuery:
+    """Documents always come back in id order, cursors go by id"""
+
+    def __init__(self, db, collection, fields=None, filters=(), limit=None, start_after=None):
+        self._db = db
+        self._collection = collection
+        self._fields = fields
+        self._filters = tuple(filters)
+        self._limit = limit
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        state = {
+            "fields": self._fields,
+            "filters": self._filters,
+            "limit": self._limit,
+            "start_after": self._start_after,
+            **changes,
+        }
+        return FakeQuery(self._db, self._collection, **state)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    # where(path, op, value) or where(filter=FieldFilter(path, op, value))
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    # a snapshot from an earlier page
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot.id)
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self, alias)
+
+    def _matches(self, data):
+        return all(
+            _OPERATORS[op](_field(data, path), value) for path, op, value in self._filters
+        )
+
+    def stream(self):
+        with self._db._lock:
+            items = sorted(self._db._docs(self._collection).items())
+        yielded = 0
+        for doc_id, data in items:
+            if self._limit is not None and yielded >= self._limit:
+                break
+            if self._start_after is not None and doc_id <= self._start_after:
+                continue
+            if not self._matches(data):
+                continue
+            # like firestore an empty projection returns every field, only
+            # select(["__name__"]) comes back with none
+            if self._fields:
+                projected = {}
+                for path in self._fields:
+                    if path == "__name__":
+                        continue
+                    value = _field(data, path)
+                    if value is not None:
+                        _set_field(projected, path, value)
+                data = projected
+            self._db._count(reads=1)
+            yielded += 1
+            reference = FakeDocumentReference(self._db, self._collection, doc_id)
+            yield FakeDocumentSnapshot(reference, copy.deepcopy(data))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append((reference, "set", data, merge))
+
+    def update(self, reference, data):
+        self._ops.append((reference, "update", data, False))
+
+    def delete(self, reference):
+        self._ops.append((reference, "delete", None, False))
+
+    # all or nothing like the real thing, a missing doc on update fails the lot
+    def commit(self):
+        if self._db.commit_latency:
+            time.sleep(self._db.commit_latency)
+        with self._db._lock:
+            for reference, kind, data, merge in self._ops:
+                if kind == "update" and reference.id not in self._db._docs(reference._collection):
+                    raise NotFound(f"No document to update: {reference.path}")
+        for reference, kind, data, merge in self._ops:
+            reference._apply(kind, data, merge)
+        self._db._count(writes=len(self._ops), commits=1)
+        self._ops = []
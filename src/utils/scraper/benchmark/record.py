@@ -0,0 +1,126 @@
+"""
+Re-records benchmark/fixtures from the live sites
+one search per site plus the first detail page it links to, saved under the
+names the replay server serves. The zapp search page is a vue app, so it is
+saved the way chrome renders it after a search, with the site's scripts
+swapped for the stand-in search script the synthetic fixture uses
+
+needs network (and chrome for zapp), run from src/utils/scraper:
+python3 -m benchmark.record
+python3 -m benchmark.record --sites eventeny,zapp --keyword "craft fair"
+
+recorded pages have no {{variant}} markers, so eventeny/eventbrite replay the
+same events for every keyword, pages and timings are what gets compared
+"""
+
+import argparse
+import asyncio
+import os
+import re
+from urllib.parse import urljoin
+
+import scraper
+from benchmark.replay_server import FIXTURES_DIR
+from fetcher import AsyncFetcher
+
+# eventbrite search page far enough out to come back with no results
+EMPTY_EVENTBRITE_PAGE = 99
+
+# first detail link in a search page, per site
+DETAIL_LINKS = {
+    "eventeny": re.compile(r'href="((?:https://www\.eventeny\.com)?/events/[^"?#]+/?)"'),
+    "eventbrite": re.compile(r'href="(https://www\.eventbrite\.com/e/[^"?#]+)'),
+    "zapp": re.compile(r'href="((?:https://www\.zapplication\.org/)?event-info\.php\?ID=\d+)"'),
+}
+
+SCRIPT = re.compile(r"<script\b.*?</script>", re.S | re.I)
+
+
+def _stand_in_script():
+    with open(os.path.join(FIXTURES_DIR, "zapp_search.html"), encoding="utf-8") as f:
+        return SCRIPT.findall(f.read())[-1]
+
+
+def _save(name, content):
+    path = os.path.join(FIXTURES_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    print(f"Recorded {path} ({len(content)} chars)")
+
+
+async def _get(urls):
+    async with AsyncFetcher(rate_limiter=scraper.rate_limiter) as fetcher:
+        responses = await fetcher.fetch_all(urls)
+    pages = []
+    for url, response in zip(urls, responses):
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Could not record {url}: {response}")
+        pages.append(response.content.decode("utf-8", errors="replace"))
+    return pages
+
+
+def _detail_url(site, base, page):
+    match = DETAIL_LINKS[site].search(page)
+    if not match:
+        raise RuntimeError(f"No {site} detail link found in the recorded search page")
+    return urljoin(base, match.group(1))
+
+
+def record_eventeny(keyword):
+    url = f"https://www.eventeny.com/events/?l=&q={keyword.replace(' ', '+')}&m="
+    [listing] = asyncio.run(_get([url]))
+    [detail] = asyncio.run(_get([_detail_url("eventeny", url, listing)]))
+    _save("eventeny_listing.html", listing)
+    _save("eventeny_detail.html", detail)
+
+
+def record_eventbrite(keyword):
+    location = scraper.EVENTBRITE_LOCATIONS[0]
+    search = f"https://www.eventbrite.com/d/{location}/{keyword.replace(' ', '-')}/?page="
+    listing, empty = asyncio.run(_get([f"{search}1", f"{search}{EMPTY_EVENTBRITE_PAGE}"]))
+    [detail] = asyncio.run(_get([_detail_url("eventbrite", search, listing)]))
+    _save("eventbrite_search.html", listing)
+    _save("eventbrite_search_empty.html", empty)
+    _save("eventbrite_detail.html", detail)
+
+
+def record_zapp(keyword):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
+    from driver_pool import DriverPool, wait_for
+
+    pool = DriverPool(1)
+    try:
+        with pool.driver() as driver:
+            driver.get(scraper.ZAPP_SEARCH_URL)
+            search_box = wait_for(driver, By.ID, "keywords")
+            search_box.send_keys(keyword)
+            search_box.send_keys(Keys.RETURN)
+            wait_for(driver, By.CSS_SELECTOR, scraper.ZAPP_CARD_SELECTOR)
+            rendered = driver.page_source
+    finally:
+        pool.close()
+
+    # the site's own scripts would try to reach zapp from the replay server
+    search_page = SCRIPT.sub("", rendered).replace("</body>", f"{_stand_in_script()}\n</body>")
+    [detail] = asyncio.run(_get([_detail_url("zapp", scraper.ZAPP_SEARCH_URL, rendered)]))
+    _save("zapp_search.html", search_page)
+    _save("zapp_event.html", detail)
+
+
+RECORDERS = {"eventeny": record_eventeny, "eventbrite": record_eventbrite, "zapp": record_zapp}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record benchmark fixtures from the live sites")
+    parser.add_argument("--sites", default=",".join(RECORDERS), help="comma separated")
+    parser.add_argument("--keyword", default=scraper.SEARCH_KEYWORDS[0])
+    args = parser.parse_args()
+
+    for site in args.sites.split(","):
+        RECORDERS[site.strip()](args.keyword)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# the real origins the scrapers use, served under /<site>/ on the replay server
+SITES = {
+    "eventeny.com": "https://www.eventeny.com",
+    "eventbrite.com": "https://www.eventbrite.com",
+    "zapplication.org": "https://www.zapplication.org",
+}
+
+# fixtures mark what has to differ between pages with {{variant}}, filled in
+# from the query/path so every keyword and page gets its own events
+VARIANT = "{{variant}}"
+
+
+def _slug(*parts):
+    return re.sub(r"[^a-z0-9]+", "-", "-".join(parts).lower()).strip("-")
+
+
+# (site, path, query) -> (fixture file, variant, content type), None for a 404
+def route(site, path, query, pages):
+    if site == "eventeny.com":
+        if path == "/events/":
+            return "eventeny_listing.html", _slug(*query.get("q", [""])), "text/html"
+        if path.startswith("/events/"):
+            return "eventeny_detail.html", _slug(path), "text/html"
+    elif site == "eventbrite.com":
+        if path.startswith("/d/"):
+            page = int(query.get("page", ["1"])[0])
+            if page > pages:
+                return "eventbrite_search_empty.html", "", "text/html"
+            return "eventbrite_search.html", _slug(path, str(page)), "text/html"
+        if path.startswith("/e/"):
+            return "eventbrite_detail.html", _slug(path), "text/html"
+    elif site == "zapplication.org":
+        # what chrome loads, the fixture's script stands in for the vue search
+        if path == "/participating-events.php":
+            return "zapp_search.html", "", "text/html"
+        if path == "/event-info.php":
+            return "zapp_event.html", _slug(*query.get("ID", [""])), "text/html"
+    return None
+
+
+class ReplayServer:
+    """
+    Local stand-in for the scraped sites, serves the recorded pages in fixtures/
+    every response is held back latency seconds (+- jitter as a fraction) and
+    error_rate of them come back as error_status instead, so retries and the
+    rate limiter get exercised too
+    use as: with ReplayServer(...) as server: fetcher.ORIGIN_OVERRIDES.update(server.origin_overrides())
+    """
+
+    def __init__(
+        self,
+        latency=0.05,
+        jitter=0.5,
+        error_rate=0.0,
+        error_status=503,
+        pages=3,
+        fixtures_dir=FIXTURES_DIR,
+        host="127.0.0.1",
+        port=0,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # eventbrite search pages that have results, past that they come back empty
+        self.pages = pages
+        self.fixtures = {
+            name: open(os.path.join(fixtures_dir, name), encoding="utf-8").read()
+            for name in os.listdir(fixtures_dir)
+        }
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.bytes = Counter()
+
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, the fetcher pools connections per host
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                replay._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # for fetcher.ORIGIN_OVERRIDES
+    def origin_overrides(self):
+        return {origin: f"{self.base_url}/{site}" for site, origin in SITES.items()}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.bytes.clear()
+
+    def _delay(self):
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+            failed = self._random.random() < self.error_rate
+        return max(0.0, self.latency * (1 + spread)), failed
+
+    def _handle(self, handler):
+        parts = urlsplit(handler.path)
+        site, _, rest = parts.path.lstrip("/").partition("/")
+        matched = route(site, "/" + rest, parse_qs(parts.query), self.pages)
+
+        delay, failed = self._delay()
+        time.sleep(delay)
+
+        if matched is None:
+            status, body, content_type = 404, b"not found", "text/plain"
+        elif failed:
+            status, body, content_type = self.error_status, b"try again later", "text/plain"
+        else:
+            name, variant, content_type = matched
+            status = 200
+            body = self.fixtures[name].replace(VARIANT, variant).encode("utf-8")
+
+        with self._lock:
+            self.requests[site] += 1
+            self.bytes[site] += len(body)
+            if status != 200:
+                self.errors[site] += 1
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
@@ -0,0 +1,303 @@
+"""
+Free text event dates -> real startDate/endDate
+scrapers keep the date as shown on the site ("Saturday, April 26 · 3 - 6pm EDT",
+"Mar 01, 2025 · 1:00 PM - Mar 01, 2025 · 6:00 PM(GMT-04:00) ...", "9/14/25 - 9/14/25")
+and used to write {"seconds": 0} placeholders, so the app could not range query
+on dates. parse_event_date() turns the string into utc datetimes (firestore
+stores them as timestamps), same formats as scripts/migration/migrateEventDates.js
+
+parsed strings are memoized, the same listing date shows up for every keyword
+and every run, and each source remembers the format that last matched so it
+is tried first
+"""
+
+import functools
+import re
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from metrics import metrics
+
+# placeholder scrapers put in startDate/endDate before dates are parsed
+UNPARSED_DATE = {"seconds": 0, "nanoseconds": 0}
+
+DEFAULT_TIMEZONE = "America/New_York"
+
+TIMEZONES = {
+    "EDT": "America/New_York",
+    "EST": "America/New_York",
+    "ET": "America/New_York",
+    "CDT": "America/Chicago",
+    "CST": "America/Chicago",
+    "CT": "America/Chicago",
+    "MDT": "America/Denver",
+    "MST": "America/Denver",
+    "MT": "America/Denver",
+    "PDT": "America/Los_Angeles",
+    "PST": "America/Los_Angeles",
+    "PT": "America/Los_Angeles",
+}
+
+# distinct date strings kept parsed
+PARSE_CACHE_SIZE = 4096
+
+# without a year or weekday, a date further back than this is next year's
+YEAR_ROLLOVER = timedelta(days=60)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}  # fmt: skip
+
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# building blocks for the format regexes
+_SEP = r"\s*[·•]\s*|\s+at\s+|,?\s+"
+_DAY = (
+    r"(?:(?P<{p}weekday>[A-Za-z]+),?\s+)?"
+    r"(?P<{p}month>[A-Za-z]+)\.?\s+(?P<{p}day>\d{{1,2}})(?:,\s*(?P<{p}year>\d{{4}}))?"
+)
+_TIME = r"(?P<{p}time>\d{{1,2}}(?::\d{{2}})?\s*(?:[AaPp]\.?[Mm]\.?)?)"
+# am/pm is never a zone, or "1:00 PM - ..." could stop at "1:00 " with zone PM
+_ZONE = (
+    r"\s*(?:\((?:GMT|UTC)(?P<offset>[+-]\d{2}:\d{2})\).*"
+    r"|(?P<zone>(?!AM\b|PM\b)[A-Z]{2,4})\b.*|\..*)?$"
+)
+_RANGE = r"\s*(?:-|–|—|to)\s*"
+
+
+def _day(prefix):
+    return _DAY.format(p=prefix)
+
+
+def _time(prefix):
+    return _TIME.format(p=prefix)
+
+
+# name -> regex, tried in this order after the source's last hit
+FORMATS = {
+    # May 31 · 10am - June 1 · 6pm EDT
+    # Mar 01, 2025 · 1:00 PM - Mar 01, 2025 · 6:00 PM(GMT-04:00) Eastern Time
+    "two_days": re.compile(
+        rf"^{_day('s_')}(?:{_SEP}){_time('s_')}{_RANGE}{_day('e_')}(?:{_SEP}){_time('e_')}{_ZONE}"
+    ),
+    # Saturday, April 26 · 3 - 6pm EDT
+    # Sunday, April 27 · 12 - 11:30pm EDT. Doors at 11:48am
+    "one_day": re.compile(rf"^{_day('s_')}(?:{_SEP}){_time('s_')}{_RANGE}{_time('e_')}{_ZONE}"),
+    # Saturday, April 26 · 10am
+    "start_only": re.compile(rf"^{_day('s_')}(?:{_SEP}){_time('s_')}{_ZONE}"),
+    # Today at 5pm, Tomorrow at 10:00 AM - 2:00 PM, Saturday at 10:00 AM
+    "relative": re.compile(
+        rf"^(?P<relative>(?i:today|tonight|tomorrow|[a-z]+day))(?:{_SEP}){_time('s_')}"
+        rf"(?:{_RANGE}{_time('e_')})?{_ZONE}"
+    ),
+    # Nov 15 - Nov 16, Nov 15, 2025 - Nov 16, 2025
+    "day_range": re.compile(rf"^{_day('s_')}{_RANGE}{_day('e_')}$"),
+    # Dec 7, 2025, Sunday, December 7
+    "day": re.compile(rf"^{_day('s_')}$"),
+    # 9/14/25 - 9/14/25
+    "numeric": re.compile(
+        r"^(?P<s_month>\d{1,2})/(?P<s_day>\d{1,2})/(?P<s_year>\d{2,4})"
+        rf"(?:{_RANGE}(?P<e_month>\d{{1,2}})/(?P<e_day>\d{{1,2}})/(?P<e_year>\d{{2,4}}))?$"
+    ),
+    # 2025-09-14 - 2025-09-15, zapp's json search
+    "iso": re.compile(
+        r"^(?P<s_year>\d{4})-(?P<s_month>\d{2})-(?P<s_day>\d{2})"
+        rf"(?:{_RANGE}(?P<e_year>\d{{4}})-(?P<e_month>\d{{2}})-(?P<e_day>\d{{2}}))?$"
+    ),
+}
+
+# formats with a date but no times, the event runs noon to 23:59 like the migration
+DATE_ONLY_FORMATS = {"day_range", "day", "numeric", "iso"}
+
+# source -> format that parsed its last date
+_format_hints = {}
+_hints_lock = threading.Lock()
+
+
+def _normalize(text):
+    return " ".join((text or "").split())
+
+
+def _tzinfo(match):
+    offset = match.groupdict().get("offset")
+    if offset:
+        sign = -1 if offset[0] == "-" else 1
+        hours, minutes = offset[1:].split(":")
+        return timezone(sign * timedelta(hours=int(hours), minutes=int(minutes)))
+    zone = match.groupdict().get("zone")
+    return ZoneInfo(TIMEZONES.get(zone, DEFAULT_TIMEZONE))
+
+
+def _month(text):
+    if text.isdigit():
+        return int(text)
+    return MONTHS[text[:3].lower()]
+
+
+def _year(text):
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+# the year a date without one is in, picked by its weekday when there is one
+def _infer_year(month, day, weekday, today):
+    years = [today.year, today.year + 1, today.year - 1]
+    if weekday:
+        wanted = WEEKDAYS.get(weekday[:3].lower())
+        for year in years:
+            try:
+                if date(year, month, day).weekday() == wanted:
+                    return year
+            except ValueError:
+                continue
+    if date(today.year, month, day) < today - YEAR_ROLLOVER:
+        return today.year + 1
+    return today.year
+
+
+def _day_of(match, prefix, today, fallback=None):
+    groups = match.groupdict()
+    if not groups.get(f"{prefix}month"):
+        return fallback
+    month = _month(groups[f"{prefix}month"])
+    day = int(groups[f"{prefix}day"])
+    if groups.get(f"{prefix}year"):
+        return date(_year(groups[f"{prefix}year"]), month, day)
+    return date(_infer_year(month, day, groups.get(f"{prefix}weekday"), today), month, day)
+
+
+# (hour, minute, meridiem or None)
+def _clock(text):
+    text = text.lower().replace(".", "").replace(" ", "")
+    meridiem = text[-2:] if text[-2:] in ("am", "pm") else None
+    digits = text[:-2] if meridiem else text
+    hour, _, minute = digits.partition(":")
+    return int(hour), int(minute or 0), meridiem
+
+
+def _to_time(hour, minute, meridiem):
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    return time(hour, minute)
+
+
+# "3 - 6pm": the start takes the end's am/pm unless that puts it after the end
+def _times(start_text, end_text):
+    start_hour, start_minute, start_meridiem = _clock(start_text)
+    end_hour, end_minute, end_meridiem = _clock(end_text)
+    end_meridiem = end_meridiem or start_meridiem or "pm"
+    end = _to_time(end_hour, end_minute, end_meridiem)
+    if start_meridiem:
+        return _to_time(start_hour, start_minute, start_meridiem), end
+    start = _to_time(start_hour, start_minute, end_meridiem)
+    if start > end:
+        start = _to_time(start_hour, start_minute, "am")
+    return start, end
+
+
+# the day "today", "tomorrow" or "saturday" means, seen from today
+def _relative_day(word, today):
+    word = word.lower()
+    if word in ("today", "tonight"):
+        return today
+    if word == "tomorrow":
+        return today + timedelta(days=1)
+    wanted = WEEKDAYS.get(word[:3])
+    if wanted is None or not word.startswith(tuple(WEEKDAY_NAMES)):
+        raise ValueError(f"not a day: {word}")
+    return today + timedelta(days=(wanted - today.weekday()) % 7)
+
+
+def _build(name, match, today):
+    if name in DATE_ONLY_FORMATS:
+        zone = ZoneInfo(DEFAULT_TIMEZONE)
+        start_day = _day_of(match, "s_", today)
+        end_day = _day_of(match, "e_", today, start_day)
+        if end_day < start_day:
+            end_day = start_day
+        start = datetime.combine(start_day, time(12, 0), zone)
+        end = datetime.combine(end_day, time(23, 59), zone)
+        return start, end
+
+    zone = _tzinfo(match)
+    if name == "relative":
+        day = _relative_day(match["relative"], today)
+        start_time, end_time = _times(match["s_time"], match["e_time"] or match["s_time"])
+        start = datetime.combine(day, start_time, zone)
+        end = datetime.combine(day, end_time, zone) if match["e_time"] else None
+        return start, end
+
+    start_day = _day_of(match, "s_", today)
+    if name == "start_only":
+        start_time, _ = _times(match["s_time"], match["s_time"])
+        return datetime.combine(start_day, start_time, zone), None
+
+    end_day = _day_of(match, "e_", today, start_day)
+    start_time, end_time = _times(match["s_time"], match["e_time"])
+    start = datetime.combine(start_day, start_time, zone)
+    end = datetime.combine(end_day, end_time, zone)
+    # "4pm - 1:30am" on one day runs past midnight
+    if end < start and name == "one_day":
+        end += timedelta(days=1)
+    return start, end
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc) if value else None
+
+
+# (start, end, format name), start None when nothing matched
+# today is part of the key, strings without a year depend on it
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(text, hint, today):
+    names = list(FORMATS)
+    if hint in FORMATS:
+        names.remove(hint)
+        names.insert(0, hint)
+    for name in names:
+        match = FORMATS[name].match(text)
+        if not match:
+            continue
+        try:
+            start, end = _build(name, match, today)
+        except (KeyError, ValueError):
+            continue
+        return _utc(start), _utc(end), name
+    return None, None, None
+
+
+# (startDate, endDate) as utc datetimes, (None, None) when it cant be parsed
+def parse_event_date(text, source=None, today=None):
+    text = _normalize(text)
+    if not text:
+        return None, None
+    today = today or date.today()
+    with _hints_lock:
+        hint = _format_hints.get(source)
+    start, end, name = _parse(text, hint, today)
+    if name is None:
+        metrics.inc("dates_unparsed_total", source=source)
+        return None, None
+    if name != hint:
+        with _hints_lock:
+            _format_hints[source] = name
+    metrics.inc("dates_parsed_total", source=source, format=name)
+    return start, end
+
+
+# fill startDate/endDate from the event's date string, placeholders are kept
+# when it doesnt parse, returns whether a start date was found
+def normalize_dates(event):
+    start, end = parse_event_date(event.get("date"), event.get("source"))
+    if start is None:
+        return False
+    event["startDate"] = start
+    event["endDate"] = end or start
+    return True
+
+
+def is_unparsed(value):
+    return not value or value == UNPARSED_DATE
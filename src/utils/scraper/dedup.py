@@ -0,0 +1,210 @@
+"""
+Near-duplicate detection across sources
+make_event_id only catches exact repeats, the same market on Eventeny,
+Eventbrite and Zapp under slightly different titles still came out as
+three events. DedupIndex blocks events by normalized city/state, finds
+candidates through a trigram index of the names inside that block and only
+scores those, so each lookup costs about the same however many events
+there are. Candidates also have to start within DATE_WINDOW of each other
+when both dates are known, come from a different source, and not name
+different editions of a series (a month, season or number apart)
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# trigram jaccard a name pair needs to count as the same event
+NAME_THRESHOLD = 0.6
+
+# seconds two start dates can be apart and still be one event
+DATE_WINDOW = 3 * 24 * 60 * 60
+
+# trigrams in more names than this (in one city) say nothing, e.g. "pop"
+MAX_POSTING = 200
+
+# best candidates by shared trigrams that get a full score
+MAX_CANDIDATES = 10
+
+NAME_STOPWORDS = {"the", "a", "an", "and", "of", "at", "in", "on", "annual", "presents"}
+
+# words that tell editions of a recurring event apart, "Pop Up Market -
+# November" and "- December" share most trigrams but are never one event
+# fmt: off
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3,
+    "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7,
+    "august": 8, "aug": 8, "september": 9, "sept": 9, "sep": 9, "october": 10,
+    "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+}
+# fmt: on
+SEASONS = {"spring", "summer", "fall", "autumn", "winter", "holiday", "christmas"}
+
+CITY_ALIASES = {
+    "nyc": "new york",
+    "new york city": "new york",
+    "manhattan": "new york",
+}
+
+# fmt: off
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar",
+    "california": "ca", "colorado": "co", "connecticut": "ct", "delaware": "de",
+    "district of columbia": "dc", "florida": "fl", "georgia": "ga", "hawaii": "hi",
+    "idaho": "id", "illinois": "il", "indiana": "in", "iowa": "ia", "kansas": "ks",
+    "kentucky": "ky", "louisiana": "la", "maine": "me", "maryland": "md",
+    "massachusetts": "ma", "michigan": "mi", "minnesota": "mn", "mississippi": "ms",
+    "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok",
+    "oregon": "or", "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc",
+    "south dakota": "sd", "tennessee": "tn", "texas": "tx", "utah": "ut",
+    "vermont": "vt", "virginia": "va", "washington": "wa", "west virginia": "wv",
+    "wisconsin": "wi", "wyoming": "wy",
+}
+# fmt: on
+
+
+def _clean(text):
+    text = (text or "").lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def normalize_name(name):
+    return " ".join(word for word in _clean(name).split() if word not in NAME_STOPWORDS)
+
+
+# (city, state) the index is blocked on, None without a city
+def location_key(location):
+    location = location or {}
+    city = _clean(location.get("city"))
+    if not city:
+        return None
+    state = _clean(location.get("state"))
+    return CITY_ALIASES.get(city, city), US_STATES.get(state, state)
+
+
+# kind -> words marking which edition a name is, e.g. {"month": {11}}
+def edition_marks(name):
+    marks = defaultdict(set)
+    for word in _clean(name).split():
+        if word in MONTHS:
+            marks["month"].add(MONTHS[word])
+        elif word in SEASONS:
+            marks["season"].add("fall" if word == "autumn" else word)
+        elif word[0].isdigit():
+            # 2024, 5th, 10
+            marks["number"].add(word.rstrip("stndrh"))
+    return dict(marks)
+
+
+# both names say which month/season/number they are and they disagree
+def editions_conflict(a, b):
+    return any(kind in b and a[kind] != b[kind] for kind in a)
+
+
+def trigrams(name):
+    text = f"  {normalize_name(name)} "
+    return frozenset(text[i : i + 3] for i in range(len(text) - 2))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# startDate as epoch seconds, None while it is still the 0 placeholder
+def start_seconds(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, dict) and value.get("seconds"):
+        return value["seconds"]
+    return None
+
+
+class Entry:
+    """What the index keeps per canonical event, enough to match and merge"""
+
+    def __init__(self, event_id, event):
+        self.event_id = event_id
+        self.grams = trigrams(event.get("name"))
+        self.edition = edition_marks(event.get("name"))
+        self.start = start_seconds(event.get("startDate"))
+        self.image = event.get("image") or ""
+        self.sources = list(event.get("sources") or filter(None, [event.get("source")]))
+        self.merged_ids = list(event.get("mergedIds") or [])
+
+
+class DedupIndex:
+    def __init__(
+        self,
+        threshold=NAME_THRESHOLD,
+        date_window=DATE_WINDOW,
+        max_posting=MAX_POSTING,
+    ):
+        self.threshold = threshold
+        self.date_window = date_window
+        self.max_posting = max_posting
+        # location key -> trigram -> ids of canonical events with that trigram
+        self._blocks = defaultdict(lambda: defaultdict(list))
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, event_id, event):
+        block = location_key(event.get("location"))
+        if block is None:
+            return
+        entry = Entry(event_id, event)
+        with self._lock:
+            if event_id in self.entries:
+                return
+            self.entries[event_id] = entry
+            postings = self._blocks[block]
+            for gram in entry.grams:
+                postings[gram].append(event_id)
+
+    def _dates_match(self, entry, start):
+        if entry.start is None or start is None:
+            return True
+        return abs(entry.start - start) <= self.date_window
+
+    # id of the canonical event this one duplicates, None if it is new
+    def match(self, event):
+        block = location_key(event.get("location"))
+        if block is None:
+            return None
+        grams = trigrams(event.get("name"))
+        edition = edition_marks(event.get("name"))
+        start = start_seconds(event.get("startDate"))
+        source = event.get("source")
+
+        with self._lock:
+            postings = self._blocks.get(block)
+            if not postings:
+                return None
+            shared = Counter()
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting and len(posting) <= self.max_posting:
+                    shared.update(posting)
+
+            best, best_score = None, self.threshold
+            for candidate_id, _ in shared.most_common(MAX_CANDIDATES):
+                entry = self.entries[candidate_id]
+                # one source doesnt list the same event twice, a near match
+                # there is a different date or edition of a series
+                if source and source in entry.sources:
+                    continue
+                # checked on the names too, a date that didnt parse lets
+                # any two editions through _dates_match
+                if not self._dates_match(entry, start) or editions_conflict(edition, entry.edition):
+                    continue
+                score = jaccard(grams, entry.grams)
+                if score >= best_score:
+                    best, best_score = candidate_id, score
+        return best
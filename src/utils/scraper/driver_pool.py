@@ -0,0 +1,144 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import (
+    InvalidSessionIdException,
+    TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+# how long an explicit wait holds out before giving up on an element
+DEFAULT_WAIT_TIMEOUT = 10
+
+
+def make_headless_chrome(driver_path):
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    # pages are only read, skip downloading images
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    return webdriver.Chrome(service=Service(driver_path), options=options)
+
+
+# cheap round trip to the browser, False once the session or chromedriver is gone
+def is_alive(driver):
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+class DriverPool:
+    """
+    Fixed number of reusable headless Chrome drivers shared between threads
+    use as: with pool.driver() as driver
+    a driver whose browser died is thrown away and a fresh one started on
+    next use, anything else (a wait timing out, a parse error) returns it
+    """
+
+    def __init__(self, size=3):
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+        self._driver_path = None
+
+    def _new_driver(self):
+        with self._lock:
+            # install once, not once per browser
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+            driver_path = self._driver_path
+        driver = make_headless_chrome(driver_path)
+        with self._lock:
+            self._all.append(driver)
+        return driver
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._new_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # recheck now and then in case a crashed driver freed a slot
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+
+    def _discard(self, driver):
+        with self._lock:
+            self._created -= 1
+            if driver in self._all:
+                self._all.remove(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    @contextmanager
+    def driver(self):
+        driver = self._checkout()
+        healthy = True
+        try:
+            yield driver
+        except InvalidSessionIdException:
+            healthy = False
+            raise
+        except BaseException:
+            # only a browser that stops answering is dead, dont hand that
+            # one to the next caller
+            healthy = is_alive(driver)
+            raise
+        finally:
+            # always back in the pool or discarded, or its slot leaks
+            if healthy:
+                self._idle.put(driver)
+            else:
+                self._discard(driver)
+
+    def close(self):
+        with self._lock:
+            drivers, self._all = self._all, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+
+# returns as soon as the element is there instead of a fixed sleep
+def wait_for(driver, by, selector, timeout=DEFAULT_WAIT_TIMEOUT):
+    return WebDriverWait(driver, timeout).until(
+        EC.presence_of_element_located((by, selector))
+    )
+
+
+# True if the element went away (page re-rendered), False on timeout
+def wait_until_stale(driver, element, timeout=DEFAULT_WAIT_TIMEOUT):
+    try:
+        WebDriverWait(driver, timeout).until(EC.staleness_of(element))
+        return True
+    except TimeoutException:
+        return False
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import metrics, source_of
+
+try:
+    # aiohttp only decodes br when one of these is installed
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+# in-flight requests per host when nothing is configured for it
+DEFAULT_HOST_CONCURRENCY = 4
+
+# idle pooled connections are kept this long for the next detail page
+KEEPALIVE_TIMEOUT = 60
+
+# scraping as if using chrome
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; U; Linux i686; en-US) AppleWebKit/534.3 (KHTML, like Gecko) Chrome/6.0.472.63 Safari/534.3",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+}
+
+# retried after the rate limiter backs off
+THROTTLE_STATUSES = (429, 503)
+
+# origin -> origin requests for it are actually sent to, e.g. the sites pointed
+# at the benchmark replay server. Cache, rate limits and host concurrency stay
+# keyed by the original url
+ORIGIN_OVERRIDES = {}
+
+
+# keys config by domain so www. and bare hosts share one budget
+def host_key(url):
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _request_url(url):
+    if not ORIGIN_OVERRIDES:
+        return url
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    override = ORIGIN_OVERRIDES.get(origin)
+    return override + url[len(origin) :] if override else url
+
+
+class FetchResponse:
+    # same attribute names as requests.Response so the parse code doesnt change
+    # parsed is what the scraper pulled out of this exact body on an earlier run
+    def __init__(
+        self, url, status_code, content, headers, from_cache=False, parsed=None
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+        self.parsed = parsed
+
+    def __repr__(self):
+        return f"<FetchResponse [{self.status_code}]>"
+
+
+class AsyncFetcher:
+    """
+    Concurrent GETs with a cap on in-flight requests per host
+    each host gets one pooled keep-alive session for the whole run, so detail
+    pages reuse the connections the listing pages already opened
+    use as: async with AsyncFetcher(...) as fetcher
+    """
+
+    def __init__(
+        self,
+        host_concurrency=None,
+        rate_limiter=None,
+        cache=None,
+        headers=None,
+        timeout=15,
+        retries=2,
+    ):
+        self.host_concurrency = host_concurrency or {}
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.retries = retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._semaphores = {}
+        self._sessions = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.gather(*(session.close() for session in self._sessions.values()))
+        self._sessions = {}
+
+    def _concurrency(self, host):
+        return self.host_concurrency.get(host, DEFAULT_HOST_CONCURRENCY)
+
+    def _semaphore(self, host):
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self._concurrency(host))
+        return self._semaphores[host]
+
+    def _session(self, host):
+        if host not in self._sessions:
+            # pool sized to the semaphore so no request waits on a socket
+            connector = aiohttp.TCPConnector(
+                limit=self._concurrency(host),
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            self._sessions[host] = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self.timeout,
+                auto_decompress=True,
+            )
+        return self._sessions[host]
+
+    # returns None on network errors so one bad page doesnt kill the run
+    async def fetch(self, url, headers=None):
+        source = source_of(url)
+        cached = self.cache.get(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            metrics.inc("cache_hits_total", source=source)
+            return self._from_cache(cached)
+        if cached:
+            headers = {**(headers or {}), **self.cache.conditional_headers(cached)}
+
+        host = host_key(url)
+        async with self._semaphore(host):
+            for attempt in range(self.retries + 1):
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire(url)
+                started = time.perf_counter()
+                try:
+                    async with self._session(host).get(
+                        _request_url(url), headers=headers
+                    ) as response:
+                        content = await response.read()
+                        result = FetchResponse(
+                            str(response.url), response.status, content, response.headers
+                        )
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"Error fetching {url}: {e!r}")
+                    metrics.inc("request_errors_total", source=source, error=type(e).__name__)
+                    return None
+                metrics.observe("fetch_seconds", time.perf_counter() - started, source=source)
+                metrics.inc("requests_total", source=source, status=result.status_code)
+                metrics.inc("response_bytes_total", len(content), source=source)
+
+                if self.rate_limiter:
+                    self.rate_limiter.record(
+                        url, result.status_code, result.headers.get("Retry-After")
+                    )
+                # limiter has slowed the host down, so just go again
+                if result.status_code in THROTTLE_STATUSES and attempt < self.retries:
+                    metrics.inc("request_retries_total", source=source)
+                    continue
+                break
+
+        if self.cache:
+            if result.status_code == 304 and cached:
+                self.cache.revalidated(url)
+                return self._from_cache(cached)
+            if result.status_code == 200:
+                self.cache.put(url, result.status_code, result.headers, result.content)
+        return result
+
+    def _from_cache(self, entry):
+        return FetchResponse(
+            entry.url,
+            entry.status,
+            entry.content,
+            entry.headers,
+            from_cache=True,
+            parsed=entry.parsed,
+        )
+
+    # run parse(response) unless this body was already parsed on an earlier run
+    # parse output has to be json serializable to be cached
+    def parse_once(self, url, response, parse):
+        if response is not None and response.parsed is not None:
+            metrics.inc("parse_cache_hits_total", source=source_of(url))
+            return response.parsed
+        with metrics.timer("parse_seconds", source=source_of(url)):
+            parsed = parse(response)
+        if self.cache and response is not None and response.status_code == 200:
+            self.cache.set_parsed(url, parsed)
+        return parsed
+
+    async def fetch_all(self, urls, headers=None):
+        return await asyncio.gather(*(self.fetch(url, headers) for url in urls))
@@ -0,0 +1,83 @@
+import hashlib
+import json
+
+# fields the scrapers fill in, a change in any of these is worth a write
+# id/scrapedAt/score etc are ours, not the source's, so they are left out
+FINGERPRINT_FIELDS = [
+    "name",
+    "source",
+    "description",
+    "location",
+    "type",
+    "date",
+    "image",
+    "vendorFee",
+    "totalCost",
+    "attendeeType",
+    "headcount",
+    "demographics",
+    "startDate",
+    "endDate",
+    # filled in at ingest rather than scraped, a moved location or a new image
+    # moves these, a run that didnt compute them keeps what is stored
+    "geo",
+    "geohash",
+    "thumbnail",
+]
+
+
+# fields we compute at ingest -> the scraped field they are computed from
+# dates without a year, or "today", come out different depending on when they
+# are parsed, so a stored value stays as long as its source is unchanged
+DERIVED_FIELDS = {
+    "startDate": "date",
+    "endDate": "date",
+}
+
+# same, for fields a run may not compute at all (geocoding or thumbnails off,
+# no pillow, a place or image that couldnt be fetched), a stored value stays
+# while its source is unchanged and the run came back with nothing in its place
+OPTIONAL_FIELDS = {
+    "geo": "location",
+    "geohash": "location",
+    "thumbnail": "image",
+}
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def field_hash(value):
+    return _hash(json.dumps(value, sort_keys=True, default=str))
+
+
+# stored on the event as fieldHashes so a later run can tell which fields moved
+def field_hashes(event):
+    return {field: field_hash(event.get(field)) for field in FINGERPRINT_FIELDS}
+
+
+# stored on the event as fingerprint, one string compare says "unchanged"
+def fingerprint(hashes):
+    return _hash("|".join(hashes[field] for field in FINGERPRINT_FIELDS))
+
+
+def changed_fields(old_hashes, new_hashes):
+    old_hashes = old_hashes or {}
+    return [field for field in FINGERPRINT_FIELDS if old_hashes.get(field) != new_hashes[field]]
+
+
+# stored hashes of derived fields whose source didnt change, patched into
+# hashes so they dont show up as changed, returns the fields kept
+def keep_stored(hashes, old_hashes):
+    missing = field_hash(None)
+    kept = []
+    for fields, computed_only in ((DERIVED_FIELDS, False), (OPTIONAL_FIELDS, True)):
+        for field, source in fields.items():
+            if field not in old_hashes or old_hashes.get(source) != hashes[source]:
+                continue
+            if computed_only and hashes[field] != missing:
+                continue
+            hashes[field] = old_hashes[field]
+            kept.append(field)
+    return kept
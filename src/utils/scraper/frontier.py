@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_FRONTIER_PATH = "./.scraper_cache/frontier.sqlite"
+
+# an unfinished run older than this is abandoned instead of resumed
+DEFAULT_RESUME_MAX_AGE = 24 * 60 * 60
+
+
+class CrawlFrontier:
+    """
+    Checkpoints for a crawl, kept in sqlite so a crashed run can pick up again
+    a unit is one listing/search page (source, keyword, location, page) or one
+    detail url. Scrapers ask for a unit's stored result before fetching it and
+    save the result once it is done, so after a restart finished units are
+    replayed from disk and only pending ones hit the network
+    nothing is checkpointed until start_run() is called, and the database
+    isnt opened (or created) before then either
+    """
+
+    def __init__(self, path=DEFAULT_FRONTIER_PATH, resume_max_age=DEFAULT_RESUME_MAX_AGE):
+        self.path = path
+        self.resume_max_age = resume_max_age
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS units (
+                run_id INTEGER,
+                unit_key TEXT,
+                kind TEXT,
+                source TEXT,
+                keyword TEXT,
+                location TEXT,
+                page INTEGER,
+                url TEXT,
+                status TEXT,
+                result TEXT,
+                updated_at REAL,
+                PRIMARY KEY (run_id, unit_key)
+            );
+            """
+        )
+        self._conn.commit()
+
+    # resume the last run if it never finished, otherwise start a new one
+    def start_run(self):
+        with self._lock:
+            if self._conn is None:
+                self._connect()
+            row = self._conn.execute(
+                "SELECT id, started_at FROM runs WHERE finished_at IS NULL "
+                "ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            if row and time.time() - row[1] < self.resume_max_age:
+                self.run_id = row[0]
+                counts = dict(
+                    self._conn.execute(
+                        "SELECT status, COUNT(*) FROM units WHERE run_id = ? GROUP BY status",
+                        (self.run_id,),
+                    ).fetchall()
+                )
+                print(
+                    f"Resuming crawl run {self.run_id}: {counts.get('done', 0)} units done, "
+                    f"{counts.get('pending', 0)} pending"
+                )
+            else:
+                if row:
+                    # too old to trust, close it off
+                    self._conn.execute(
+                        "UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), row[0])
+                    )
+                cursor = self._conn.execute(
+                    "INSERT INTO runs (started_at) VALUES (?)", (time.time(),)
+                )
+                self.run_id = cursor.lastrowid
+                print(f"Starting crawl run {self.run_id}")
+            self._conn.commit()
+        return self.run_id
+
+    def finish_run(self):
+        if self.run_id is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), self.run_id)
+            )
+            # replayed results are only needed while a run can still resume
+            self._conn.execute("DELETE FROM units WHERE run_id = ?", (self.run_id,))
+            self._conn.commit()
+        self.run_id = None
+
+    @staticmethod
+    def page_key(source, keyword, location="", page=1):
+        return f"{source}|{keyword}|{location}|{page}"
+
+    @staticmethod
+    def detail_key(url):
+        return f"detail|{url}"
+
+    # stored result of a finished unit, None if it still has to be done
+    def result(self, unit_key):
+        if self.run_id is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM units WHERE run_id = ? AND unit_key = ? AND status = 'done'",
+                (self.run_id, unit_key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, unit_key, status, result=None, **fields):
+        if self.run_id is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO units (run_id, unit_key, kind, source, keyword, location, page, "
+                "url, status, result, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, unit_key) DO UPDATE SET status = excluded.status, "
+                "result = excluded.result, updated_at = excluded.updated_at",
+                (
+                    self.run_id,
+                    unit_key,
+                    fields.get("kind"),
+                    fields.get("source"),
+                    fields.get("keyword"),
+                    fields.get("location"),
+                    fields.get("page"),
+                    fields.get("url"),
+                    status,
+                    json.dumps(result) if result is not None else None,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def start_page(self, source, keyword, location="", page=1):
+        self._set(
+            self.page_key(source, keyword, location, page),
+            "pending",
+            kind="page",
+            source=source,
+            keyword=keyword,
+            location=location,
+            page=page,
+        )
+
+    def finish_page(self, source, keyword, location, page, result):
+        self._set(self.page_key(source, keyword, location, page), "done", result)
+
+    def page_result(self, source, keyword, location="", page=1):
+        return self.result(self.page_key(source, keyword, location, page))
+
+    def start_detail(self, url):
+        self._set(self.detail_key(url), "pending", kind="detail", url=url)
+
+    def finish_detail(self, url, result):
+        self._set(self.detail_key(url), "done", result)
+
+    def detail_result(self, url):
+        return self.result(self.detail_key(url))
@@ -0,0 +1,307 @@
+"""
+City/state -> coordinates and a geohash for every ingested event
+scrapers only give {"city", "state"}, so distance filtering used to mean
+geocoding at request time. Geocoder resolves each distinct place once: places
+are normalized the way dedup blocks them ("New York City, New York" and
+"NYC, NY" are one place), looked up in an on-disk cache that survives runs
+(LRU, misses are remembered too) and only what is missing goes to the backend,
+in one batch
+
+events get "geo": {"lat", "lng"} and "geohash", a nearby query is then a range
+on the geohash prefix, see prefix_range()
+
+SCRAPER_GEOCODER=nominatim (default) asks OpenStreetMap at its 1 req/s limit,
+SCRAPER_GEOCODER=gazetteer uses SCRAPER_GAZETTEER, a local city,state,lat,lng
+csv, so runs and tests need no network, SCRAPER_GEOCODER=off skips it
+"""
+
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from dedup import US_STATES, location_key
+from fetcher import AsyncFetcher
+from metrics import metrics
+from rate_limiter import HostRateLimiter
+
+GEOCODE_CACHE_PATH = "./.scraper_cache/geocode.sqlite"
+
+GEOCODER = os.environ.get("SCRAPER_GEOCODER", "nominatim")
+GAZETTEER_PATH = os.environ.get("SCRAPER_GAZETTEER", "./gazetteer.csv")
+
+# places kept in the cache before the least recently used are dropped
+MAX_CACHE_ENTRIES = 100_000
+
+# seconds before a place nobody could find is asked about again
+NEGATIVE_TTL = 7 * 24 * 60 * 60
+
+# ~150m cells, prefixes of it give coarser ones (5 chars ~5km, 4 ~40km)
+GEOHASH_PRECISION = 7
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+
+# nominatim usage policy: at most one request a second, and say who you are
+nominatim_limiter = HostRateLimiter({"nominatim.openstreetmap.org": (1.0, 1)})
+NOMINATIM_HEADERS = {"User-Agent": "markitit-scraper/1.0", "Accept": "application/json"}
+
+# "ny" -> "new york", nominatim matches full state names
+STATE_NAMES = {abbreviation: name for name, abbreviation in US_STATES.items()}
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # bits alternate longitude, latitude
+        bounds, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+# (start, end) for where("geohash", ">=", start).where("geohash", "<", end)
+def prefix_range(prefix):
+    return prefix, prefix + "~"
+
+
+# "new york|ny", the cache/backend key for a location, None without a city
+def place_key(location):
+    key = location_key(location)
+    return "|".join(key) if key else None
+
+
+class GeocodeCache:
+    """
+    place key -> (lat, lng), or None for a place the backend couldnt find
+    sqlite so it survives runs, accessed_at drives LRU eviction past max_entries
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, max_entries=MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS places (
+                key TEXT PRIMARY KEY,
+                lat REAL,
+                lng REAL,
+                resolved_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS places_accessed ON places (accessed_at)")
+        self._conn.commit()
+
+    # {key: (lat, lng) or None} for the keys the cache can answer
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        with self._lock:
+            # sqlite caps bound parameters, 500 at a time stays well under it
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, lat, lng, resolved_at FROM places "
+                    f"WHERE key IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, lat, lng, resolved_at in rows:
+                    if lat is None and now - resolved_at > NEGATIVE_TTL:
+                        continue
+                    found[key] = (lat, lng) if lat is not None else None
+            self._conn.executemany(
+                "UPDATE places SET accessed_at = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._conn.commit()
+        return found
+
+    def put_many(self, results):
+        now = time.time()
+        rows = [
+            (key, *(coordinates or (None, None)), now, now) for key, coordinates in results.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO places (key, lat, lng, resolved_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self._conn.execute(
+            "DELETE FROM places WHERE key IN "
+            "(SELECT key FROM places ORDER BY accessed_at LIMIT ?)",
+            (count - self.max_entries,),
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Gazetteer:
+    """Offline backend, a csv with city,state,lat,lng columns"""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.places = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                key = place_key(row)
+                if key:
+                    self.places[key] = (float(row["lat"]), float(row["lng"]))
+
+    def lookup_many(self, keys):
+        return {key: self.places.get(key) for key in keys}
+
+
+class Nominatim:
+    """OpenStreetMap's geocoder, one request per place at their rate limit"""
+
+    def __init__(self, url=NOMINATIM_URL, rate_limiter=nominatim_limiter):
+        self.url = url
+        self.rate_limiter = rate_limiter
+
+    def _query_url(self, key):
+        city, state = key.split("|")
+        query = {
+            "city": city,
+            "state": STATE_NAMES.get(state, state),
+            "countrycodes": "us",
+            "format": "jsonv2",
+            "limit": 1,
+        }
+        return f"{self.url}?{urlencode(query)}"
+
+    async def _lookup_many(self, keys):
+        async with AsyncFetcher(
+            rate_limiter=self.rate_limiter, headers=NOMINATIM_HEADERS
+        ) as fetcher:
+            responses = await fetcher.fetch_all([self._query_url(key) for key in keys])
+        results = {}
+        for key, response in zip(keys, responses):
+            # errors stay out of the results so they are retried next time
+            if response is None or response.status_code != 200:
+                continue
+            try:
+                places = json.loads(response.content)
+            except ValueError:
+                continue
+            results[key] = (float(places[0]["lat"]), float(places[0]["lon"])) if places else None
+        return results
+
+    def lookup_many(self, keys):
+        return asyncio.run(self._lookup_many(list(keys)))
+
+
+def _set_geo(event, coordinates):
+    if coordinates is None:
+        return False
+    lat, lng = coordinates
+    event["geo"] = {"lat": lat, "lng": lng}
+    event["geohash"] = geohash(lat, lng)
+    return True
+
+
+class Geocoder:
+    """
+    Resolves places through memory, then the disk cache, then the backend
+    use as: with Geocoder(backend) as geocoder: geocoder.locate(event)
+    """
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else GeocodeCache()
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # {key: (lat, lng) or None} for every place key given
+    def geocode_many(self, keys):
+        keys = set(filter(None, keys))
+        with self._lock:
+            results = {key: self._memo[key] for key in keys if key in self._memo}
+        missing = keys - results.keys()
+        if missing:
+            cached = self.cache.get_many(missing)
+            metrics.inc("geocode_cache_hits_total", len(cached))
+            results.update(cached)
+            missing -= cached.keys()
+        if missing:
+            with metrics.timer("geocode_seconds"):
+                resolved = self.backend.lookup_many(sorted(missing))
+            metrics.inc("geocode_lookups_total", len(missing))
+            self.cache.put_many(resolved)
+            results.update(resolved)
+        with self._lock:
+            self._memo.update(results)
+        return results
+
+    def geocode(self, location):
+        key = place_key(location)
+        return self.geocode_many([key]).get(key) if key else None
+
+    # fill event["geo"] and event["geohash"], returns whether the place resolved
+    def locate(self, event):
+        return _set_geo(event, self.geocode(event.get("location")))
+
+    # locate for a batch, every place the batch misses goes to the backend
+    # in one lookup instead of one per event
+    def locate_many(self, events):
+        keys = {id(event): place_key(event.get("location")) for event in events}
+        found = self.geocode_many(keys.values())
+        for event in events:
+            _set_geo(event, found.get(keys[id(event)]))
+
+    def close(self):
+        self.cache.close()
+
+
+def make_geocoder(kind=GEOCODER):
+    if kind == "off":
+        return None
+    if kind == "gazetteer":
+        return Geocoder(Gazetteer(GAZETTEER_PATH))
+    if kind == "nominatim":
+        return Geocoder(Nominatim())
+    raise ValueError(f"Unknown geocoder: {kind}")
@@ -0,0 +1,72 @@
+"""
+Parser layer for the scrapers
+everything still hands back BeautifulSoup tags so the parse code stays the
+same, but the tree builder is swappable (lxml when installed, html.parser
+otherwise, or SCRAPER_HTML_PARSER=...) and parse_subtree only builds the one
+container a listing page is read from. With selectolax installed the
+container is cut out by its C parser first and only that fragment is
+handed to BeautifulSoup
+"""
+
+import os
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+
+    _DEFAULT_BACKEND = "lxml"
+except ImportError:
+    _DEFAULT_BACKEND = "html.parser"
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# bs4 tree builder, "lxml" or "html.parser"
+BACKEND = os.environ.get("SCRAPER_HTML_PARSER", _DEFAULT_BACKEND)
+
+# set SCRAPER_SELECTOLAX=0 to always use strainers
+USE_SELECTOLAX = HTMLParser is not None and os.environ.get("SCRAPER_SELECTOLAX") != "0"
+
+
+def make_soup(content, parse_only=None):
+    return BeautifulSoup(content, BACKEND, parse_only=parse_only)
+
+
+# precompiled css, use instead of lambdas in find() which run per tag
+def compile_selector(css):
+    return soupsieve.compile(css)
+
+
+class Subtree:
+    """
+    The one element a page is read from, e.g. Subtree("ul", {"class": "..."})
+    same name/attrs as soup.find(), turned into a strainer and a css selector
+    """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.strainer = SoupStrainer(name, attrs)
+        self.css = name + "".join(self._css_attr(key, value) for key, value in attrs.items())
+
+    @staticmethod
+    def _css_attr(key, value):
+        if key == "class":
+            return "".join(f".{cls}" for cls in value.split())
+        return f'[{key}="{value}"]'
+
+
+# parse only the subtree, returns its root tag or None if the page doesnt have it
+def parse_subtree(content, subtree):
+    if USE_SELECTOLAX:
+        node = HTMLParser(content).css_first(subtree.css)
+        if node is None:
+            return None
+        return make_soup(node.html).find(subtree.name, subtree.attrs)
+
+    soup = make_soup(content, parse_only=subtree.strainer)
+    return soup.find(subtree.name, subtree.attrs)
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from fetcher import host_key
+
+DEFAULT_CACHE_PATH = "./.scraper_cache/http_cache.sqlite"
+
+# total compressed body size kept on disk before LRU eviction kicks in
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+CacheEntry = namedtuple(
+    "CacheEntry",
+    ["url", "status", "headers", "etag", "last_modified", "content", "parsed", "fetched_at"],
+)
+
+
+class ResponseCache:
+    """
+    Persistent response cache for the fetcher, keyed by url
+    bodies are zlib compressed, ETag/Last-Modified are kept for conditional
+    requests, and whatever the scraper parsed out of a page is stored next to
+    it so an unchanged page never goes through BeautifulSoup again
+
+    ttls = {"eventbrite.com": seconds}, within the ttl a page is served
+    without touching the network, after it the page gets revalidated
+    """
+
+    def __init__(
+        self, path=DEFAULT_CACHE_PATH, ttls=None, default_ttl=0, max_bytes=DEFAULT_MAX_BYTES
+    ):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                size INTEGER,
+                parsed TEXT,
+                fetched_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    def ttl(self, url):
+        return self.ttls.get(host_key(url), self.default_ttl)
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl(entry.url)
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, etag, last_modified, body, parsed, fetched_at "
+                "FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url)
+            )
+            self._conn.commit()
+
+        url, status, headers, etag, last_modified, body, parsed, fetched_at = row
+        return CacheEntry(
+            url,
+            status,
+            json.loads(headers),
+            etag,
+            last_modified,
+            zlib.decompress(body),
+            json.loads(parsed) if parsed is not None else None,
+            fetched_at,
+        )
+
+    # headers to send so the server can answer 304
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, url, status, headers, content):
+        body = zlib.compress(content)
+        now = time.time()
+        with self._lock:
+            # new body means whatever was parsed before is stale
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, status, headers, etag, last_modified, body, size, parsed, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+                (
+                    url,
+                    status,
+                    json.dumps(dict(headers)),
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    body,
+                    len(body),
+                    now,
+                    now,
+                ),
+            )
+            self._evict()
+            self._conn.commit()
+
+    # 304, body is still good so restart its ttl
+    def revalidated(self, url):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url)
+            )
+            self._conn.commit()
+
+    def set_parsed(self, url, parsed):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET parsed = ? WHERE url = ?", (json.dumps(parsed), url)
+            )
+            self._conn.commit()
+
+    # drop least recently used rows until we are back under max_bytes
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at")
+        evict = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((url,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", evict)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,386 @@
+"""
+Event images -> small webp thumbnails we host ourselves
+"image" is whatever the source hotlinks (eventeny's og image, eventbrite's
+card/hero image), full size and on someone else's cdn, and every EventCard in a
+grid loaded it. ImageIngest downloads the images for a batch of events at once,
+hashes the bytes so the same picture under different urls (a series reusing
+its banner, the same event on two sources) is only encoded and stored once,
+and writes a fixed size webp to the store under that hash. The event gets
+"thumbnail", the path/url to load instead of "image"
+
+urls already handled on an earlier run are answered from a small sqlite index
+without touching the network
+
+SCRAPER_THUMBNAILS=storage uploads to firebase storage, and is the default
+when a bucket is configured, otherwise the default is off. =local writes into
+the app's public/ dir for dev. That dir is not deployed, so local only goes
+with a staging sink, never with one writing to firestore. Needs Pillow with
+webp support, without it thumbnails are skipped
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from fetcher import AsyncFetcher
+from metrics import metrics, source_of
+from rate_limiter import HostRateLimiter
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+IMAGE_INDEX_PATH = "./.scraper_cache/images.sqlite"
+
+# next serves public/ from the site root, so these load as /thumbnails/...
+THUMBNAIL_DIR = os.environ.get("SCRAPER_THUMBNAIL_DIR", "../../../public/thumbnails")
+THUMBNAIL_URL_PREFIX = "/thumbnails"
+
+STORAGE_BUCKET = os.environ.get("SCRAPER_STORAGE_BUCKET") or os.environ.get(
+    "NEXT_PUBLIC_FIREBASE_STORAGE_BUCKET"
+)
+STORAGE_PREFIX = "thumbnails"
+
+THUMBNAILS = os.environ.get("SCRAPER_THUMBNAILS") or ("storage" if STORAGE_BUCKET else "off")
+
+# EventCard's image box is 10rem tall and about twice as wide, at 2x density
+THUMBNAIL_SIZE = (600, 320)
+THUMBNAIL_QUALITY = 80
+
+# bigger downloads are skipped, nobody needs a 20MB banner for a card
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# seconds before an image that failed to download or decode is tried again
+FAILED_TTL = 24 * 60 * 60
+
+# thumbnails encoded at once, pillow releases the gil while it works
+ENCODE_WORKERS = 4
+
+IMAGE_HEADERS = {"Accept": "image/webp,image/avif,image/*,*/*;q=0.8"}
+
+# (requests per second, burst) per image host, a whole ingest batch is fetched
+# at once and cdns serving static files take far more than the sites' pages
+IMAGE_RATE_LIMITS = {
+    "img.evbuc.com": (20.0, 32),
+    "cdn.eventeny.com": (20.0, 32),
+}
+# for image hosts not listed above
+IMAGE_DEFAULT_RATE = (5.0, 8)
+
+# max in-flight downloads per image host
+IMAGE_HOST_CONCURRENCY = {"img.evbuc.com": 8, "cdn.eventeny.com": 8}
+
+image_rate_limiter = HostRateLimiter(IMAGE_RATE_LIMITS, default=IMAGE_DEFAULT_RATE)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+# fixed size webp, cropped to fill like the card does (object-fit: cover)
+def make_thumbnail(content, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+class ImageIndex:
+    """
+    image url -> (content hash, thumbnail path), path None when the image
+    couldnt be fetched or decoded, those are retried after FAILED_TTL
+    """
+
+    def __init__(self, path=IMAGE_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                hash TEXT,
+                path TEXT,
+                checked_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS images_hash ON images (hash)")
+        self._conn.commit()
+
+    # {url: path or None} for the urls the index can answer
+    def get_many(self, urls):
+        urls = list(urls)
+        found = {}
+        now = time.time()
+        with self._lock:
+            # sqlite caps bound parameters, 500 at a time stays well under it
+            for start in range(0, len(urls), 500):
+                chunk = urls[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT url, path, checked_at FROM images "
+                    f"WHERE url IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for url, path, checked_at in rows:
+                    if path is None and now - checked_at > FAILED_TTL:
+                        continue
+                    found[url] = path
+        return found
+
+    # path of a thumbnail already stored for this content, under any url
+    def path_for_hash(self, digest):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM images WHERE hash = ? AND path IS NOT NULL LIMIT 1", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    # {url: (hash, path)}, both None for a failure
+    def put_many(self, results):
+        now = time.time()
+        rows = [(url, digest, path, now) for url, (digest, path) in results.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO images (url, hash, path, checked_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalImageStore:
+    """Thumbnails as files under root, fanned out by the first 2 hash chars"""
+
+    def __init__(self, root=THUMBNAIL_DIR, url_prefix=THUMBNAIL_URL_PREFIX):
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def _name(self, digest):
+        return f"{digest[:2]}/{digest}.webp"
+
+    def path(self, digest):
+        return f"{self.url_prefix}/{self._name(digest)}"
+
+    def exists(self, digest):
+        return os.path.exists(os.path.join(self.root, self._name(digest)))
+
+    def put(self, digest, data):
+        target = os.path.join(self.root, self._name(digest))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # write then rename, a half written file never shows up under the hash
+        partial = f"{target}.{threading.get_ident()}.tmp"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, target)
+        return self.path(digest)
+
+
+class StorageImageStore:
+    """Thumbnails in the app's firebase storage bucket, same layout as local"""
+
+    def __init__(self, bucket_name=STORAGE_BUCKET, prefix=STORAGE_PREFIX):
+        from firebase_admin import storage
+
+        self.bucket = storage.bucket(bucket_name)
+        self.prefix = prefix
+
+    def _name(self, digest):
+        return f"{self.prefix}/{digest[:2]}/{digest}.webp"
+
+    # the download url firebase serves public reads from (next.config allows the host)
+    def path(self, digest):
+        return (
+            f"https://firebasestorage.googleapis.com/v0/b/{self.bucket.name}/o/"
+            f"{quote(self._name(digest), safe='')}?alt=media"
+        )
+
+    def exists(self, digest):
+        return self.bucket.blob(self._name(digest)).exists()
+
+    def put(self, digest, data):
+        blob = self.bucket.blob(self._name(digest))
+        # content addressed, a name never gets different bytes
+        blob.cache_control = "public, max-age=31536000, immutable"
+        blob.upload_from_string(data, content_type="image/webp")
+        return self.path(digest)
+
+
+class ImageIngest:
+    """
+    Downloads, dedupes and thumbnails event images a batch at a time
+    the fetcher lives on its own event loop thread for the whole run so image
+    hosts keep their pooled connections between batches
+    use as: with ImageIngest(store) as images: images.attach(events)
+    """
+
+    def __init__(self, store, index=None, rate_limiter=None, host_concurrency=None):
+        self.store = store
+        self.index = index if index is not None else ImageIndex()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else image_rate_limiter
+        self.host_concurrency = (
+            host_concurrency if host_concurrency is not None else IMAGE_HOST_CONCURRENCY
+        )
+        self._fetcher = None
+        self._loop = None
+        self._thread = None
+        self._encoder = ThreadPoolExecutor(max_workers=ENCODE_WORKERS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self, coroutine):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name="images", daemon=True
+            )
+            self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _fetch_all(self, urls):
+        if self._fetcher is None:
+            self._fetcher = AsyncFetcher(
+                host_concurrency=self.host_concurrency,
+                rate_limiter=self.rate_limiter,
+                headers=IMAGE_HEADERS,
+            )
+        return await self._fetcher.fetch_all(urls)
+
+    # the downloaded bytes, None when it isnt worth thumbnailing
+    def _content(self, url, response):
+        if response is None or response.status_code != 200:
+            metrics.inc("image_errors_total", source=source_of(url), error="fetch")
+            return None
+        if len(response.content) > MAX_IMAGE_BYTES:
+            metrics.inc("image_errors_total", source=source_of(url), error="too_large")
+            return None
+        metrics.inc("image_bytes_total", len(response.content), source=source_of(url))
+        return response.content
+
+    # thumbnail path for content never stored before, None if it doesnt decode
+    # or the store wont take it, one failed upload doesnt stop the batch
+    def _store(self, digest, content):
+        try:
+            if self.store.exists(digest):
+                return self.store.path(digest)
+        except Exception as e:
+            print(f"Could not check thumbnail {digest}: {e}")
+            metrics.inc("image_errors_total", error="store")
+            return None
+        try:
+            with metrics.timer("thumbnail_seconds"):
+                data = make_thumbnail(content)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            metrics.inc("image_errors_total", error="decode")
+            return None
+        try:
+            path = self.store.put(digest, data)
+        except Exception as e:
+            print(f"Could not store thumbnail {digest}: {e}")
+            metrics.inc("image_errors_total", error="store")
+            return None
+        metrics.inc("thumbnails_written_total")
+        metrics.inc("thumbnail_bytes_total", len(data))
+        return path
+
+    # {url: thumbnail path or None} for every url given
+    def thumbnail_many(self, urls):
+        urls = {url for url in urls if url and url.startswith(("http://", "https://"))}
+        results = self.index.get_many(urls)
+        metrics.inc("image_index_hits_total", len(results))
+        missing = sorted(urls - results.keys())
+        if not missing:
+            return results
+
+        with metrics.timer("image_fetch_seconds"):
+            responses = self._run(self._fetch_all(missing))
+
+        # hash -> (content, urls), so each distinct picture is encoded once
+        contents = {}
+        resolved = {}
+        for url, response in zip(missing, responses):
+            content = self._content(url, response)
+            if content is None:
+                resolved[url] = (None, None)
+                continue
+            digest = content_hash(content)
+            contents.setdefault(digest, (content, []))[1].append(url)
+
+        paths = {}
+        to_encode = []
+        for digest in contents:
+            path = self.index.path_for_hash(digest)
+            if path:
+                paths[digest] = path
+            else:
+                to_encode.append(digest)
+        metrics.inc("image_dedup_hits_total", len(missing) - len(resolved) - len(to_encode))
+
+        encoded = self._encoder.map(lambda d: self._store(d, contents[d][0]), to_encode)
+        paths.update(zip(to_encode, encoded))
+
+        for digest, (_, digest_urls) in contents.items():
+            for url in digest_urls:
+                resolved[url] = (digest if paths[digest] else None, paths[digest])
+        self.index.put_many(resolved)
+        results.update({url: path for url, (_, path) in resolved.items()})
+        return results
+
+    # set event["thumbnail"] on each event whose image could be thumbnailed
+    def attach(self, events):
+        paths = self.thumbnail_many(event.get("image") for event in events)
+        for event in events:
+            path = paths.get(event.get("image"))
+            if path:
+                event["thumbnail"] = path
+
+    def close(self):
+        if self._loop is not None:
+            if self._fetcher is not None:
+                self._run(self._fetcher.__aexit__(None, None, None))
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+        self._encoder.shutdown()
+        self.index.close()
+
+
+# writes_firestore: the events end up in firestore, where local paths would
+# point at files the deployed site doesnt have
+def make_image_ingest(kind=THUMBNAILS, writes_firestore=True):
+    if kind == "off":
+        return None
+    if Image is None:
+        print("Pillow isnt installed, skipping thumbnails (pip install pillow)")
+        return None
+    if kind == "local":
+        if writes_firestore:
+            raise ValueError(
+                "SCRAPER_THUMBNAILS=local only works with a staging sink "
+                "(SCRAPER_SINK=sqlite or jsonl), public/thumbnails isnt deployed"
+            )
+        store = LocalImageStore()
+    elif kind == "storage":
+        store = StorageImageStore()
+    else:
+        raise ValueError(f"Unknown thumbnail store: {kind}")
+    return ImageIngest(store)
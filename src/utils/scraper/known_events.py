@@ -0,0 +1,120 @@
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from dedup import DedupIndex
+from metrics import metrics
+
+
+# what from_firestore reads per event, ids and fingerprints for change
+# detection plus what the dedup index matches and merges on
+KNOWN_FIELDS = [
+    "id",
+    "scrapedAt",
+    "checkedAt",
+    "fingerprint",
+    "fieldHashes",
+    "name",
+    "location",
+    "startDate",
+    "image",
+    "source",
+    "sources",
+    "mergedIds",
+]
+
+
+# stable firestore document id for a make_event_id() key, so the same event
+# always lands on the same document and dedup needs no queries
+def event_doc_id(event_id):
+    return hashlib.sha256(event_id.encode("utf-8")).hexdigest()[:32]
+
+
+class KnownEvents:
+    """
+    Event ids already in the db plus the ones seen so far this run
+    scrapers call claim() with make_event_id(...) before fetching a detail page,
+    so pages are only fetched for new events or ones older than refresh_age
+    ids merged into another event as near duplicates count as stored too
+    """
+
+    def __init__(
+        self,
+        scraped_at=None,
+        refresh_age=None,
+        doc_ids=None,
+        fingerprints=None,
+        field_hashes=None,
+        canonical=None,
+        dedup=None,
+    ):
+        # event id -> when its details were last read, checkedAt when an
+        # unchanged refetch recorded one, else scrapedAt (None if never recorded)
+        self.scraped_at = scraped_at or {}
+        # event id -> document id, for events stored before ids were hashed
+        self.doc_ids = doc_ids or {}
+        # event id -> stored fingerprint / fieldHashes, for change detection
+        self.fingerprints = fingerprints or {}
+        self.field_hashes = field_hashes or {}
+        # merged event id -> id of the canonical event it was merged into
+        self.canonical = canonical or {}
+        self.dedup = dedup if dedup is not None else DedupIndex()
+        # seconds, None means stored events are never refetched
+        self.refresh_age = refresh_age
+        self.seen = set()
+        self._lock = threading.Lock()
+
+    # documents = (doc_id, event) pairs, the stored events of any sink
+    @classmethod
+    def from_documents(cls, documents, refresh_age=None):
+        known = cls(refresh_age=refresh_age)
+        for doc_id, data in documents:
+            event_id = data.get("id")
+            if not event_id:
+                continue
+            last_read = data.get("checkedAt") or data.get("scrapedAt")
+            known.scraped_at[event_id] = last_read
+            if doc_id != event_doc_id(event_id):
+                known.doc_ids[event_id] = doc_id
+            if data.get("fingerprint"):
+                known.fingerprints[event_id] = data["fingerprint"]
+                known.field_hashes[event_id] = data.get("fieldHashes")
+            for merged_id in data.get("mergedIds") or []:
+                known.scraped_at[merged_id] = last_read
+                known.canonical[merged_id] = event_id
+            known.dedup.add(event_id, data)
+        print(f"Loaded {len(known.scraped_at)} known event ids")
+        return known
+
+    # one projection query at startup instead of a lookup per event
+    @classmethod
+    def from_firestore(cls, events_ref, refresh_age=None):
+        def documents():
+            for doc in events_ref.select(KNOWN_FIELDS).stream():
+                metrics.inc("firestore_reads_total", op="known_events")
+                yield doc.id, doc.to_dict()
+
+        return cls.from_documents(documents(), refresh_age)
+
+    def is_stored(self, event_id):
+        return event_id in self.scraped_at
+
+    def doc_id(self, event_id):
+        return self.doc_ids.get(event_id) or event_doc_id(event_id)
+
+    def is_stale(self, event_id):
+        if self.refresh_age is None:
+            return False
+        scraped_at = self.scraped_at.get(event_id)
+        if scraped_at is None:
+            return True
+        age = datetime.now(timezone.utc) - scraped_at
+        return age.total_seconds() > self.refresh_age
+
+    # True if the caller should go ahead and fetch this event's details
+    def claim(self, event_id):
+        with self._lock:
+            if event_id in self.seen:
+                return False
+            self.seen.add(event_id)
+            return event_id not in self.scraped_at or self.is_stale(event_id)
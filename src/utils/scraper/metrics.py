@@ -0,0 +1,282 @@
+"""
+Counters and histograms for the scrape/ingest pipeline
+every stage records into the module level `metrics`, labelled by source
+("eventeny", "eventbrite", "zapp") where there is one. At the end of a run
+write_report() dumps it as a JSON run report and in Prometheus text format
+(node_exporter textfile collector can pick the .prom file up as is)
+
+profile(stage) runs a stage under cProfile, or pyinstrument's sampling
+profiler with SCRAPER_PROFILER=pyinstrument, when the stage is listed in
+SCRAPER_PROFILE, e.g. SCRAPER_PROFILE=eventbrite,ingest or SCRAPER_PROFILE=all
+only one profiler can run in a process, stages that start while another one
+is being profiled run unprofiled (list just the stage you care about)
+"""
+
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+METRICS_DIR = "./.scraper_cache/metrics"
+PROFILE_DIR = "./.scraper_cache/profiles"
+
+PROFILE_STAGES = {
+    stage.strip() for stage in os.environ.get("SCRAPER_PROFILE", "").split(",") if stage.strip()
+}
+PROFILER = os.environ.get("SCRAPER_PROFILER", "cprofile")
+
+# seconds, for latencies from a cached parse up to a slow selenium page
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# host -> source label, same names the scraper uses for its sources
+SOURCE_HOSTS = {
+    "eventeny.com": "eventeny",
+    "eventbrite.com": "eventbrite",
+    "zapplication.org": "zapp",
+}
+
+# prometheus metric names get this in front
+PREFIX = "scraper_"
+
+
+def source_of(url):
+    host = urlsplit(url).hostname or ""
+    host = host[4:] if host.startswith("www.") else host
+    return SOURCE_HOSTS.get(host, host)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # counts[i] is observations <= buckets[i], the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # upper bound of the bucket the q-th observation falls in
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Thread safe registry, metrics are created on first use
+    metrics.inc("requests_total", source="eventbrite", status="200")
+    metrics.observe("fetch_seconds", 0.31, source="eventbrite")
+    with metrics.timer("parse_seconds", source="eventeny"): ...
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.started = datetime.now(timezone.utc)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self.started = datetime.now(timezone.utc)
+
+    def report(self):
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        finished = datetime.now(timezone.utc)
+        return {
+            "started": self.started.isoformat(),
+            "finished": finished.isoformat(),
+            "seconds": round((finished - self.started).total_seconds(), 3),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    @staticmethod
+    def _labels(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (
+            (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in pairs
+        )
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{self._labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{self._labels(labels, le=bound)} {cumulative}")
+            lines.append(f'{metric}_bucket{self._labels(labels, le="+Inf")} {histogram.count}')
+            lines.append(f"{metric}_sum{self._labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    # run-<time>.json with the full report, scraper.prom overwritten each run
+    def write_report(self, directory=METRICS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        stamp = self.started.strftime("%Y%m%dT%H%M%S")
+        report_path = os.path.join(directory, f"run-{stamp}.json")
+        with open(report_path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        with open(os.path.join(directory, "scraper.prom"), "w") as f:
+            f.write(self.to_prometheus())
+        print(f"Metrics written to {report_path}")
+        return report_path
+
+
+metrics = Metrics()
+
+
+# held by whichever profile() got to start its profiler, python 3.12+ refuses
+# to start a second one anywhere in the process
+_profiler_lock = threading.Lock()
+
+
+def profiling(stage):
+    return stage is not None and (stage in PROFILE_STAGES or "all" in PROFILE_STAGES)
+
+
+# profiles the calling thread only, so wrap the code inside the thread doing
+# the work (the event loop thread for the async scrapers)
+# part tells apart several threads of one stage in the file name
+@contextlib.contextmanager
+def profile(stage, part=None):
+    if not profiling(stage):
+        yield
+        return
+
+    name = f"{stage}.{part}" if part else stage
+    if not _profiler_lock.acquire(blocking=False):
+        print(f"Not profiling {name}, another stage is already being profiled")
+        yield
+        return
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler = _start_profiler()
+    except Exception as e:
+        # e.g. a debugger or coverage already holds the profiling hook
+        _profiler_lock.release()
+        print(f"Not profiling {name}: {e}")
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            _stop_profiler(profiler, name)
+        finally:
+            _profiler_lock.release()
+
+
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, name):
+    if PROFILER == "pyinstrument":
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, f"{name}.txt")
+        with open(path, "w") as f:
+            f.write(profiler.output_text(unicode=True))
+        print(f"Profile for {name} written to {path}")
+        return
+
+    profiler.disable()
+    path = os.path.join(PROFILE_DIR, f"{name}.prof")
+    profiler.dump_stats(path)
+    print(f"Profile for {name} written to {path} (view with python -m pstats)")
@@ -0,0 +1,37 @@
+import json
+import os
+import threading
+
+
+class PageDepths:
+    """
+    How many result pages each search had on the last run, saved as json
+    scrape_eventbrite uses it to size the first window of pages it fetches
+    at once, and stops early anyway when a page comes back empty or short
+    """
+
+    def __init__(self, path, depths=None):
+        self.path = path
+        self.depths = depths or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return cls(path)
+
+    def get(self, key, default=None):
+        return self.depths.get(key, default)
+
+    def record(self, key, depth):
+        with self._lock:
+            self.depths[key] = depth
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self.depths, f, indent=2, sort_keys=True)
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+
+from metrics import metrics, profile
+
+# events buffered between a scraper and the ingest loop, producers wait when full
+DEFAULT_BUFFER_SIZE = 200
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+# blocking put that gives up once the consumer has gone away
+def _put(items, stopped, item):
+    while not stopped.is_set():
+        try:
+            items.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iterate_async(make_agen, buffer_size=DEFAULT_BUFFER_SIZE, stage=None):
+    """
+    Turn an async generator into a plain generator
+    the async side runs on its own event loop in a background thread and
+    hands items over through a bounded queue, so sync code (the ingest loop)
+    can consume events while fetching is still going on
+    make_agen is called inside the loop thread, e.g. lambda: _scrape_eventeny(...)
+    stage names the loop thread for metrics.profile()
+    """
+    items = queue.Queue(buffer_size)
+    stopped = threading.Event()
+
+    def put(item):
+        return _put(items, stopped, item)
+
+    async def pump():
+        async for item in make_agen():
+            if not await asyncio.to_thread(put, item):
+                break
+
+    # the consumer blocks on items.get() until this thread says it is done,
+    # so anything failing here (loop setup, profiler) has to reach it too
+    def run():
+        try:
+            with profile(stage, "loop"):
+                asyncio.run(pump())
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        thread.join(timeout=5)
+
+
+def merge_sources(sources, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Run several event generators at once and yield from all of them
+    sources = {"eventbrite": lambda: scrape_eventbrite(known_events), ...}
+    each source runs in its own thread, so the run takes as long as the
+    slowest source instead of the sum, timing per source is printed at the end
+    """
+    items = queue.Queue(buffer_size)
+    stopped = threading.Event()
+    timings = {}
+
+    # not profiled here, a source's work runs on its iterate_async loop thread
+    # (profiled there as <stage>.loop) and this thread mostly waits on it,
+    # holding the one profiler here would leave the loop unprofiled
+    def run(name, make_iter):
+        started = time.monotonic()
+        count = 0
+        try:
+            for item in make_iter():
+                if not _put(items, stopped, item):
+                    break
+                count += 1
+        except Exception as e:
+            print(f"Error in source {name}: {e}")
+            metrics.inc("source_errors_total", source=name)
+        finally:
+            elapsed = time.monotonic() - started
+            timings[name] = (elapsed, count)
+            metrics.inc("events_scraped_total", count, source=name)
+            metrics.inc("source_seconds_total", elapsed, source=name)
+            print(f"{name} finished: {count} events in {elapsed:.1f}s")
+            _put(items, stopped, _DONE)
+
+    threads = [
+        threading.Thread(target=run, args=(name, make_iter), name=name, daemon=True)
+        for name, make_iter in sources.items()
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    remaining = len(threads)
+    try:
+        while remaining:
+            item = items.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    print(f"All sources finished in {time.monotonic() - started:.1f}s")
+    for name, (elapsed, count) in timings.items():
+        print(f"  {name}: {count} events, {elapsed:.1f}s")
+
+
+# lists of up to size items, the last one shorter, without reading ahead
+def batched(items, size):
+    items = iter(items)
+    while batch := list(itertools.islice(items, size)):
+        yield batch
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from fetcher import THROTTLE_STATUSES, host_key
+from metrics import metrics, source_of
+
+# used for hosts with nothing configured
+DEFAULT_RATE = (1.0, 1)
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations instead of blocking
+    callers sleep for the returned delay, so the same bucket works for
+    asyncio tasks, threads and plain sync code
+
+    throttle() halves the rate (down to min_rate) and on_success() creeps it
+    back to the configured rate, so a host that starts returning 429s gets
+    slowed down on its own
+    """
+
+    def __init__(self, rate, burst, min_rate=None):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate or self.base_rate / 16
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # nothing goes out before this, set from Retry-After
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # take a token now, return how long the caller has to wait for it
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def throttle(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            # drop saved up tokens so the next requests actually slow down
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def on_success(self):
+        if self.rate >= self.base_rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 20)
+
+
+class HostRateLimiter:
+    """
+    One bucket per domain, shared by every fetch path in the process
+    limits = {"eventbrite.com": (requests_per_second, burst)}
+    """
+
+    def __init__(self, limits=None, default=DEFAULT_RATE):
+        self.limits = limits or {}
+        self.default = default
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = host_key(url)
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self.limits.get(host, self.default)
+                self._buckets[host] = TokenBucket(rate, burst)
+            return self._buckets[host]
+
+    async def acquire(self, url):
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            metrics.inc("throttle_seconds_total", wait, source=source_of(url))
+            await asyncio.sleep(wait)
+
+    # for selenium and other blocking callers
+    def wait(self, url):
+        wait = self.bucket(url).reserve()
+        if wait > 0:
+            metrics.inc("throttle_seconds_total", wait, source=source_of(url))
+            time.sleep(wait)
+
+    def record(self, url, status_code, retry_after=None):
+        bucket = self.bucket(url)
+        if status_code in THROTTLE_STATUSES:
+            delay = parse_retry_after(retry_after)
+            metrics.inc("throttled_responses_total", source=source_of(url), status=status_code)
+            print(
+                f"throttled by {host_key(url)} ({status_code}), "
+                f"rate now {max(bucket.min_rate, bucket.rate / 2):.2f}/s"
+            )
+            bucket.throttle(delay)
+        else:
+            bucket.on_success()
+
+
+# Retry-After is either seconds or an http date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,552 @@
+"""
+Vendor x event scores, precomputed in batch
+/api/rankEvents scores one vendor against every event per request, this scores
+every vendor against every eventsFormatted doc in one numpy pass per chunk of
+events and keeps the top TOP_N per vendor in vendorEventRankings/<vendorId>
+({"lastRanked", "rankedEvents": [{"id", "score", "scoreBreakdown"}]}, the
+endpoint's vendorRankings cache plus the per-factor points the event page
+shows) so ranking is a single document read. /api/rankEvents reads that doc
+first and only scores per request for vendors this hasnt ranked yet
+
+the factors, points, rank multipliers and event fields are the ones in
+src/app/api/rankEvents/route.ts, keep the two in step
+
+python3 scoring.py          # every vendor against every upcoming event
+python3 scoring.py --since 2025-05-01
+"""
+
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from batch_writer import BatchWriter
+from dates import DEFAULT_TIMEZONE, is_unparsed
+from metrics import metrics
+
+VENDORS_COLLECTION = "vendorProfile"
+# what the app shows and the endpoint ranks, written by functions/src/formatEvents.ts
+# from each scraped event under the same doc id
+EVENTS_COLLECTION = "eventsFormatted"
+RANKINGS_COLLECTION = "vendorEventRankings"
+
+# (priority name vendors rank, max points), same order as factorMeta in route.ts
+FACTORS = [
+    ("Event Type/Theme", 15),
+    ("Location", 20),
+    ("Costs", 20),
+    ("Target Audience", 15),
+    ("Number of Vendors", 8),
+    ("Schedule", 10),
+    ("Product Category Relevance", 10),
+    ("Event Category", 5),
+    ("Estimated Headcount", 7),
+]
+FACTOR_INDEX = {name: i for i, (name, _) in enumerate(FACTORS)}
+# each factor's key in the endpoint's ScoreBreakdown, <key>Raw and <key>Max
+BREAKDOWN_KEYS = [
+    "eventTypeScore",
+    "locationScore",
+    "budgetScore",
+    "demographicsScore",
+    "eventSizeScore",
+    "scheduleScore",
+    "productsScore",
+    "categoryScore",
+    "headcountScore",
+]
+MAX_POINTS = np.array([points for _, points in FACTORS], dtype=np.float64)
+
+# multiplier for the factor a vendor ranked 1st, 2nd, ...
+RANK_MULTIPLIERS = [1.5, 1.4, 1.3, 1.2, 1.1, 1.0, 0.9, 0.8, 0.7]
+
+# share of a factor's points when only one side has data
+NEUTRAL_SCORE_PROPORTION = 0.5
+
+# added to every normalized score before clamping to 0-100, like the endpoint
+SCORE_OFFSET = 15
+
+# events kept per vendor
+TOP_N = 100
+
+# events scored per numpy pass, memory is vendors x EVENT_CHUNK per factor
+EVENT_CHUNK = 2000
+
+# what the scores read off an eventsFormatted doc
+EVENT_FIELDS = [
+    "category_tags",
+    "location",
+    "booth_fees",
+    "demographic_guess",
+    "vendor_categories",
+    "num_vendors",
+    "estimated_headcount",
+    "startDate",
+    "endDate",
+]
+
+# what the scores read off a vendor profile
+VENDOR_FIELDS = [
+    "eventPreference",
+    "cities",
+    "demographic",
+    "categories",
+    "schedule",
+    "preferredEventSize",
+    "budget",
+    "eventPriorityFactors",
+]
+
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# the endpoint walks at most this many days of a long event
+MAX_SCHEDULE_DAYS = 365
+
+
+def _lower_set(values):
+    if not isinstance(values, list):
+        return set()
+    return {value.lower().strip() for value in values if isinstance(value, str) and value.strip()}
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+# (min, max) or None, same rules as parseBoothFee in route.ts
+def parse_booth_fee(fee):
+    if fee is None:
+        return None
+    if isinstance(fee, (int, float)) and not isinstance(fee, bool):
+        return (float(fee), float(fee)) if fee >= 0 else None
+    if isinstance(fee, dict):
+        prices = [value for value in fee.values() if _number(value) is not None and value >= 0]
+        return (float(min(prices)), float(max(prices))) if prices else None
+    if not isinstance(fee, str) or not fee.strip():
+        return None
+
+    lowered = fee.lower().strip()
+    if lowered in ("n/a", "free"):
+        return 0.0, 0.0
+    cleaned = re.sub(r"[$\s,]", "", fee)
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)", cleaned)
+    if match:
+        low, high = float(match[1]), float(match[2])
+        return min(low, high), max(low, high)
+    if re.fullmatch(r"\d+(?:\.\d+)?", cleaned):
+        return float(cleaned), float(cleaned)
+    match = re.match(r"(?:starts at|from)\s*(\d+(?:\.\d+)?)", lowered)
+    if match:
+        return float(match[1]), float("inf")
+    return None
+
+
+# weekdays (0 = monday) an event runs on, stepping a day at a time from the start
+# in the events' local time, the stored timestamps are utc
+def event_days(start, end):
+    if not isinstance(start, datetime) or not isinstance(end, datetime) or end < start:
+        return set()
+    if start.tzinfo:
+        start = start.astimezone(ZoneInfo(DEFAULT_TIMEZONE))
+    days = set()
+    current = start
+    for _ in range(MAX_SCHEDULE_DAYS):
+        if current > end:
+            break
+        days.add(current.weekday())
+        current += timedelta(days=1)
+    return days
+
+
+def _multi_hot(sets, vocabulary):
+    matrix = np.zeros((len(sets), len(vocabulary)), dtype=np.float32)
+    for row, values in enumerate(sets):
+        for value in values:
+            column = vocabulary.get(value)
+            if column is not None:
+                matrix[row, column] = 1.0
+    return matrix
+
+
+class VendorFeatures:
+    """Vendor side of every factor as arrays, one row per vendor"""
+
+    def __init__(self, vendors):
+        self.ids = [vendor_id for vendor_id, _ in vendors]
+        profiles = [profile for _, profile in vendors]
+        self.preferences = [_lower_set(p.get("eventPreference")) for p in profiles]
+        self.cities = [_lower_set(p.get("cities")) for p in profiles]
+        self.demographics = [_lower_set(p.get("demographic")) for p in profiles]
+        self.categories = [_lower_set(p.get("categories")) for p in profiles]
+        days = [_lower_set((p.get("schedule") or {}).get("preferredDays")) for p in profiles]
+        self.days = _multi_hot(days, {day: i for i, day in enumerate(DAY_NAMES)})
+
+        sizes = [p.get("preferredEventSize") or {} for p in profiles]
+        size_min = [_number(size.get("min")) for size in sizes]
+        size_max = [_number(size.get("max")) for size in sizes]
+        # the endpoint only uses a size range when both ends are set
+        has_size = [low is not None and high is not None for low, high in zip(size_min, size_max)]
+        self.size_min = np.array(
+            [low if ok else np.nan for low, ok in zip(size_min, has_size)], dtype=np.float64
+        )[:, None]
+        self.size_max = np.array(
+            [high if ok else np.nan for high, ok in zip(size_max, has_size)], dtype=np.float64
+        )[:, None]
+
+        fees = [_number((p.get("budget") or {}).get("maxVendorFee")) for p in profiles]
+        self.max_fee = np.array(
+            [fee if fee is not None and fee >= 0 else np.nan for fee in fees], dtype=np.float64
+        )[:, None]
+
+        self.weights = np.zeros((len(profiles), len(FACTORS)), dtype=np.float64)
+        for row, profile in enumerate(profiles):
+            priorities = profile.get("eventPriorityFactors")
+            if not isinstance(priorities, list) or len(priorities) != len(FACTORS):
+                priorities = [name for name, _ in FACTORS]
+            for rank, name in enumerate(priorities):
+                if name in FACTOR_INDEX:
+                    self.weights[row, FACTOR_INDEX[name]] += RANK_MULTIPLIERS[rank]
+        max_sum = self.weights @ MAX_POINTS
+        self.max_sum = np.where(max_sum > 0, max_sum, MAX_POINTS.sum())[:, None]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class EventFeatures:
+    """Event side of every factor as arrays, one row per event"""
+
+    def __init__(self, events):
+        self.ids = [event_id for event_id, _ in events]
+        data = [event for _, event in events]
+        self.tags = [_lower_set(event.get("category_tags")) for event in data]
+        self.cities = [
+            {city} if (city := ((event.get("location") or {}).get("city") or "").lower().strip())
+            else set()
+            for event in data
+        ]
+        self.demographics = [_lower_set(event.get("demographic_guess")) for event in data]
+        self.categories = [_lower_set(event.get("vendor_categories")) for event in data]
+        self.num_vendors = _counts(event.get("num_vendors") for event in data)
+        self.headcount = _counts(event.get("estimated_headcount") for event in data)
+
+        fees = [parse_booth_fee(event.get("booth_fees")) for event in data]
+        self.fee_min = np.array([[fee[0] if fee else np.nan for fee in fees]], dtype=np.float64)
+        self.fee_max = np.array([[fee[1] if fee else np.nan for fee in fees]], dtype=np.float64)
+
+        self.days = np.zeros((len(data), len(DAY_NAMES)), dtype=np.float32)
+        for row, event in enumerate(data):
+            for day in event_days(_date(event.get("startDate")), _date(event.get("endDate"))):
+                self.days[row, day] = 1.0
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# (1 x events) non-negative numbers, nan where the event has none
+def _counts(values):
+    numbers = [_number(value) for value in values]
+    return np.array(
+        [[value if value is not None and value >= 0 else np.nan for value in numbers]],
+        dtype=np.float64,
+    )
+
+
+def _date(value):
+    return None if is_unparsed(value) else value
+
+
+# both sides, one side or neither side has data -> raw points for each pair
+def _presence(vendor_has, event_has, both, max_points):
+    neutral = max_points * NEUTRAL_SCORE_PROPORTION
+    vendor_has = vendor_has[:, None]
+    event_has = event_has[None, :]
+    return np.where(
+        vendor_has & event_has, both, np.where(vendor_has | event_has, neutral, 0.0)
+    )
+
+
+def _overlap_scores(vendor_sets, event_sets, max_points, any_match=False):
+    vocabulary = {}
+    for values in (*vendor_sets, *event_sets):
+        for value in values:
+            vocabulary.setdefault(value, len(vocabulary))
+    vendors = _multi_hot(vendor_sets, vocabulary)
+    events = _multi_hot(event_sets, vocabulary)
+    matches = vendors @ events.T
+    vendor_counts = vendors.sum(axis=1)
+    event_counts = events.sum(axis=1)
+    if any_match:
+        both = (matches > 0) * max_points
+    else:
+        largest = np.maximum(np.maximum(vendor_counts[:, None], event_counts[None, :]), 1)
+        both = matches / largest * max_points
+    return _presence(vendor_counts > 0, event_counts > 0, both, max_points)
+
+
+def _location_scores(vendors, events, max_points):
+    return _overlap_scores(vendors.cities, events.cities, max_points, any_match=True)
+
+
+def _budget_scores(vendors, events, max_points):
+    budget, fee_min, fee_max = vendors.max_fee, events.fee_min, events.fee_max
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spread = np.where(np.isinf(fee_max), np.where(fee_min > 0, fee_min, 1.0), fee_max - fee_min)
+        proportion = np.minimum(1.0, (budget - fee_min) / spread)
+        over_base = np.where(budget > 0, budget, max_points)
+        over = np.minimum(1.0, (fee_min - budget) / over_base)
+        both = np.select(
+            [
+                fee_max == 0,
+                (budget >= fee_min) & np.isfinite(fee_max) & (budget >= fee_max),
+                budget >= fee_min,
+            ],
+            [max_points, max_points, max_points * (0.7 + 0.3 * proportion)],
+            np.maximum(0.0, max_points * (1 - over)),
+        )
+    return _presence(~np.isnan(budget[:, 0]), ~np.isnan(fee_min[0]), both, max_points)
+
+
+# event value against the vendor's preferred min-max, linear penalty outside it
+def _range_scores(vendors, values, max_points, base):
+    low, high = vendors.size_min, vendors.size_max
+    with np.errstate(invalid="ignore", divide="ignore"):
+        below = values < low
+        diff = np.where(below, low - values, np.where(np.isinf(high), 0.0, values - high))
+        spread = np.where(np.isinf(high), np.where(low > 0, low, base), high - low)
+        spread = np.where(spread > 0, spread, base)
+        penalty = np.maximum(0.0, max_points * (1 - np.minimum(1.0, diff / spread)))
+        inside = (values >= low) & (values <= high)
+        both = np.where(inside | (diff <= 0), max_points, penalty)
+    return _presence(~np.isnan(low[:, 0]), ~np.isnan(values[0]), both, max_points)
+
+
+def _schedule_scores(vendors, events, max_points):
+    matches = vendors.days @ events.days.T
+    event_counts = events.days.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        both = np.where(event_counts > 0, matches / event_counts, 0.0) * max_points
+    return _presence(vendors.days.sum(axis=1) > 0, event_counts > 0, both, max_points)
+
+
+# (vendors x events x factors) raw points per factor, in FACTORS order
+def factor_scores(vendors, events):
+    raw = [
+        _overlap_scores(vendors.preferences, events.tags, MAX_POINTS[0]),
+        _location_scores(vendors, events, MAX_POINTS[1]),
+        _budget_scores(vendors, events, MAX_POINTS[2]),
+        _overlap_scores(vendors.demographics, events.demographics, MAX_POINTS[3]),
+        _range_scores(vendors, events.num_vendors, MAX_POINTS[4], 10),
+        _schedule_scores(vendors, events, MAX_POINTS[5]),
+        _overlap_scores(vendors.categories, events.categories, MAX_POINTS[6]),
+        _overlap_scores(vendors.preferences, events.tags, MAX_POINTS[7], any_match=True),
+        _range_scores(vendors, events.headcount, MAX_POINTS[8], 1000),
+    ]
+    return np.stack(raw, axis=2)
+
+
+# (vendors x events) final 0-100 scores from factor_scores()
+def score_matrix(vendors, factors):
+    total = (factors * vendors.weights[:, None, :]).sum(axis=2)
+    scores = total / vendors.max_sum * 100 + SCORE_OFFSET
+    # js Math.round, halves go up
+    return np.floor(np.clip(scores, 0, 100) + 0.5)
+
+
+# the endpoint's ScoreBreakdown for one pair, the fields the event page reads
+def score_breakdown(factors, score):
+    breakdown = {}
+    for key, points, max_points in zip(BREAKDOWN_KEYS, factors, MAX_POINTS):
+        breakdown[f"{key}Raw"] = round(float(points), 2)
+        breakdown[f"{key}Max"] = int(max_points)
+    breakdown["total"] = score
+    return breakdown
+
+
+class TopScores:
+    """Running top n events per vendor over chunks of scores, with their factor points"""
+
+    def __init__(self, vendor_count, n=TOP_N):
+        self.n = n
+        self.scores = np.full((vendor_count, 0), -np.inf)
+        self.indexes = np.zeros((vendor_count, 0), dtype=np.int64)
+        self.factors = np.zeros((vendor_count, 0, len(FACTORS)))
+        self.event_ids = []
+
+    def add(self, scores, factors, event_ids):
+        offset = len(self.event_ids)
+        self.event_ids.extend(event_ids)
+        indexes = np.broadcast_to(np.arange(offset, offset + len(event_ids)), scores.shape)
+        scores = np.concatenate([self.scores, scores], axis=1)
+        indexes = np.concatenate([self.indexes, indexes], axis=1)
+        factors = np.concatenate([self.factors, factors], axis=1)
+        if scores.shape[1] > self.n:
+            keep = np.argpartition(-scores, self.n - 1, axis=1)[:, : self.n]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            indexes = np.take_along_axis(indexes, keep, axis=1)
+            factors = np.take_along_axis(factors, keep[:, :, None], axis=1)
+        self.scores, self.indexes, self.factors = scores, indexes, factors
+
+    # [{"id", "score", "scoreBreakdown"}] best first for one vendor
+    def ranked(self, row):
+        # ties in the order the events came in
+        order = np.lexsort((self.indexes[row], -self.scores[row]))
+        ranked = []
+        for i in order:
+            if not np.isfinite(self.scores[row, i]):
+                continue
+            score = int(self.scores[row, i])
+            ranked.append(
+                {
+                    "id": self.event_ids[self.indexes[row, i]],
+                    "score": score,
+                    "scoreBreakdown": score_breakdown(self.factors[row, i], score),
+                }
+            )
+        return ranked
+
+
+def load_vendors(db):
+    vendors = []
+    for doc in db.collection(VENDORS_COLLECTION).select(VENDOR_FIELDS).stream():
+        metrics.inc("firestore_reads_total", op="scoring")
+        vendors.append((doc.id, doc.to_dict()))
+    return vendors
+
+
+# (doc id, event) for upcoming events, formatted since `since` when given
+def load_events(db, since=None, now=None):
+    now = now or datetime.now(timezone.utc)
+    query = db.collection(EVENTS_COLLECTION).select(EVENT_FIELDS)
+    if since is not None:
+        query = query.where(filter=FieldFilter("timestamp", ">=", since))
+    for doc in query.stream():
+        metrics.inc("firestore_reads_total", op="scoring")
+        event = doc.to_dict()
+        end = _date(event.get("endDate"))
+        if isinstance(end, datetime) and end < now:
+            continue
+        yield doc.id, event
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rank(vendors, events, n=TOP_N, chunk_size=EVENT_CHUNK):
+    features = VendorFeatures(vendors)
+    top = TopScores(len(features), n)
+    for chunk in _chunks(events, chunk_size):
+        with metrics.timer("scoring_seconds"):
+            factors = factor_scores(features, EventFeatures(chunk))
+            top.add(score_matrix(features, factors), factors, [event_id for event_id, _ in chunk])
+        metrics.inc("pairs_scored_total", len(features) * len(chunk))
+    return top
+
+
+# ids of the given events that still exist and havent ended
+def live_event_ids(db, event_ids, now=None):
+    now = now or datetime.now(timezone.utc)
+    events_ref = db.collection(EVENTS_COLLECTION)
+    live = set()
+    for chunk in _chunks(event_ids, EVENT_CHUNK):
+        refs = [events_ref.document(event_id) for event_id in chunk]
+        for doc in db.get_all(refs, field_paths=["endDate"]):
+            metrics.inc("firestore_reads_total", op="scoring")
+            if not doc.exists:
+                continue
+            end = _date((doc.to_dict() or {}).get("endDate"))
+            if isinstance(end, datetime) and end < now:
+                continue
+            live.add(doc.id)
+    return live
+
+
+# existing top list with freshly scored events folded in, rescored ids replaced
+# and events no longer in live_ids (ended or deleted since) dropped
+def _merge_ranked(current, fresh, n, live_ids):
+    fresh_ids = {item["id"] for item in fresh}
+    kept = [
+        item
+        for item in current
+        if item.get("id") not in fresh_ids and item.get("id") in live_ids
+    ]
+    return sorted(kept + fresh, key=lambda item: -item["score"])[:n]
+
+
+def score_events(db, since=None, n=TOP_N, chunk_size=EVENT_CHUNK):
+    """
+    Rank every vendor and write their top n, returns vendors written
+    with since only events formatted from then on are scored and merged into
+    each vendor's stored list, vendors without one are ranked against everything.
+    eventsFormatted docs are written by a cloud function some time after the
+    scrape wrote the event, so since reaches back to the oldest stored ranking
+    to pick up whatever was formatted after the last run scored
+    """
+    vendors = load_vendors(db)
+    if not vendors:
+        print("No vendors to rank")
+        return 0
+    rankings_ref = db.collection(RANKINGS_COLLECTION)
+
+    current = {}
+    if since is not None:
+        for doc in rankings_ref.stream():
+            metrics.inc("firestore_reads_total", op="scoring")
+            ranking = doc.to_dict()
+            ranked = ranking.get("rankedEvents") or []
+            # lists from before breakdowns were stored are redone from scratch
+            if not all("scoreBreakdown" in item for item in ranked):
+                continue
+            current[doc.id] = ranked
+            if isinstance(ranking.get("lastRanked"), datetime):
+                since = min(since, ranking["lastRanked"])
+    ranked_before = [vendor for vendor in vendors if vendor[0] in current]
+    unranked = [vendor for vendor in vendors if vendor[0] not in current]
+
+    results = {}
+    if ranked_before:
+        # events that ended since the last run are never rescored, so they
+        # have to be pruned from the stored lists here
+        stored_ids = {item.get("id") for items in current.values() for item in items}
+        live_ids = live_event_ids(db, sorted(filter(None, stored_ids)))
+        top = rank(ranked_before, load_events(db, since), n, chunk_size)
+        for row, (vendor_id, _) in enumerate(ranked_before):
+            results[vendor_id] = _merge_ranked(
+                current[vendor_id], top.ranked(row), n, live_ids
+            )
+    if unranked:
+        top = rank(unranked, load_events(db), n, chunk_size)
+        for row, (vendor_id, _) in enumerate(unranked):
+            results[vendor_id] = top.ranked(row)
+
+    now = datetime.now(timezone.utc)
+    with BatchWriter(db, label="rankings") as writer:
+        for vendor_id, ranked in results.items():
+            writer.set(
+                rankings_ref.document(vendor_id), {"lastRanked": now, "rankedEvents": ranked}
+            )
+    print(f"Ranked events for {len(results)} vendors ({len(unranked)} from scratch)")
+    return len(results)
+
+
+if __name__ == "__main__":
+    from FirebaseOperations import init_firebase_admin, parse_date
+
+    parser = argparse.ArgumentParser(description="Precompute vendor event rankings")
+    parser.add_argument("--since", type=parse_date, help="only score events formatted since")
+    parser.add_argument("--top", type=int, default=TOP_N, help="events kept per vendor")
+    args = parser.parse_args()
+
+    score_events(init_firebase_admin(), since=args.since, n=args.top)
+    metrics.write_report()
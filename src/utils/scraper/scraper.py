@@ -1,21 +1,42 @@
-import random
-import time
-from datetime import datetime
+import asyncio
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 
 import firebase_admin
-import requests
-from bs4 import BeautifulSoup
 from firebase_admin import credentials, firestore
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+
+from dates import normalize_dates
+from driver_pool import DriverPool, wait_for, wait_until_stale
+from fetcher import AsyncFetcher
+from frontier import CrawlFrontier
+from geocoder import make_geocoder
+from html_parser import Subtree, compile_selector, make_soup, parse_subtree
+from http_cache import ResponseCache
+from images import make_image_ingest
+from known_events import KnownEvents
+from metrics import metrics, profile
+from page_depths import PageDepths
+from pipeline import batched, iterate_async, merge_sources
+from rate_limiter import HostRateLimiter
+from sinks import (
+    STAGING_JSONL_PATH,
+    STAGING_SQLITE_PATH,
+    FirestoreSink,
+    JSONLSink,
+    SQLiteSink,
+    store_event,
+)
+from zapp_http import ZAPP_EVENT_URL, fetch_zapp_description
 
 
 # initialize admin and db with admin
 # using client SDK cuz recommended for scraper and "backend" like stuff
+# only called when a run actually writes to firestore
 def init_firebase_admin():
     if not firebase_admin._apps:
         cred = credentials.Certificate("./firebase-service-account.json")
@@ -23,7 +44,19 @@ def init_firebase_admin():
     return firestore.client()
 
 
-db = init_firebase_admin()
+# where ingest_events writes: "firestore", or "sqlite"/"jsonl" to stage the
+# run locally and push it later with FirebaseOperations.py sync
+SINK = os.environ.get("SCRAPER_SINK", "firestore")
+
+
+def make_sink(kind=SINK):
+    if kind == "firestore":
+        return FirestoreSink(init_firebase_admin())
+    if kind == "sqlite":
+        return SQLiteSink(STAGING_SQLITE_PATH)
+    if kind == "jsonl":
+        return JSONLSink(STAGING_JSONL_PATH)
+    raise ValueError(f"Unknown sink: {kind}")
 
 SEARCH_KEYWORDS = [
     "pop up",
@@ -40,137 +73,204 @@ SEARCH_KEYWORDS = [
 
 EVENTBRITE_LOCATIONS = ["ny--new-york", "ma--boston"]
 
+# eventbrite search pages, never go past this
+EVENTBRITE_MAX_PAGES = 12
+# first window for searches that have no depth saved from a previous run
+EVENTBRITE_DEFAULT_DEPTH = 3
+EVENTBRITE_DEPTHS_PATH = "./.scraper_cache/eventbrite_depths.json"
 
-def scrape_eventeny():
+# seconds before a stored event gets its detail page fetched again
+# None means events already in the db are never refetched
+# refetched events are only written if their fingerprint changed
+DETAIL_REFRESH_AGE = 7 * 24 * 60 * 60
 
-    events = []
 
-    # scraping as if using chrome
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; U; Linux i686; en-US) AppleWebKit/534.3 (KHTML, like Gecko) Chrome/6.0.472.63 Safari/534.3"
-    }
+# max in-flight requests per host, listing and detail pages share it
+HOST_CONCURRENCY = {"eventeny.com": 8, "eventbrite.com": 8, "zapplication.org": 4}
+
+# (requests per second, burst) per domain, every fetch goes through these
+RATE_LIMITS = {
+    "eventeny.com": (2.0, 4),
+    "eventbrite.com": (3.0, 6),
+    "zapplication.org": (1.0, 2),
+}
+
+rate_limiter = HostRateLimiter(RATE_LIMITS)
+
+# seconds a cached page is reused without asking the site again, after that
+# it is revalidated with If-None-Match/If-Modified-Since
+CACHE_TTLS = {
+    "eventeny.com": 6 * 60 * 60,
+    "eventbrite.com": 6 * 60 * 60,
+    "zapplication.org": 6 * 60 * 60,
+}
+
+# opened in __main__, so importing this module (benchmark, tests) leaves no
+# cache files behind, fetches are uncached until then
+response_cache = None
+
+# checkpoints so a crashed run resumes where it stopped, the database is only
+# opened by start_run() in __main__
+frontier = CrawlFrontier()
+
 
+# results container on an eventeny search page
+EVENTENY_LIST = Subtree("div", {"data-content": "events-list-container"})
+
+# need whole style attribute to identify these
+EVENTENY_LOCATION_SPAN = compile_selector('span.size-14[style*="color: #7E7E7E"]')
+EVENTENY_DATE_SPAN = compile_selector('span[style*="color: #08A6A0"]')
+
+
+# generator, events come out as each keyword's detail pages finish
+def scrape_eventeny(known_events=None):
+    known_events = known_events or KnownEvents()
     try:
         print("Scraping Eventeny")
+        yield from iterate_async(lambda: _scrape_eventeny(known_events), stage="eventeny")
+    except Exception as e:
+        print("Error: ", e)
 
-        for keyword in SEARCH_KEYWORDS:
-            print(f"Searching Eventeny for keyword: {keyword}")
-            url_keyword = keyword.replace(" ", "+")
 
-            response = requests.get(
-                f"https://www.eventeny.com/events/?l=&q={url_keyword}&m=",
-                headers=headers,
-                timeout=13,
-            )
-            print(f"eventeny keyword res {keyword}: ", response)
+async def _scrape_eventeny(known_events):
+    async with AsyncFetcher(
+        host_concurrency=HOST_CONCURRENCY,
+        rate_limiter=rate_limiter,
+        cache=response_cache,
+    ) as fetcher:
+        # all keywords in flight at once, handed on in finishing order
+        for keyword_events in asyncio.as_completed(
+            [
+                _scrape_eventeny_keyword(fetcher, keyword, known_events)
+                for keyword in SEARCH_KEYWORDS
+            ]
+        ):
+            for event in await keyword_events:
+                yield event
+
+
+async def _scrape_eventeny_keyword(fetcher, keyword, known_events):
+    stored = frontier.page_result("eventeny", keyword)
+    if stored is not None:
+        return _replay_events(stored, known_events)
+    frontier.start_page("eventeny", keyword)
+
+    print(f"Searching Eventeny for keyword: {keyword}")
+    url_keyword = keyword.replace(" ", "+")
+
+    response = await fetcher.fetch(
+        f"https://www.eventeny.com/events/?l=&q={url_keyword}&m="
+    )
+    print(f"eventeny keyword res {keyword}: ", response)
+    if response is None:
+        return []
 
-            soup = BeautifulSoup(response.content, "html.parser")
+    # only the results list gets built into a tree
+    with metrics.timer("parse_seconds", source="eventeny"):
+        event_main_container = parse_subtree(response.content, EVENTENY_LIST)
+    if not event_main_container:
+        print("error at event_main_container")
+        return []
 
-            event_main_container = soup.find(
-                "div", {"data-content": "events-list-container"}
-            )
-            if not event_main_container:
-                print("error at event_main_container")
-                return []
+    # get all event boxes from evententy (first page for now)
+    event_divs = event_main_container.find_all("div", {"class": "event-flashcard"})
 
-            # get all event boxes from evententy (first page for now)
-            event_divs = event_main_container.find_all(
-                "div", {"class": "event-flashcard"}
-            )
+    events = []
+    # (event_data, url) pairs, details fetched together after the cards
+    detail_jobs = []
 
-            for event in event_divs:
-                try:
-                    # get event data
-                    name = event.find("meta", {"itemprop": "name"})["content"]
-                    # need whole attribute to identify
-                    location_prev = event.find(
-                        "span",
-                        {
-                            "class": "size-14",
-                            "style": lambda value: value and "color: #7E7E7E" in value,
-                        },
-                    )
-                    city, state = location_prev.text.split(",")
-                    location = {"city": city.strip(), "state": state.strip()}
-                    date = event.find(
-                        "span",
-                        {"style": lambda value: value and "color: #08A6A0" in value},
-                    ).text.strip()
-
-                    # get url for details
-                    url_meta = event.find("meta", {"itemprop": "url"})
-                    event_url = url_meta["content"] if url_meta else None
-
-                    image_meta = event.find("meta", {"itemprop": "image"})
-                    image = image_meta["content"] if image_meta else ""
-
-                    # hardcode popup for now, eventeny list theme not cat
-                    type_tags = ["pop up"]
-                    category_item = event.get("data-category")
-                    type_tags.append(category_item)
-
-                    # Single event dict to add
-                    event_data = {
-                        "name": name,
-                        "description": "",
-                        "location": location,
-                        # "vendor_id": "Eventeny",
-                        "type": type_tags,
-                        "date": date,
-                        "image": image,
-                        # "host": "",
-                        "vendorFee": None,
-                        "totalCost": None,
-                        "attendeeType": [],
-                        "headcount": None,
-                        "demographics": [],
-                        "startDate": {"seconds": 0, "nanoseconds": 0},
-                        "endDate": {"seconds": 0, "nanoseconds": 0},
-                        "score": None,
-                        "scoreBreakdown": None,
-                    }
-
-                    if event_url:
-                        # random delays incase of flag
-                        time.sleep(random.uniform(1, 2))
-                        details = scrape_eventeny_details(event_url, headers)
-
-                        # Update event data with details
-                        if details:
-                            if "description" in details:
-                                event_data["description"] = details["description"]
-                            # if "host" in details:
-                            #     event_data["host"] = details["host"]
-                            if "image" in details and not event_data["image"]:
-                                event_data["image"] = details["image"]
-                            # if "full_address" in details:
-                            #     event_data["full_address"] = details["full_address"]
-                            # if "detailed_date" in details:
-                            #     event_data["detailed_date"] = details["detailed_date"]
-
-                    events.append(event_data)
+    for event in event_divs:
+        try:
+            # get event data
+            name = event.find("meta", {"itemprop": "name"})["content"]
+            # need whole attribute to identify
+            location_prev = EVENTENY_LOCATION_SPAN.select_one(event)
+            city, state = location_prev.text.split(",")
+            location = {"city": city.strip(), "state": state.strip()}
+            date = EVENTENY_DATE_SPAN.select_one(event).text.strip()
+
+            # get url for details
+            url_meta = event.find("meta", {"itemprop": "url"})
+            event_url = url_meta["content"] if url_meta else None
+
+            image_meta = event.find("meta", {"itemprop": "image"})
+            image = image_meta["content"] if image_meta else ""
+
+            # hardcode popup for now, eventeny list theme not cat
+            type_tags = ["pop up"]
+            category_item = event.get("data-category")
+            type_tags.append(category_item)
+
+            # Single event dict to add
+            event_data = {
+                "name": name,
+                "source": "eventeny",
+                "description": "",
+                "location": location,
+                # "vendor_id": "Eventeny",
+                "type": type_tags,
+                "date": date,
+                "image": image,
+                # "host": "",
+                "vendorFee": None,
+                "totalCost": None,
+                "attendeeType": [],
+                "headcount": None,
+                "demographics": [],
+                "startDate": {"seconds": 0, "nanoseconds": 0},
+                "endDate": {"seconds": 0, "nanoseconds": 0},
+                "score": None,
+                "scoreBreakdown": None,
+            }
+
+            # already stored or already found under another keyword
+            if not _claim(known_events, make_event_id(event_data), "eventeny"):
+                continue
+
+            if event_url:
+                detail_jobs.append((event_data, event_url))
+
+            events.append(event_data)
 
-                except Exception as e:
-                    print("Error: ", e)
+        except Exception as e:
+            print("Error: ", e)
 
-                time.sleep(random.uniform(2, 4))
+    await asyncio.gather(
+        *(
+            _add_eventeny_details(fetcher, event_data, event_url)
+            for event_data, event_url in detail_jobs
+        )
+    )
 
-        return events
+    frontier.finish_page("eventeny", keyword, "", 1, events)
+    return events
 
-    except:
-        print("Error: ", e)
-        return []
+
+async def _add_eventeny_details(fetcher, event_data, event_url):
+    print(f"Scraping more info for: {event_url}")
+    details = await _fetch_details(fetcher, event_url, scrape_eventeny_details)
+
+    # Update event data with details
+    if details:
+        if "description" in details:
+            event_data["description"] = details["description"]
+        # if "host" in details:
+        #     event_data["host"] = details["host"]
+        if "image" in details and not event_data["image"]:
+            event_data["image"] = details["image"]
+        # if "full_address" in details:
+        #     event_data["full_address"] = details["full_address"]
+        # if "detailed_date" in details:
+        #     event_data["detailed_date"] = details["detailed_date"]
 
 
-def scrape_eventeny_details(event_url, headers):
+def scrape_eventeny_details(event_url, response):
     try:
-        print(f"Scraping more info for: {event_url}")
-        response = requests.get(event_url, headers=headers, timeout=15)
-        if response.status_code != 200:
-            print(f"cant go into detail's link {response.status_code}")
+        if response is None or response.status_code != 200:
+            print(f"cant go into detail's link {response and response.status_code}")
             return {}
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = make_soup(response.content)
         details = {}
 
         # event description
@@ -205,194 +305,296 @@ def scrape_eventeny_details(event_url, headers):
         return {}
 
 
-def scrape_eventbrite():
-    # scraping as if using chrome
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; U; Linux i686; en-US) AppleWebKit/534.3 (KHTML, like Gecko) Chrome/6.0.472.63 Safari/534.3"
-    }
+EVENTBRITE_LIST = Subtree(
+    "ul", {"class": "SearchResultPanelContentEventCardList-module__eventList___2wk-D"}
+)
+EVENTBRITE_VENUE = compile_selector(
+    "p.Typography_root__487rx.Typography_body-md__487rx:not(:has(time))"
+)
 
-    events = []
 
+# generator, events come out as each result page's detail pages finish
+def scrape_eventbrite(known_events=None):
+    known_events = known_events or KnownEvents()
     try:
         print("Scraping Eventbrite")
+        yield from iterate_async(
+            lambda: _scrape_eventbrite(known_events), stage="eventbrite"
+        )
+    except Exception as e:
+        print(f"Error scraping Eventbrite: {e}")
 
-        for location_path in EVENTBRITE_LOCATIONS:
-            for keyword in SEARCH_KEYWORDS:
-                url_keyword = keyword.replace(" ", "-")
-                print(f"eventbrite keyword and location: {keyword} {location_path}")
 
-                for page in range(1, 13):
-                    response = requests.get(
-                        f"https://www.eventbrite.com/d/{location_path}/{url_keyword}/?page={page}",
-                        headers=headers,
-                        timeout=13,
-                    )
+async def _scrape_eventbrite(known_events):
+    depths = PageDepths.load(EVENTBRITE_DEPTHS_PATH)
+    # data-event-id of every card seen this run, across keywords
+    seen_cards = set()
+    searches = [
+        (location_path, keyword)
+        for location_path in EVENTBRITE_LOCATIONS
+        for keyword in SEARCH_KEYWORDS
+    ]
+    async with AsyncFetcher(
+        host_concurrency=HOST_CONCURRENCY,
+        rate_limiter=rate_limiter,
+        cache=response_cache,
+    ) as fetcher:
+        for search_events in asyncio.as_completed(
+            [
+                _scrape_eventbrite_search(
+                    fetcher, *search, known_events, depths, seen_cards
+                )
+                for search in searches
+            ]
+        ):
+            for event in await search_events:
+                yield event
+    depths.save()
+
+
+# pages come in windows, the first sized from last run's depth for this search,
+# and stop at the first empty or short (last) page instead of always going to 12
+async def _scrape_eventbrite_search(
+    fetcher, location_path, keyword, known_events, depths, seen_cards
+):
+    print(f"eventbrite keyword and location: {keyword} {location_path}")
+    depth_key = f"{location_path}/{keyword}"
+    # one page past last run's depth, in case the search grew
+    window = depths.get(depth_key, EVENTBRITE_DEFAULT_DEPTH) + 1
 
-                    soup = BeautifulSoup(response.content, "html.parser")
+    events = []
+    first_page_size = None
+    last_page_with_cards = 0
+    page = 1
+    exhausted = False
+
+    while not exhausted and page <= EVENTBRITE_MAX_PAGES:
+        pages = list(range(page, min(page + window, EVENTBRITE_MAX_PAGES + 1)))
+        results = await asyncio.gather(
+            *(
+                _scrape_eventbrite_page(
+                    fetcher, location_path, keyword, p, known_events, seen_cards
+                )
+                for p in pages
+            )
+        )
+        for p, (page_events, card_count) in zip(pages, results):
+            events.extend(page_events)
+            # None means the fetch failed, that says nothing about the end
+            if card_count is None:
+                continue
+            if card_count == 0:
+                exhausted = True
+                continue
+            last_page_with_cards = max(last_page_with_cards, p)
+            if first_page_size is None and p == 1:
+                first_page_size = card_count
+            elif first_page_size and card_count < first_page_size:
+                exhausted = True
+
+        page = pages[-1] + 1
+        # past what we expected, go on one page at a time
+        window = 1
+
+    depths.record(depth_key, last_page_with_cards)
+    return events
+
+
+# returns (events, number of cards on the page or None if the fetch failed)
+async def _scrape_eventbrite_page(
+    fetcher, location_path, keyword, page, known_events, seen_cards
+):
+    stored = frontier.page_result("eventbrite", keyword, location_path, page)
+    if stored is not None:
+        return _replay_events(stored["events"], known_events), stored["cards"]
+    frontier.start_page("eventbrite", keyword, location_path, page)
+
+    url_keyword = keyword.replace(" ", "-")
+
+    response = await fetcher.fetch(
+        f"https://www.eventbrite.com/d/{location_path}/{url_keyword}/?page={page}"
+    )
+    if response is None:
+        return [], None
+
+    with metrics.timer("parse_seconds", source="eventbrite"):
+        event_main_container = parse_subtree(response.content, EVENTBRITE_LIST)
+
+    if not event_main_container:
+        print("cant find main container for page", page)
+        frontier.finish_page(
+            "eventbrite", keyword, location_path, page, {"events": [], "cards": 0}
+        )
+        return [], 0
 
-                    event_main_container = soup.find(
-                        "ul",
-                        {
-                            "class": "SearchResultPanelContentEventCardList-module__eventList___2wk-D"
-                        },
-                    )
+    event_cards = event_main_container.find_all("li")
 
-                    if not event_main_container:
-                        print("cant find main container for page", page)
-                        continue
+    events = []
+    detail_jobs = []
 
-                    event_cards = event_main_container.find_all("li")
-
-                    for card in event_cards:
-                        try:
-                            event_link = card.find("a", {"class": "event-card-link"})
-
-                            if not event_link:
-                                print("cant find event link")
-                                continue
-
-                            label = event_link.get("aria-label", "")
-
-                            # eventbrite add this infront
-                            # name = label.replace("View ", "")
-                            name = label
-
-                            # for checking pop up
-                            lower_name = name.lower()
-
-                            if (
-                                "pop up" not in lower_name
-                                and "pop-up" not in lower_name
-                                and "popup" not in lower_name
-                            ):
-                                # uncomment if want to see skipped events
-                                # print(f"Skipping event: '{name}' - not a pop-up event")
-                                continue
-
-                            location_elem = event_link.get("data-event-location", "")
-                            if location_elem and "," in location_elem:
-                                city, state = location_elem.split(",")
-                                location = {
-                                    "city": city.strip(),
-                                    "state": state.strip(),
-                                }
-                            else:
-                                if "ny--new-york" in location_path:
-                                    location = {"city": "New York", "state": "NY"}
-                                elif "ma--boston" in location_path:
-                                    location = {"city": "Boston", "state": "MA"}
-                                else:
-                                    location = {"city": "", "state": ""}
-
-                            date_elem = card.find(
-                                "p",
-                                {
-                                    "class": "Typography_root__487rx #585163 Typography_body-md__487rx event-card__clamp-line--one Typography_align-match-parent__487rx"
-                                },
-                            )
-                            date = date_elem.text.strip() if date_elem else ""
-
-                            venue_elem = card.select_one(
-                                "p.Typography_root__487rx.Typography_body-md__487rx:not(:has(time))"
-                            )
-                            venue = venue_elem.text.strip() if venue_elem else ""
-
-                            price_elem = card.find(
-                                "p",
-                                {
-                                    "class": "Typography_root__487rx #3a3247 Typography_body-md-bold__487rx Typography_align-match-parent__487rx"
-                                },
-                            )
-                            price = price_elem.text.strip() if price_elem else ""
-
-                            event_id = event_link.get("data-event-id", "")
-                            event_url = event_link.get("href", "")
-
-                            img_element = card.find(
-                                "img", {"class": "event-card-image"}
-                            )
-                            image = (
-                                img_element["src"]
-                                if img_element and img_element.has_attr("src")
-                                else ""
-                            )
-
-                            event_data = {
-                                "name": name,
-                                "description": "",
-                                "location": location,
-                                # "venue": venue,
-                                # "vendor_id": "Eventbrite",
-                                "type": ["pop up"],
-                                # "date": date,
-                                # "price": price,
-                                "id": event_id,
-                                # "url": event_url,
-                                "image": image,
-                                # "host": "",
-                                "vendorFee": None,
-                                "totalCost": None,
-                                "attendeeType": [],
-                                "headcount": None,
-                                "demographics": [],
-                                "startDate": {"seconds": 0, "nanoseconds": 0},
-                                "endDate": {"seconds": 0, "nanoseconds": 0},
-                                "score": None,
-                                "scoreBreakdown": None,
-                            }
+    for card in event_cards:
+        try:
+            event_link = card.find("a", {"class": "event-card-link"})
+
+            if not event_link:
+                print("cant find event link")
+                continue
+
+            # already came up under another keyword this run, nothing to redo
+            card_id = event_link.get("data-event-id")
+            if card_id:
+                if card_id in seen_cards:
+                    metrics.inc("detail_pages_skipped_total", source="eventbrite")
+                    continue
+                seen_cards.add(card_id)
+
+            label = event_link.get("aria-label", "")
+
+            # eventbrite add this infront
+            # name = label.replace("View ", "")
+            name = label
+
+            # for checking pop up
+            lower_name = name.lower()
+
+            if (
+                "pop up" not in lower_name
+                and "pop-up" not in lower_name
+                and "popup" not in lower_name
+            ):
+                # uncomment if want to see skipped events
+                # print(f"Skipping event: '{name}' - not a pop-up event")
+                continue
+
+            location_elem = event_link.get("data-event-location", "")
+            if location_elem and "," in location_elem:
+                city, state = location_elem.split(",")
+                location = {
+                    "city": city.strip(),
+                    "state": state.strip(),
+                }
+            else:
+                if "ny--new-york" in location_path:
+                    location = {"city": "New York", "state": "NY"}
+                elif "ma--boston" in location_path:
+                    location = {"city": "Boston", "state": "MA"}
+                else:
+                    location = {"city": "", "state": ""}
 
-                            if event_url:
-                                # random delays incase of flag
-                                time.sleep(random.uniform(1, 3))
-                                details = scrape_eventbrite_details(event_url, headers)
-
-                                # Update with details
-                                if details:
-                                    if "description" in details:
-                                        event_data["description"] = details[
-                                            "description"
-                                        ]
-                                    # if "host" in details:
-                                    #     event_data["host"] = details["host"]
-                                    if "image" in details and not event_data["image"]:
-                                        event_data["image"] = details["image"]
-                                    # if "full_address" in details:
-                                    #     event_data["full_address"] = details["full_address"]
-                                    # if "detailed_date" in details:
-                                    #     event_data["detailed_date"] = details["detailed_date"]
-                                    if "additional_tags" in details:
-                                        for tag in details["additional_tags"]:
-                                            if tag not in event_data["type"]:
-                                                event_data["type"].append(tag)
-
-                            events.append(event_data)
-
-                        except Exception as e:
-                            print(f"Error processing card: {e}")
-
-                    # incase eventbrite flag
-                    time.sleep(random.uniform(1, 3))
-
-            time.sleep(random.uniform(1, 3))
-
-        return events
+            date_elem = card.find(
+                "p",
+                {
+                    "class": "Typography_root__487rx #585163 Typography_body-md__487rx event-card__clamp-line--one Typography_align-match-parent__487rx"
+                },
+            )
+            date = date_elem.text.strip() if date_elem else ""
 
-    except Exception as e:
-        print(f"Error scraping Eventbrite: {e}")
-        return []
+            venue_elem = EVENTBRITE_VENUE.select_one(card)
+            venue = venue_elem.text.strip() if venue_elem else ""
+
+            price_elem = card.find(
+                "p",
+                {
+                    "class": "Typography_root__487rx #3a3247 Typography_body-md-bold__487rx Typography_align-match-parent__487rx"
+                },
+            )
+            price = price_elem.text.strip() if price_elem else ""
 
+            event_id = event_link.get("data-event-id", "")
+            event_url = event_link.get("href", "")
+
+            img_element = card.find("img", {"class": "event-card-image"})
+            image = (
+                img_element["src"]
+                if img_element and img_element.has_attr("src")
+                else ""
+            )
 
-def scrape_eventbrite_details(event_url, headers):
+            event_data = {
+                "name": name,
+                "source": "eventbrite",
+                "description": "",
+                "location": location,
+                # "venue": venue,
+                # "vendor_id": "Eventbrite",
+                "type": ["pop up"],
+                "date": date,
+                # "price": price,
+                "id": event_id,
+                # "url": event_url,
+                "image": image,
+                # "host": "",
+                "vendorFee": None,
+                "totalCost": None,
+                "attendeeType": [],
+                "headcount": None,
+                "demographics": [],
+                "startDate": {"seconds": 0, "nanoseconds": 0},
+                "endDate": {"seconds": 0, "nanoseconds": 0},
+                "score": None,
+                "scoreBreakdown": None,
+            }
+
+            # already stored or already found under another keyword
+            if not _claim(known_events, make_event_id(event_data), "eventbrite"):
+                continue
+
+            if event_url:
+                detail_jobs.append((event_data, event_url))
+
+            events.append(event_data)
+
+        except Exception as e:
+            print(f"Error processing card: {e}")
+
+    await asyncio.gather(
+        *(
+            _add_eventbrite_details(fetcher, event_data, event_url)
+            for event_data, event_url in detail_jobs
+        )
+    )
+
+    frontier.finish_page(
+        "eventbrite",
+        keyword,
+        location_path,
+        page,
+        {"events": events, "cards": len(event_cards)},
+    )
+    return events, len(event_cards)
+
+
+async def _add_eventbrite_details(fetcher, event_data, event_url):
+    print(f"Scraping details for: {event_url}")
+    details = await _fetch_details(fetcher, event_url, scrape_eventbrite_details)
+
+    # Update with details
+    if details:
+        if "description" in details:
+            event_data["description"] = details["description"]
+        # if "host" in details:
+        #     event_data["host"] = details["host"]
+        if "image" in details and not event_data["image"]:
+            event_data["image"] = details["image"]
+        # if "full_address" in details:
+        #     event_data["full_address"] = details["full_address"]
+        # if "detailed_date" in details:
+        #     event_data["detailed_date"] = details["detailed_date"]
+        if "additional_tags" in details:
+            for tag in details["additional_tags"]:
+                if tag not in event_data["type"]:
+                    event_data["type"].append(tag)
+
+
+def scrape_eventbrite_details(event_url, response):
     try:
-        print(f"Scraping details for: {event_url}")
-        response = requests.get(event_url, headers=headers, timeout=15)
-        if response.status_code != 200:
+        if response is None or response.status_code != 200:
             print(
-                f"get go into eventbrite link: {response.status_code} for {event_url}"
+                f"get go into eventbrite link: {response and response.status_code} for {event_url}"
             )
             return {}
 
-        soup = BeautifulSoup(response.content, "html.parser")
+        soup = make_soup(response.content)
         details = {}
 
         # event description
@@ -461,362 +663,574 @@ using xquery and selectors
 """
 
 
-def scrape_zapp():
-    events = []
+# how many headless browsers scrape_zapp spreads its page visits over
+ZAPP_DRIVER_POOL_SIZE = 3
+
+ZAPP_SEARCH_URL = "https://www.zapplication.org/participating-events.php"
+ZAPP_CARD_SELECTOR = "div[data-v-6ccc3a2c].card.mb-3"
+
+
+# generator, yields each event once its event-info.php page is read
+# the search page is a vue app, so keyword searches go through selenium,
+# event-info.php is rendered server side and comes over plain http, selenium
+# only visits the event pages http couldnt read
+def scrape_zapp(known_events=None):
+    known_events = known_events or KnownEvents()
+    pool = DriverPool(ZAPP_DRIVER_POOL_SIZE)
+    # filled in by the http pass, visited with selenium afterwards
+    failed_events = []
+    keywords = []
+
+    try:
+        print("Scraping Zapp")
+        yield from iterate_async(
+            lambda: _scrape_zapp(pool, known_events, failed_events), stage="zapp"
+        )
+    except Exception as e:
+        print(f"Error scraping Zapp {e}")
+        # events already yielded are claimed, so redoing every keyword is safe
+        keywords = list(SEARCH_KEYWORDS)
+
+    try:
+        if keywords or failed_events:
+            print(f"Zapp selenium fallback: {len(keywords)} keywords, {len(failed_events)} events")
+            yield from _scrape_zapp_selenium(pool, known_events, keywords, failed_events)
+    finally:
+        pool.close()
+
+
+async def _scrape_zapp(pool, known_events, failed_events):
+    async with AsyncFetcher(
+        host_concurrency=HOST_CONCURRENCY,
+        rate_limiter=rate_limiter,
+        cache=response_cache,
+    ) as fetcher:
+
+        async def event_page(basic_info):
+            url = ZAPP_EVENT_URL.format(event_id=basic_info["id"])
+            description = frontier.detail_result(url)
+            if description is None:
+                frontier.start_detail(url)
+                description = await fetch_zapp_description(fetcher, basic_info["id"])
+                if description is None:
+                    failed_events.append(basic_info)
+                    return None
+                frontier.finish_detail(url, description)
+            return _zapp_event(basic_info, description)
+
+        # each search holds one of the pool's browsers on its own thread
+        searches = [
+            asyncio.to_thread(_search_zapp, pool, keyword, known_events)
+            for keyword in SEARCH_KEYWORDS
+        ]
+        for basic_event_info in asyncio.as_completed(searches):
+            events = await asyncio.gather(
+                *(event_page(basic_info) for basic_info in await basic_event_info)
+            )
+            for event in events:
+                if event:
+                    yield event
+
+
+# keyword searches and detail pages are spread over a pool of browsers
+# basic_infos are events whose search already ran but whose page still needs a visit
+# pool is the caller's and stays open
+def _scrape_zapp_selenium(pool, known_events, keywords, basic_infos=()):
+    executor = ThreadPoolExecutor(max_workers=ZAPP_DRIVER_POOL_SIZE)
+
+    try:
+        # future -> "search" or "event", detail visits queue up behind searches
+        pending = {
+            executor.submit(_search_zapp, pool, keyword, known_events): "search"
+            for keyword in keywords
+        }
+        for basic_info in basic_infos:
+            pending[executor.submit(_scrape_zapp_event, pool, basic_info)] = "event"
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = pending.pop(future)
+                if kind == "search":
+                    for basic_info in future.result():
+                        pending[executor.submit(_scrape_zapp_event, pool, basic_info)] = (
+                            "event"
+                        )
+                else:
+                    event = future.result()
+                    if event:
+                        yield event
+
+    except Exception as e:
+        print(f"Error scraping Zapp {e}")
+
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _search_zapp(pool, keyword, known_events):
+    stored = frontier.page_result("zapp", keyword)
+    if stored is not None:
+        return [
+            basic_info
+            for basic_info in stored
+            if _claim(known_events, make_event_id(_zapp_event(basic_info, "")), "zapp")
+        ]
+    frontier.start_page("zapp", keyword)
+
     # for id and first layer info
     basic_event_info = []
 
     try:
-        options = Options()
-        options.add_argument("--headless")
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
+        with pool.driver() as driver:
+            rate_limiter.wait(ZAPP_SEARCH_URL)
+            with metrics.timer("selenium_page_seconds", source="zapp"):
+                driver.get(ZAPP_SEARCH_URL)
+            search_box = wait_for(driver, By.ID, "keywords")
+
+            # the listing is rendered by vue after the page loads, typing
+            # before it is there leaves nothing to tell the results apart
+            # from the unfiltered listing
+            try:
+                first_card = wait_for(driver, By.CSS_SELECTOR, ZAPP_CARD_SELECTOR)
+            except TimeoutException:
+                print(f"Zapp listing never loaded, search failed for keyword: {keyword}")
+                return []
 
-        for keyword in SEARCH_KEYWORDS:
-            basic_event_info = []
+            print(f"Searching Zapp for keyword: {keyword}")
+            search_box.clear()
+            search_box.send_keys(keyword)
+            search_box.send_keys(Keys.RETURN)
 
+            # results replace the listing the page opened with, if it is
+            # still there the cards below are that listing, not the results.
+            # left unfinished in the frontier so the next run searches again
+            if not wait_until_stale(driver, first_card):
+                print(f"Zapp results never replaced the listing, search failed for keyword: {keyword}")
+                return []
             try:
-                driver.get("https://www.zapplication.org/participating-events.php")
-                time.sleep(5)
-
-                print(f"Searching Zapp for keyword: {keyword}")
-                search_box = driver.find_element(By.ID, "keywords")
-                search_box.clear()
-                search_box.send_keys(keyword)
-                search_box.send_keys(Keys.RETURN)
-                time.sleep(5)
-
-                event_cards = driver.find_elements(
-                    By.CSS_SELECTOR, "div[data-v-6ccc3a2c].card.mb-3"
-                )
+                wait_for(driver, By.CSS_SELECTOR, ZAPP_CARD_SELECTOR)
+            except TimeoutException:
+                print(f"no Zapp results for keyword: {keyword}")
+                return []
+
+            event_cards = driver.find_elements(By.CSS_SELECTOR, ZAPP_CARD_SELECTOR)
+
+            for card in event_cards:
+                try:
+                    name_element = card.find_element(
+                        By.CSS_SELECTOR, "a.font-weight-bold.text"
+                    )
+                    name = name_element.text.strip()
+
+                    event_link = name_element.get_attribute("href")
+                    event_id = (
+                        event_link.split("ID=")[1] if "ID=" in event_link else None
+                    )
+
+                    if not event_id:
+                        print(f"no ID for: {name}, skipped")
+                        continue
 
-                for card in event_cards:
                     try:
-                        name_element = card.find_element(
-                            By.CSS_SELECTOR, "a.font-weight-bold.text"
+                        date_div = card.find_element(
+                            By.XPATH, ".//div[contains(., 'Event Dates:')]"
                         )
-                        name = name_element.text.strip()
+                        date = date_div.find_element(
+                            By.CSS_SELECTOR, "span.font-weight-bold"
+                        ).text.strip()
+                    except Exception as e:
+                        print(f"Error getting date for {name}: {e}")
+                        date = ""
 
-                        event_link = name_element.get_attribute("href")
-                        event_id = (
-                            event_link.split("ID=")[1] if "ID=" in event_link else None
+                    try:
+                        location_column = card.find_element(
+                            By.CSS_SELECTOR, ".col-md.text-left.text-md-right.pr-2"
                         )
-
-                        if not event_id:
-                            print(f"no ID for: {name}, skipped")
-                            continue
-
-                        try:
-                            date_div = card.find_element(
-                                By.XPATH, ".//div[contains(., 'Event Dates:')]"
-                            )
-                            date = date_div.find_element(
-                                By.CSS_SELECTOR, "span.font-weight-bold"
-                            ).text.strip()
-                        except Exception as e:
-                            print(f"Error getting date for {name}: {e}")
-                            date = ""
-
-                        try:
-                            location_column = card.find_element(
-                                By.CSS_SELECTOR, ".col-md.text-left.text-md-right.pr-2"
-                            )
-                            location_text = location_column.find_elements(
-                                By.TAG_NAME, "div"
-                            )[0].text.strip()
-
-                            if "," in location_text:
-                                city, state = location_text.split(",")
-                                location = {
-                                    "city": city.strip(),
-                                    "state": state.strip(),
-                                }
-                            else:
-                                location = {"city": location_text, "state": ""}
-                        except Exception as e:
-                            print(f"Error getting location for {name}: {e}")
-                            location = {"city": "", "state": ""}
-
-                        # get app fee
-                        try:
-                            fee_div = card.find_element(
-                                By.XPATH, ".//div[contains(., 'Fee')]"
-                            )
-                            fee = fee_div.find_element(
-                                By.CSS_SELECTOR, "span.font-weight-bold"
-                            ).text.strip()
-                        except Exception as e:
-                            print(f"Error getting fee for {name}: {e}")
-                            fee = ""
-
-                        # basic info from outside cards
-                        basic_event_info.append(
-                            {
-                                "name": name,
-                                "date": date,
-                                "location": location,
-                                "id": event_id,
-                                # "url": event_link,
-                                # "fee": fee,
+                        location_text = location_column.find_elements(
+                            By.TAG_NAME, "div"
+                        )[0].text.strip()
+
+                        if "," in location_text:
+                            city, state = location_text.split(",")
+                            location = {
+                                "city": city.strip(),
+                                "state": state.strip(),
                             }
-                        )
+                        else:
+                            location = {"city": location_text, "state": ""}
                     except Exception as e:
-                        print(f"Error in first pass for event card: {e}")
+                        print(f"Error getting location for {name}: {e}")
+                        location = {"city": "", "state": ""}
 
-                # second loop go into link for description and more info
-                # have a lot of info like process, fee breakdown ect if needed
-                for basic_info in basic_event_info:
+                    # get app fee
                     try:
-                        event_id = basic_info["id"]
-                        driver.get(
-                            f"https://www.zapplication.org/event-info.php?ID={event_id}"
+                        fee_div = card.find_element(
+                            By.XPATH, ".//div[contains(., 'Fee')]"
                         )
-                        time.sleep(2)
-
-                        description_sections = []
-                        try:
-                            event_info_section = driver.find_element(
-                                By.XPATH,
-                                "//h2[@id='event-info']/following-sibling::div[1]",
-                            )
-                            description_sections.append(event_info_section.text.strip())
-                        except:
-                            print(
-                                f"Couldn't find event info section for: {basic_info['name']}"
-                            )
-
-                        try:
-                            general_info_section = driver.find_element(
-                                By.XPATH,
-                                "//h2[contains(text(), 'GENERAL INFORMATION')]/following-sibling::div[1]",
-                            )
-                            description_sections.append(
-                                general_info_section.text.strip()
-                            )
-                        except:
-                            pass
-
-                        try:
-                            booth_info_section = driver.find_element(
-                                By.XPATH,
-                                "//h2[contains(text(), 'BOOTH INFORMATION')]/following-sibling::div[1]",
-                            )
-                            description_sections.append(booth_info_section.text.strip())
-                        except:
-                            pass
-
-                        try:
-                            rules_section = driver.find_element(
-                                By.XPATH,
-                                "//h2[contains(text(), 'RULES/REGULATIONS')]/following-sibling::div[1]",
-                            )
-                            description_sections.append(rules_section.text.strip())
-                        except:
-                            pass
-
-                        # combine all, cuz zapp split them into different div
-                        description = "\n\n".join(description_sections)
-
-                        # use old method
-                        if not description:
-                            try:
-                                all_div_elements = driver.find_elements(
-                                    By.CSS_SELECTOR, "div.my-4 div"
-                                )
-                                description = "\n\n".join(
-                                    [
-                                        div.text.strip()
-                                        for div in all_div_elements
-                                        if div.text.strip()
-                                    ]
-                                )
-                            except:
-                                print(
-                                    f"Couldn't find any description for: {basic_info['name']}"
-                                )
-                                description = ""
-
-                        # price = ""
-                        # try:
-                        #     fee_section = driver.find_element(
-                        #         By.XPATH,
-                        #         "//span[contains(., 'Fee:')]/following-sibling::text()[1]",
-                        #     )
-                        #     price = fee_section.strip()
-                        # except:
-                        #     try:
-                        #         fee_section = driver.find_element(
-                        #             By.XPATH,
-                        #             "//span[contains(@class, 'font-weight-bold')][contains(., 'Fee:')]",
-                        #         )
-                        #         price = fee_section.find_element(
-                        #             By.XPATH, "following-sibling::text()[1]"
-                        #         ).strip()
-                        #     except:
-                        #         try:
-                        #             fee_section = driver.find_element(
-                        #                 By.CSS_SELECTOR,
-                        #                 ".col-md-4 span.font-weight-bold:contains('Fee:')",
-                        #             )
-                        #             price = fee_section.parent.text.replace("Fee:", "").strip()
-                        #         except:
-                        #             print(f"Couldn't find fee for: {basic_info['name']}")
-
-                        # price = basic_info.get("fee", "")
-                        # if not price:
-                        #     try:
-                        #         fee_elements = driver.find_elements(
-                        #             By.XPATH,
-                        #             "//*[contains(text(), 'Fee:') or contains(text(), 'fee')]",
-                        #         )
-                        #         for fee_elem in fee_elements:
-                        #             fee_text = fee_elem.text
-                        #             if "Fee:" in fee_text and len(fee_text) < 100:
-                        #                 price = fee_text.replace("Fee:", "").strip()
-                        #                 break
-                        #     except:
-                        #         print(f"Couldn't find fee for: {basic_info['name']}")
-
-                        # full_address = ""
-                        # try:
-                        #     address_elements = driver.find_elements(
-                        #         By.XPATH, "//*[contains(text(), 'Where:')]"
-                        #     )
-                        #     for addr_elem in address_elements:
-                        #         addr_text = addr_elem.text
-                        #         if "Where:" in addr_text:
-                        #             full_address = addr_text.replace("Where:", "").strip()
-                        #             break
-                        # except:
-                        #     print(f"Couldn't find detailed address for: {basic_info['name']}")
-
-                        # detailed_date = basic_info["date"]
-                        # try:
-                        #     date_elements = driver.find_elements(
-                        #         By.XPATH, "//*[contains(text(), 'When:')]"
-                        #     )
-                        #     for date_elem in date_elements:
-                        #         date_text = date_elem.text
-                        #         if "When:" in date_text:
-                        #             detailed_date = date_text.replace("When:", "").strip()
-                        #             break
-                        # except:
-                        #     print(f"Couldn't find detailed date for: {basic_info['name']}")
-
-                        # host = ""
-                        # try:
-                        #     host_elements = driver.find_elements(
-                        #         By.XPATH,
-                        #         "//*[contains(text(), 'Hosted by') or contains(text(), 'Organizer')]",
-                        #     )
-                        #     for host_elem in host_elements:
-                        #         host_text = host_elem.text
-                        #         if "Hosted by" in host_text or "Organizer" in host_text:
-                        #             host = (
-                        #                 host_text.replace("Hosted by", "")
-                        #                 .replace("Organizer:", "")
-                        #                 .strip()
-                        #             )
-                        #             # Limit to reasonable length
-                        #             if len(host) > 50:
-                        #                 host = host[:50] + "..."
-                        #             break
-                        # except:
-                        #     print(f"Couldn't find host for: {basic_info['name']}")
-
-                        event = {
-                            "name": basic_info["name"],
-                            "description": description,
-                            "location": basic_info["location"],
-                            # "full_address": full_address,
-                            # "vendor_id": "Zapplication",
-                            "type": ["pop up"],
-                            "date": basic_info["date"],
-                            # "detailed_date": detailed_date,
-                            # "price": price,
-                            # "host": host,
+                        fee = fee_div.find_element(
+                            By.CSS_SELECTOR, "span.font-weight-bold"
+                        ).text.strip()
+                    except Exception as e:
+                        print(f"Error getting fee for {name}: {e}")
+                        fee = ""
+
+                    # skip the event-info.php visit for events we have
+                    if not _claim(
+                        known_events,
+                        make_event_id(
+                            {"name": name, "type": ["pop up"], "location": location}
+                        ),
+                        "zapp",
+                    ):
+                        continue
+
+                    # basic info from outside cards
+                    basic_event_info.append(
+                        {
+                            "name": name,
+                            "date": date,
+                            "location": location,
                             "id": event_id,
-                            # "url": basic_info["url"],
-                            "image": "",  # Zapplication don't have images for events
-                            "vendorFee": None,
-                            "totalCost": None,
-                            "attendeeType": [],
-                            "headcount": None,
-                            "demographics": [],
-                            "startDate": {"seconds": 0, "nanoseconds": 0},
-                            "endDate": {"seconds": 0, "nanoseconds": 0},
-                            "score": None,
-                            "scoreBreakdown": None,
+                            # "url": event_link,
+                            # "fee": fee,
                         }
+                    )
+                except Exception as e:
+                    print(f"Error in first pass for event card: {e}")
 
-                        events.append(event)
+        frontier.finish_page("zapp", keyword, "", 1, basic_event_info)
 
-                    except Exception as e:
-                        print(e)
-                        continue
+    except Exception as e:
+        print(f"Error processing keyword '{keyword}': {e}")
 
-            except Exception as e:
-                print(f"Error processing keyword '{keyword}': {e}")
+    return basic_event_info
 
-        driver.quit()
-        return events
 
-    except Exception as e:
-        print(f"Error scraping Zapp {e}")
-        driver.quit()
-        return []
+# go into link for description and more info
+# have a lot of info like process, fee breakdown ect if needed
+def _scrape_zapp_event(pool, basic_info):
+    try:
+        event_id = basic_info["id"]
+        event_info_url = ZAPP_EVENT_URL.format(event_id=event_id)
+
+        description = frontier.detail_result(event_info_url)
+        if description is not None:
+            return _zapp_event(basic_info, description)
+        frontier.start_detail(event_info_url)
+
+        with pool.driver() as driver:
+            rate_limiter.wait(event_info_url)
+            with metrics.timer("selenium_page_seconds", source="zapp"):
+                driver.get(event_info_url)
+            try:
+                wait_for(driver, By.CSS_SELECTOR, "h2, div.my-4")
+            except TimeoutException:
+                print(f"event info page didnt load for: {basic_info['name']}")
 
+            description_sections = []
+            try:
+                event_info_section = driver.find_element(
+                    By.XPATH,
+                    "//h2[@id='event-info']/following-sibling::div[1]",
+                )
+                description_sections.append(event_info_section.text.strip())
+            except:
+                print(
+                    f"Couldn't find event info section for: {basic_info['name']}"
+                )
 
-# need event id for duplicate
-def make_event_id(event):
-    return f"{event['name']}-{event['type'][0]}-{event['location']['city']}"
+            try:
+                general_info_section = driver.find_element(
+                    By.XPATH,
+                    "//h2[contains(text(), 'GENERAL INFORMATION')]/following-sibling::div[1]",
+                )
+                description_sections.append(
+                    general_info_section.text.strip()
+                )
+            except:
+                pass
+
+            try:
+                booth_info_section = driver.find_element(
+                    By.XPATH,
+                    "//h2[contains(text(), 'BOOTH INFORMATION')]/following-sibling::div[1]",
+                )
+                description_sections.append(booth_info_section.text.strip())
+            except:
+                pass
 
+            try:
+                rules_section = driver.find_element(
+                    By.XPATH,
+                    "//h2[contains(text(), 'RULES/REGULATIONS')]/following-sibling::div[1]",
+                )
+                description_sections.append(rules_section.text.strip())
+            except:
+                pass
 
-if __name__ == "__main__":
-    all_events = []
+            # combine all, cuz zapp split them into different div
+            description = "\n\n".join(description_sections)
 
-    # Get and append events from sources
-    eventeny_events = scrape_eventeny()
-    all_events.extend(eventeny_events)
-    eventbrite_events = scrape_eventbrite()
-    all_events.extend(eventbrite_events)
-    zapp_events = scrape_zapp()
-    all_events.extend(zapp_events)
+            # use old method
+            if not description:
+                try:
+                    all_div_elements = driver.find_elements(
+                        By.CSS_SELECTOR, "div.my-4 div"
+                    )
+                    description = "\n\n".join(
+                        [
+                            div.text.strip()
+                            for div in all_div_elements
+                            if div.text.strip()
+                        ]
+                    )
+                except:
+                    print(
+                        f"Couldn't find any description for: {basic_info['name']}"
+                    )
+                    description = ""
+
+            # price = ""
+            # try:
+            #     fee_section = driver.find_element(
+            #         By.XPATH,
+            #         "//span[contains(., 'Fee:')]/following-sibling::text()[1]",
+            #     )
+            #     price = fee_section.strip()
+            # except:
+            #     try:
+            #         fee_section = driver.find_element(
+            #             By.XPATH,
+            #             "//span[contains(@class, 'font-weight-bold')][contains(., 'Fee:')]",
+            #         )
+            #         price = fee_section.find_element(
+            #             By.XPATH, "following-sibling::text()[1]"
+            #         ).strip()
+            #     except:
+            #         try:
+            #             fee_section = driver.find_element(
+            #                 By.CSS_SELECTOR,
+            #                 ".col-md-4 span.font-weight-bold:contains('Fee:')",
+            #             )
+            #             price = fee_section.parent.text.replace("Fee:", "").strip()
+            #         except:
+            #             print(f"Couldn't find fee for: {basic_info['name']}")
+
+            # price = basic_info.get("fee", "")
+            # if not price:
+            #     try:
+            #         fee_elements = driver.find_elements(
+            #             By.XPATH,
+            #             "//*[contains(text(), 'Fee:') or contains(text(), 'fee')]",
+            #         )
+            #         for fee_elem in fee_elements:
+            #             fee_text = fee_elem.text
+            #             if "Fee:" in fee_text and len(fee_text) < 100:
+            #                 price = fee_text.replace("Fee:", "").strip()
+            #                 break
+            #     except:
+            #         print(f"Couldn't find fee for: {basic_info['name']}")
+
+            # full_address = ""
+            # try:
+            #     address_elements = driver.find_elements(
+            #         By.XPATH, "//*[contains(text(), 'Where:')]"
+            #     )
+            #     for addr_elem in address_elements:
+            #         addr_text = addr_elem.text
+            #         if "Where:" in addr_text:
+            #             full_address = addr_text.replace("Where:", "").strip()
+            #             break
+            # except:
+            #     print(f"Couldn't find detailed address for: {basic_info['name']}")
+
+            # detailed_date = basic_info["date"]
+            # try:
+            #     date_elements = driver.find_elements(
+            #         By.XPATH, "//*[contains(text(), 'When:')]"
+            #     )
+            #     for date_elem in date_elements:
+            #         date_text = date_elem.text
+            #         if "When:" in date_text:
+            #             detailed_date = date_text.replace("When:", "").strip()
+            #             break
+            # except:
+            #     print(f"Couldn't find detailed date for: {basic_info['name']}")
+
+            # host = ""
+            # try:
+            #     host_elements = driver.find_elements(
+            #         By.XPATH,
+            #         "//*[contains(text(), 'Hosted by') or contains(text(), 'Organizer')]",
+            #     )
+            #     for host_elem in host_elements:
+            #         host_text = host_elem.text
+            #         if "Hosted by" in host_text or "Organizer" in host_text:
+            #             host = (
+            #                 host_text.replace("Hosted by", "")
+            #                 .replace("Organizer:", "")
+            #                 .strip()
+            #             )
+            #             # Limit to reasonable length
+            #             if len(host) > 50:
+            #                 host = host[:50] + "..."
+            #             break
+            # except:
+            #     print(f"Couldn't find host for: {basic_info['name']}")
+
+        frontier.finish_detail(event_info_url, description)
+        return _zapp_event(basic_info, description)
 
-    if all_events:
-        try:
-            events_table = db.collection("events")
-            batch = db.batch()
+    except Exception as e:
+        print(e)
+        return None
+
+
+# same event shape whichever backend read the page
+def _zapp_event(basic_info, description):
+    return {
+        "name": basic_info["name"],
+        "source": "zapp",
+        "description": description,
+        "location": basic_info["location"],
+        # "full_address": full_address,
+        # "vendor_id": "Zapplication",
+        "type": ["pop up"],
+        "date": basic_info["date"],
+        # "detailed_date": detailed_date,
+        # "price": price,
+        # "host": host,
+        "id": basic_info["id"],
+        # "url": basic_info["url"],
+        "image": "",  # Zapplication don't have images for events
+        "vendorFee": None,
+        "totalCost": None,
+        "attendeeType": [],
+        "headcount": None,
+        "demographics": [],
+        "startDate": {"seconds": 0, "nanoseconds": 0},
+        "endDate": {"seconds": 0, "nanoseconds": 0},
+        "score": None,
+        "scoreBreakdown": None,
+    }
 
-            new_events = 0
-            duplicate_count = 0
 
-            for event in all_events:
-                # make unique id and check if there duplicate
-                event_unique_id = make_event_id(event)
-                event["id"] = event_unique_id
+# claim() that also counts the detail page saved when the event is known
+def _claim(known_events, event_id, source):
+    if known_events.claim(event_id):
+        return True
+    metrics.inc("detail_pages_skipped_total", source=source)
+    return False
 
-                matching_events = events_table.where("id", "==", event_unique_id).get()
 
-                if not matching_events:
-                    event_ref = events_table.document()
-                    batch.set(event_ref, event)
-                    new_events += 1
-                else:
-                    duplicate_count += 1
+# events from a unit finished before a restart, minus the ones that made it
+# into the db (or came up again) since
+def _replay_events(events, known_events):
+    return [event for event in events if known_events.claim(make_event_id(event))]
 
-            if new_events > 0:
-                batch.commit()
-                print(f"Added {new_events} new events")
-            else:
-                print("no new event")
 
-            print(f"{duplicate_count} duplicate events")
+# fetch + parse one detail page, checkpointed in the frontier
+async def _fetch_details(fetcher, event_url, parse):
+    details = frontier.detail_result(event_url)
+    if details is not None:
+        return details
+    frontier.start_detail(event_url)
+    response = await fetcher.fetch(event_url)
+    details = fetcher.parse_once(event_url, response, lambda r: parse(event_url, r))
+    if response is not None:
+        frontier.finish_detail(event_url, details)
+    return details
 
-        except Exception as e:
-            print("error adding events to db", e)
+
+# need event id for duplicate
+def make_event_id(event):
+    return f"{event['name']}-{event['type'][0]}-{event['location']['city']}"
+
+
+# events whose images are fetched together when thumbnails are on
+INGEST_BATCH_SIZE = 32
+
+
+# dedup, normalize and write events as they stream in from the scrapers
+# date strings are parsed into startDate/endDate here
+# events go to the sink while the crawl is still running
+# stored events are only rewritten when their fingerprint moved, and then only
+# the fields that changed, near duplicates from other sources get merged
+# geocoder (geocoder.make_geocoder()) adds coordinates and a geohash
+# images (images.make_image_ingest()) adds a thumbnail we host
+def ingest_events(events, sink, known_events, geocoder=None, images=None):
+    counts = Counter()
+
+    # events go through in batches so a batch's places are geocoded in one
+    # lookup and its image downloads overlap
+    batch_size = INGEST_BATCH_SIZE if geocoder or images else 1
+    for batch in batched(events, batch_size):
+        for event in batch:
+            # make unique id and check if there duplicate
+            event["id"] = make_event_id(event)
+            event["scrapedAt"] = datetime.now(timezone.utc)
+            normalize_dates(event)
+        if geocoder:
+            geocoder.locate_many(batch)
+        if images:
+            images.attach(batch)
+        for event in batch:
+            counts[store_event(sink, known_events, event)] += 1
+
+    if counts["new"] > 0:
+        print(f"Added {counts['new']} new events")
     else:
-        print("no events found")
+        print("no new event")
+
+    print(f"{counts['updated']} events changed and updated")
+    print(f"{counts['merged']} events merged into the same event from another source")
+    print(f"{counts['unchanged']} duplicate events")
+    return counts["new"]
+
+
+if __name__ == "__main__":
+    run_started = datetime.now(timezone.utc)
+    response_cache = ResponseCache(ttls=CACHE_TTLS)
+    sink = make_sink()
+    geocoder = make_geocoder()
+    images = make_image_ingest(writes_firestore=isinstance(sink, FirestoreSink))
+    known_events = sink.known_events(DETAIL_REFRESH_AGE)
+    frontier.start_run()
+
+    # sources hit different hosts so they run side by side, each on its own
+    # host's rate budget, events are written as they come
+    all_events = merge_sources(
+        {
+            "eventeny": lambda: scrape_eventeny(known_events),
+            "eventbrite": lambda: scrape_eventbrite(known_events),
+            "zapp": lambda: scrape_zapp(known_events),
+        }
+    )
+
+    try:
+        with sink, profile("ingest"):
+            ingest_events(all_events, sink, known_events, geocoder, images)
+        frontier.finish_run()
+
+        # rankings only need the events this run wrote, staged runs get
+        # scored once they are synced
+        if isinstance(sink, FirestoreSink):
+            from scoring import score_events
+
+            with profile("scoring"):
+                score_events(sink.db, since=run_started)
+    except Exception as e:
+        # run stays open, next start resumes from its checkpoints
+        print("error adding events to db", e)
+    finally:
+        if geocoder:
+            geocoder.close()
+        if images:
+            images.close()
+        response_cache.close()
+        # SCRAPER_PROFILE=... for per stage profiles, see metrics.py
+        metrics.write_report()
 
     # print first item only
     # TEST EVENTBRITE SCRAPER
@@ -0,0 +1,335 @@
+"""
+Where ingested events go
+FirestoreSink writes straight to the events collection, SQLiteSink and
+JSONLSink stage events on disk so a crawl runs at full speed and fully
+offline. sync_staged() then diffs a staging store against Firestore by
+fingerprint and pushes only new events and changed fields
+
+every sink takes the same calls from store_event():
+known_events(), upsert(doc_id, event), update(doc_id, fields), close()
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+
+from batch_writer import BatchWriter
+from fingerprint import changed_fields, field_hashes, fingerprint, keep_stored
+from known_events import KnownEvents
+from metrics import metrics
+
+STAGING_SQLITE_PATH = "./.scraper_cache/staging.sqlite"
+STAGING_JSONL_PATH = "./.scraper_cache/staging.jsonl"
+
+# sqlite staging commits this many writes at a time
+SQLITE_COMMIT_EVERY = 500
+
+
+# datetimes (scrapedAt etc) survive the trip through json
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not json serializable")
+
+
+def _decode(obj):
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def dumps(data):
+    return json.dumps(data, default=_encode)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+class Sink:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # KnownEvents for what this sink already holds
+    def known_events(self, refresh_age=None):
+        raise NotImplementedError
+
+    # new event, merged into whatever is at doc_id
+    def upsert(self, doc_id, event):
+        raise NotImplementedError
+
+    # only the given top level fields are replaced
+    def update(self, doc_id, fields):
+        raise NotImplementedError
+
+    # (doc_id, event) for everything staged, what sync_staged() pushes
+    def events(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FirestoreSink(Sink):
+    def __init__(self, db, collection="events", flush_interval=30):
+        self.db = db
+        self.events_ref = db.collection(collection)
+        self.writer = BatchWriter(db, label="event writes", flush_interval=flush_interval)
+
+    def known_events(self, refresh_age=None):
+        return KnownEvents.from_firestore(self.events_ref, refresh_age)
+
+    def upsert(self, doc_id, event):
+        # merge so a rerun over the same event is just an upsert
+        self.writer.set(self.events_ref.document(doc_id), event, merge=True)
+
+    def update(self, doc_id, fields):
+        # set merging just these fields instead of update, which fails when the
+        # doc is missing and takes the rest of its batch chunk down with it
+        self.writer.set(self.events_ref.document(doc_id), fields, merge=list(fields))
+
+    def close(self):
+        self.writer.close()
+
+
+class SQLiteSink(Sink):
+    """
+    One row per document, the event json plus id/fingerprint columns
+    so it can be queried by hand
+    """
+
+    def __init__(self, path=STAGING_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                doc_id TEXT PRIMARY KEY,
+                id TEXT,
+                scraped_at TEXT,
+                fingerprint TEXT,
+                field_hashes TEXT,
+                data TEXT
+            )
+            """
+        )
+        self._conn.commit()
+
+    def known_events(self, refresh_age=None):
+        return KnownEvents.from_documents(self.events(), refresh_age)
+
+    def _write(self, doc_id, event):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events (doc_id, id, scraped_at, fingerprint, field_hashes, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                doc_id,
+                event.get("id"),
+                dumps(event.get("scrapedAt")),
+                event.get("fingerprint"),
+                dumps(event.get("fieldHashes")),
+                dumps(event),
+            ),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= SQLITE_COMMIT_EVERY:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def _read(self, doc_id):
+        row = self._conn.execute("SELECT data FROM events WHERE doc_id = ?", (doc_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def upsert(self, doc_id, event):
+        with self._lock:
+            self._write(doc_id, {**(self._read(doc_id) or {}), **event})
+
+    def update(self, doc_id, fields):
+        with self._lock:
+            current = self._read(doc_id)
+            if current is None:
+                raise KeyError(f"No staged event to update: {doc_id}")
+            self._write(doc_id, {**current, **fields})
+
+    def events(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id, data FROM events").fetchall()
+        for doc_id, data in rows:
+            yield doc_id, loads(data)
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted = 0
+            self._conn.close()
+
+
+class JSONLSink(Sink):
+    """
+    Append only log, one {"docId", "op", "data"} line per write
+    the current state of a document is its upsert/update lines replayed in order
+    """
+
+    def __init__(self, path=STAGING_JSONL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        with self._lock:
+            self._file.flush()
+        documents = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = loads(line)
+                current = documents.get(record["docId"], {})
+                documents[record["docId"]] = {**current, **record["data"]}
+        return documents
+
+    def known_events(self, refresh_age=None):
+        return KnownEvents.from_documents(self._replay().items(), refresh_age)
+
+    def _append(self, doc_id, op, data):
+        line = dumps({"docId": doc_id, "op": op, "data": data})
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def upsert(self, doc_id, event):
+        self._append(doc_id, "upsert", event)
+
+    def update(self, doc_id, fields):
+        self._append(doc_id, "update", fields)
+
+    def events(self):
+        yield from self._replay().items()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# staging store by file name, .jsonl or sqlite
+def open_staging(path):
+    if path.endswith(".jsonl"):
+        return JSONLSink(path)
+    return SQLiteSink(path)
+
+
+# fold a near duplicate into its canonical event, the canonical doc keeps
+# its own fields and just records the extra source and id
+# False when it was already merged on an earlier run
+def _merge_duplicate(sink, known_events, canonical, event):
+    entry = known_events.dedup.entries[canonical]
+    merge = {}
+    source = event.get("source")
+    if source and source not in entry.sources:
+        entry.sources.append(source)
+        merge["sources"] = list(entry.sources)
+    if event["id"] not in entry.merged_ids:
+        entry.merged_ids.append(event["id"])
+        merge["mergedIds"] = list(entry.merged_ids)
+    if not entry.image and event.get("image"):
+        entry.image = event["image"]
+        merge["image"] = event["image"]
+        if event.get("thumbnail"):
+            merge["thumbnail"] = event["thumbnail"]
+    if merge:
+        # set with merge, not update, it can land in a batch chunk that
+        # commits before the one creating the canonical doc
+        sink.upsert(known_events.doc_id(canonical), merge)
+    known_events.canonical[event["id"]] = canonical
+    return bool(merge)
+
+
+# fingerprint of an already stored event once its unchanged derived fields
+# are carried over from what is stored, patches hashes in place
+def _stored_fingerprint(known_events, event_id, hashes):
+    old_hashes = known_events.field_hashes.get(event_id)
+    if old_hashes:
+        keep_stored(hashes, old_hashes)
+    return fingerprint(hashes)
+
+
+# write one event to the sink if it is new or its fingerprint moved,
+# returns "new", "updated", "merged" or "unchanged"
+def store_event(sink, known_events, event):
+    event_id = event["id"]
+    hashes = field_hashes(event)
+    event_fingerprint = fingerprint(hashes)
+
+    canonical = known_events.canonical.get(event_id)
+    if canonical is None and not known_events.is_stored(event_id):
+        canonical = known_events.dedup.match(event)
+
+    if canonical is not None and canonical != event_id:
+        merged = _merge_duplicate(sink, known_events, canonical, event)
+        result = "merged" if merged else "unchanged"
+    elif not known_events.is_stored(event_id):
+        stored = {**event, "fingerprint": event_fingerprint, "fieldHashes": hashes}
+        # a staged event that was already merged keeps every source it had
+        if event.get("source") and not event.get("sources"):
+            stored["sources"] = [event["source"]]
+        sink.upsert(known_events.doc_id(event_id), stored)
+        known_events.dedup.add(event_id, stored)
+        result = "new"
+    else:
+        event_fingerprint = _stored_fingerprint(known_events, event_id, hashes)
+        if known_events.fingerprints.get(event_id) != event_fingerprint:
+            changed = changed_fields(known_events.field_hashes.get(event_id), hashes)
+            update = {field: event.get(field) for field in changed}
+            update.update(
+                {
+                    "fingerprint": event_fingerprint,
+                    "fieldHashes": hashes,
+                    "scrapedAt": event.get("scrapedAt"),
+                }
+            )
+            sink.update(known_events.doc_id(event_id), update)
+            metrics.inc("fields_updated_total", len(changed))
+            result = "updated"
+        else:
+            result = "unchanged"
+
+    # a refetched event that came back the same still has to count as read,
+    # or it stays stale and its detail page is fetched again every run
+    stale = known_events.is_stored(event_id) and known_events.is_stale(event_id)
+    if result in ("merged", "unchanged") and stale:
+        target = canonical if canonical is not None else event_id
+        sink.update(known_events.doc_id(target), {"checkedAt": event.get("scrapedAt")})
+        known_events.scraped_at[event_id] = event.get("scrapedAt")
+
+    metrics.inc("events_ingested_total", result=result)
+    return result
+
+
+# push a staging store into firestore, only what firestore doesnt have yet
+# use as: with open_staging(path) as staging, FirestoreSink(db) as target
+def sync_staged(staging, target):
+    known_events = target.known_events()
+    counts = Counter()
+    for _, event in staging.events():
+        if not event.get("id"):
+            continue
+        # SCRAPER_THUMBNAILS=local paths only resolve on the machine that staged them
+        if str(event.get("thumbnail") or "").startswith("/"):
+            event = {field: value for field, value in event.items() if field != "thumbnail"}
+        counts[store_event(target, known_events, event)] += 1
+    print(
+        f"Synced staging: {counts['new']} new, {counts['updated']} updated, "
+        f"{counts['merged']} merged, {counts['unchanged']} unchanged"
+    )
+    return counts
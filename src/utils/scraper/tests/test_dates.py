@@ -0,0 +1,67 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from dates import parse_event_date
+from known_events import KnownEvents
+from sinks import SQLiteSink, store_event
+
+# a saturday
+TODAY = date(2025, 10, 18)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "text, start, end",
+    [
+        # date only, noon to 23:59 new york like the migration
+        ("Nov 15 - Nov 16", utc(2025, 11, 15, 17), utc(2025, 11, 17, 4, 59)),
+        ("Nov 15, 2025 - Nov 16, 2025", utc(2025, 11, 15, 17), utc(2025, 11, 17, 4, 59)),
+        ("Dec 7, 2025", utc(2025, 12, 7, 17), utc(2025, 12, 8, 4, 59)),
+        ("Sunday, December 7", utc(2025, 12, 7, 17), utc(2025, 12, 8, 4, 59)),
+        ("9/14/25 - 9/14/25", utc(2025, 9, 14, 16), utc(2025, 9, 15, 3, 59)),
+        # relative to the day it was scraped
+        ("Today at 5pm", utc(2025, 10, 18, 21), None),
+        ("Tonight at 8 PM", utc(2025, 10, 19, 0), None),
+        ("Tomorrow at 10:00 AM", utc(2025, 10, 19, 14), None),
+        ("Saturday at 10:00 AM", utc(2025, 10, 18, 14), None),
+        ("Sunday at 10am - 4pm EDT", utc(2025, 10, 19, 14), utc(2025, 10, 19, 20)),
+        # the formats that were already there
+        ("Saturday, April 26 · 3 - 6pm EDT", utc(2025, 4, 26, 19), utc(2025, 4, 26, 22)),
+        ("Saturday, April 26 · 10am", utc(2025, 4, 26, 14), None),
+        (
+            "Mar 01, 2025 · 1:00 PM - Mar 01, 2025 · 6:00 PM(GMT-04:00) Eastern Time",
+            utc(2025, 3, 1, 17),
+            utc(2025, 3, 1, 22),
+        ),
+    ],
+)
+def test_parse_event_date(text, start, end):
+    assert parse_event_date(text, today=TODAY) == (start, end)
+
+
+@pytest.mark.parametrize("text", ["", "Birthday at 5pm", "Date TBA", "Nov 31 - Dec 2"])
+def test_unparseable(text):
+    assert parse_event_date(text, today=TODAY) == (None, None)
+
+
+def test_year_is_kept_while_the_date_string_is_unchanged(tmp_path):
+    event = {"id": "market", "name": "Market", "date": "Aug 2 - Aug 3", "source": "zapp"}
+
+    def scrape(today):
+        start, end = parse_event_date(event["date"], today=today)
+        return {**event, "startDate": start, "endDate": end, "scrapedAt": utc(2025, 1, 1)}
+
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as sink:
+        assert store_event(sink, KnownEvents(), scrape(date(2025, 7, 20))) == "new"
+
+    # more than 60 days past, a fresh parse now lands on next year
+    later = scrape(date(2025, 10, 18))
+    assert later["startDate"].year == 2026
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as sink:
+        assert store_event(sink, sink.known_events(), later) == "unchanged"
+        [(_, stored)] = sink.events()
+    assert stored["startDate"].year == 2025
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dedup import DATE_WINDOW, NAME_THRESHOLD, DedupIndex, jaccard, trigrams
+
+START = datetime(2025, 11, 8, 10, tzinfo=timezone.utc)
+NYC = {"city": "New York City", "state": "New York"}
+
+
+def event(name, source="zapp", start=START, location=NYC):
+    return {"name": name, "source": source, "startDate": start, "location": location}
+
+
+def index_with(*events):
+    index = DedupIndex()
+    for i, stored in enumerate(events):
+        index.add(f"event-{i}", stored)
+    return index
+
+
+def test_close_names_from_another_source_match():
+    index = index_with(event("Hudson Valley Makers Fair"))
+
+    duplicate = event("Hudson Valley Maker Faire", source="eventbrite", location={"city": "NYC", "state": "NY"})
+    assert index.match(duplicate) == "event-0"
+
+
+def test_names_below_the_threshold_do_not_match():
+    index = index_with(event("Brooklyn Craft Market"))
+
+    other = event("Brooklyn Vintage Fair", source="eventbrite")
+    assert jaccard(trigrams(other["name"]), trigrams("Brooklyn Craft Market")) < NAME_THRESHOLD
+    assert index.match(other) is None
+
+
+def test_same_source_never_matches_itself():
+    index = index_with(event("Hudson Valley Makers Fair"))
+
+    assert index.match(event("Hudson Valley Maker Faire")) is None
+
+
+def test_other_city_does_not_match():
+    index = index_with(event("Hudson Valley Makers Fair"))
+
+    elsewhere = event("Hudson Valley Makers Fair", source="eventbrite", location={"city": "Hudson", "state": "NY"})
+    assert index.match(elsewhere) is None
+
+
+@pytest.mark.parametrize(
+    "offset, matches",
+    [
+        (timedelta(0), True),
+        (timedelta(seconds=DATE_WINDOW), True),
+        (timedelta(seconds=DATE_WINDOW + 1), False),
+        (-timedelta(days=30), False),
+    ],
+)
+def test_start_dates_have_to_be_within_the_window(offset, matches):
+    index = index_with(event("Hudson Valley Makers Fair"))
+
+    later = event("Hudson Valley Makers Fair", source="eventbrite", start=START + offset)
+    assert (index.match(later) == "event-0") is matches
+
+
+def test_missing_date_on_either_side_falls_back_to_the_name():
+    undated = {"seconds": 0, "nanoseconds": 0}
+    index = index_with(event("Hudson Valley Makers Fair", start=undated))
+
+    assert index.match(event("Hudson Valley Maker Faire", source="eventbrite")) == "event-0"
+    assert index_with(event("Hudson Valley Makers Fair")).match(
+        event("Hudson Valley Maker Faire", source="eventbrite", start=undated)
+    ) == "event-0"
+
+
+@pytest.mark.parametrize("start", [START, {"seconds": 0, "nanoseconds": 0}])
+def test_other_editions_of_a_series_do_not_match(start):
+    # 0.72 on the names, with a date that didnt parse nothing else told them apart
+    index = index_with(event("Artisan Pop Up Market - November", start={"seconds": 0, "nanoseconds": 0}))
+
+    december = event("Artisan Pop Up Market - December", source="eventbrite", start=start)
+    assert jaccard(trigrams(december["name"]), trigrams("Artisan Pop Up Market - November")) >= NAME_THRESHOLD
+    assert index.match(december) is None
+
+
+@pytest.mark.parametrize(
+    "name, matches",
+    [
+        ("Artisan Pop-Up Market (Nov)", True),
+        ("Artisan Pop Up Market", True),
+        ("Artisan Pop Up Market - December 1st", False),
+        ("Artisan Pop Up Market - November 15th", False),
+    ],
+)
+def test_edition_words_only_block_when_they_disagree(name, matches):
+    index = index_with(event("Artisan Pop Up Market - November 1st"))
+
+    assert (index.match(event(name, source="eventbrite")) == "event-0") is matches
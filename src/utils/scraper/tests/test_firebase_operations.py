@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.document import DocumentSnapshot
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from FirebaseOperations import CHECK_FIELDS, FirebaseOperations
+
+SCRAPED_AT = datetime(2025, 4, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def operations():
+    # the real query builder, nothing here talks to firestore
+    ops = FirebaseOperations.__new__(FirebaseOperations)
+    ops.db = firestore.Client(project="test", credentials=AnonymousCredentials())
+    ops.events_ref = ops.db.collection("events")
+    return ops
+
+
+# the last document of a page the way the server returns it: only the projected fields
+def last_of_page(query, values):
+    projected = [field.field_path for field in query._projection.fields]
+    data = {field: values[field] for field in projected if field != "__name__"}
+    reference = query._parent.document("last")
+    return DocumentSnapshot(reference, data, True, None, None, None)
+
+
+VALUES = {
+    "scrapedAt": SCRAPED_AT,
+    "headcount": 50,
+    "name": "Market",
+    "location": {"city": "Hudson"},
+    "date": "Nov 15",
+    "category": "fair",
+}
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        [("scrapedAt", "<", SCRAPED_AT)],
+        [("scrapedAt", ">=", SCRAPED_AT), ("source", "==", "zapp")],
+        [("headcount", ">=", 10), ("scrapedAt", "<", SCRAPED_AT)],
+    ],
+)
+@pytest.mark.parametrize("fields", [[FieldPath.document_id()], CHECK_FIELDS])
+def test_next_page_cursor_builds_with_inequality_filters(operations, filters, fields):
+    query = operations._select(filters, fields)
+
+    page = query.limit(500).start_after(last_of_page(query, VALUES))
+
+    cursor = page._to_protobuf().start_at
+    assert cursor.values[-1].reference_value.endswith("/events/last")
+
+
+def test_projection_without_the_filtered_field_cannot_page(operations):
+    query = operations._query([("scrapedAt", "<", SCRAPED_AT)]).select(
+        [FieldPath.document_id()]
+    )
+
+    with pytest.raises(ValueError):
+        query.limit(500).start_after(last_of_page(query, VALUES))._to_protobuf()
+
+
+def test_equality_filters_keep_the_projection(operations):
+    query = operations._select([("source", "==", "zapp")], [FieldPath.document_id()])
+
+    assert [field.field_path for field in query._projection.fields] == ["__name__"]
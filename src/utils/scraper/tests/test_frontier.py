@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+from frontier import CrawlFrontier
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_database_is_created_by_start_run(tmp_path):
+    path = tmp_path / "cache" / "frontier.sqlite"
+    frontier = CrawlFrontier(str(path))
+
+    # unstarted, nothing is checkpointed or read back
+    frontier.start_page("zapp", "market")
+    frontier.finish_page("zapp", "market", "", 1, [{"id": "7100"}])
+    assert frontier.page_result("zapp", "market") is None
+    assert not path.parent.exists()
+
+    frontier.start_run()
+    frontier.finish_page("zapp", "market", "", 1, [{"id": "7100"}])
+    assert frontier.page_result("zapp", "market") == [{"id": "7100"}]
+    assert path.exists()
+
+
+def test_importing_the_scraper_leaves_no_files(tmp_path):
+    env = {**os.environ, "PYTHONPATH": SCRAPER_DIR}
+    subprocess.run([sys.executable, "-c", "import scraper"], cwd=tmp_path, env=env, check=True)
+
+    assert list(tmp_path.iterdir()) == []
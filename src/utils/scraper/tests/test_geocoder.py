@@ -0,0 +1,172 @@
+import itertools
+
+import pytest
+
+import geocoder
+import scraper
+from geocoder import GeocodeCache, Gazetteer, Geocoder, geohash, place_key, prefix_range
+from sinks import SQLiteSink
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # every time.time() call a second later, so LRU order never ties
+    ticks = itertools.count(1_000_000)
+    now = {"value": 0}
+
+    def time():
+        now["value"] = next(ticks)
+        return now["value"]
+
+    monkeypatch.setattr(geocoder.time, "time", time)
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_geohash_known_points():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(40.7128, -74.0060) == "dr5regw"
+    assert geohash(-33.8688, 151.2093, 5) == "r3gx2"
+
+
+def test_geohash_prefixes_are_coarser_cells():
+    assert geohash(40.7128, -74.0060, 4) == geohash(40.7128, -74.0060)[:4]
+
+
+def test_prefix_range_covers_every_hash_under_the_prefix():
+    start, end = prefix_range("dr5r")
+    assert start <= "dr5r" < end
+    assert start <= "dr5rzzz" < end
+    assert not start <= "dr5s" < end
+    assert not start <= "dr5q" < end
+
+
+def test_place_key_normalizes_aliases_and_states():
+    assert place_key({"city": "NYC", "state": "New York"}) == place_key(
+        {"city": "New York City", "state": "NY"}
+    )
+    assert place_key({"city": "", "state": "NY"}) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"), max_entries=2)
+    cache.put_many({"a|ny": (1.0, 1.0)})
+    cache.put_many({"b|ny": (2.0, 2.0)})
+    # reading a makes b the least recently used
+    assert cache.get_many(["a|ny"]) == {"a|ny": (1.0, 1.0)}
+    cache.put_many({"c|ny": (3.0, 3.0)})
+
+    assert len(cache) == 2
+    assert cache.get_many(["a|ny", "b|ny", "c|ny"]) == {"a|ny": (1.0, 1.0), "c|ny": (3.0, 3.0)}
+    cache.close()
+
+
+def test_cache_remembers_misses_until_negative_ttl(cache, clock, monkeypatch):
+    cache.put_many({"nowhere|ny": None})
+    assert cache.get_many(["nowhere|ny"]) == {"nowhere|ny": None}
+
+    monkeypatch.setattr(geocoder, "NEGATIVE_TTL", 1)
+    assert cache.get_many(["nowhere|ny"]) == {}
+
+
+def test_found_places_do_not_expire(cache, clock, monkeypatch):
+    cache.put_many({"hudson|ny": (42.25, -73.79)})
+    monkeypatch.setattr(geocoder, "NEGATIVE_TTL", 1)
+
+    assert cache.get_many(["hudson|ny"]) == {"hudson|ny": (42.25, -73.79)}
+
+
+class CountingGazetteer(Gazetteer):
+    def __init__(self, path):
+        super().__init__(path)
+        self.asked = []
+
+    def lookup_many(self, keys):
+        self.asked.append(sorted(keys))
+        return super().lookup_many(keys)
+
+
+@pytest.fixture
+def gazetteer_path(tmp_path):
+    path = tmp_path / "gazetteer.csv"
+    path.write_text(
+        "city,state,lat,lng\n"
+        "New York,NY,40.7128,-74.0060\n"
+        "Hudson,NY,42.2529,-73.7910\n",
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_geocode_many_resolves_each_place_once(gazetteer_path, cache):
+    backend = CountingGazetteer(gazetteer_path)
+    nyc = place_key({"city": "NYC", "state": "NY"})
+    hudson = place_key({"city": "Hudson", "state": "New York"})
+    missing = place_key({"city": "Atlantis", "state": "NY"})
+
+    results = Geocoder(backend, cache).geocode_many([nyc, hudson, missing, nyc, None])
+
+    assert results == {nyc: (40.7128, -74.0060), hudson: (42.2529, -73.7910), missing: None}
+    assert backend.asked == [sorted([nyc, hudson, missing])]
+
+    # a second geocoder on the same cache never reaches the backend, misses included
+    again = Geocoder(backend, cache).geocode_many([nyc, missing])
+    assert again == {nyc: (40.7128, -74.0060), missing: None}
+    assert len(backend.asked) == 1
+
+
+def test_locate_fills_geo_and_geohash(gazetteer_path, cache):
+    located = Geocoder(Gazetteer(gazetteer_path), cache)
+    event = {"location": {"city": "New York City", "state": "New York"}}
+
+    assert located.locate(event)
+    assert event["geo"] == {"lat": 40.7128, "lng": -74.0060}
+    assert event["geohash"] == "dr5regw"
+
+    nowhere = {"location": {"city": "Atlantis", "state": "NY"}}
+    assert not located.locate(nowhere)
+    assert "geo" not in nowhere and "geohash" not in nowhere
+
+
+def test_locate_many_asks_the_backend_once_per_batch(gazetteer_path, cache):
+    backend = CountingGazetteer(gazetteer_path)
+    events = [
+        {"location": {"city": "NYC", "state": "NY"}},
+        {"location": {"city": "Hudson", "state": "NY"}},
+        {"location": {"city": "New York City", "state": "New York"}},
+        {"location": {"city": "Atlantis", "state": "NY"}},
+        {"location": {}},
+    ]
+
+    Geocoder(backend, cache).locate_many(events)
+
+    assert len(backend.asked) == 1
+    assert [event.get("geohash") for event in events] == [
+        "dr5regw",
+        geohash(42.2529, -73.7910),
+        "dr5regw",
+        None,
+        None,
+    ]
+
+
+def test_ingest_geocodes_each_batch_in_one_lookup(gazetteer_path, cache, tmp_path):
+    backend = CountingGazetteer(gazetteer_path)
+    events = [
+        {"name": f"Market {i}", "type": ["pop up"], "location": {"city": city, "state": "NY"}}
+        for i, city in enumerate(["New York", "Hudson", "NYC", "Hudson"])
+    ]
+
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as sink:
+        with Geocoder(backend, cache) as located:
+            assert scraper.ingest_events(iter(events), sink, sink.known_events(), located) == 4
+        stored = [event for _, event in sink.events()]
+
+    assert backend.asked == [sorted({place_key(event["location"]) for event in events})]
+    assert all(event["geohash"] for event in stored)
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from PIL import Image
+
+import images
+from images import ImageIndex, ImageIngest, LocalImageStore, make_image_ingest
+
+
+def jpeg_bytes():
+    out = io.BytesIO()
+    Image.new("RGB", (1200, 800), (200, 80, 40)).save(out, "JPEG")
+    return out.getvalue()
+
+
+class FailingStore(LocalImageStore):
+    def put(self, digest, data):
+        raise ConnectionError("upload failed")
+
+
+@pytest.fixture
+def ingest_with(tmp_path):
+    made = []
+
+    def make(store):
+        ingest = ImageIngest(store, index=ImageIndex(str(tmp_path / "images.sqlite")))
+        made.append(ingest)
+        return ingest
+
+    yield make
+    for ingest in made:
+        ingest.close()
+
+
+def test_local_thumbnails_are_refused_for_firestore_runs():
+    with pytest.raises(ValueError):
+        make_image_ingest("local", writes_firestore=True)
+
+
+def test_local_thumbnails_are_allowed_for_staged_runs(tmp_path, monkeypatch):
+    # the image index lands in ./.scraper_cache
+    monkeypatch.chdir(tmp_path)
+    ingest = make_image_ingest("local", writes_firestore=False)
+    try:
+        assert isinstance(ingest.store, LocalImageStore)
+    finally:
+        ingest.close()
+
+
+def test_image_cdns_get_more_than_the_default_rate():
+    rate, _ = images.IMAGE_DEFAULT_RATE
+    assert images.image_rate_limiter.bucket("https://img.evbuc.com/a.jpg").rate > rate
+    assert images.image_rate_limiter.bucket("https://cdn.eventeny.com/a.jpg").rate > rate
+
+
+def test_store_writes_a_webp_thumbnail(tmp_path, ingest_with):
+    store = LocalImageStore(root=str(tmp_path / "thumbnails"))
+    ingest = ingest_with(store)
+
+    path = ingest._store("abcdef", jpeg_bytes())
+
+    assert path == "/thumbnails/ab/abcdef.webp"
+    with Image.open(tmp_path / "thumbnails" / "ab" / "abcdef.webp") as thumbnail:
+        assert thumbnail.size == images.THUMBNAIL_SIZE
+
+
+def test_a_failed_upload_is_a_failed_thumbnail(tmp_path, ingest_with):
+    ingest = ingest_with(FailingStore(root=str(tmp_path / "thumbnails")))
+
+    assert ingest._store("abcdef", jpeg_bytes()) is None
+
+
+def test_undecodable_images_are_a_failed_thumbnail(tmp_path, ingest_with):
+    ingest = ingest_with(LocalImageStore(root=str(tmp_path / "thumbnails")))
+
+    assert ingest._store("abcdef", b"not an image") is None
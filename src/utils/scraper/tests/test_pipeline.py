@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import metrics
+from pipeline import batched, iterate_async, merge_sources
+
+
+async def _numbers(count):
+    for number in range(count):
+        await asyncio.sleep(0)
+        yield number
+
+
+def test_merge_sources_yields_from_every_source():
+    sources = {
+        "evens": lambda: iterate_async(lambda: _numbers(3)),
+        "letters": lambda: iter("ab"),
+    }
+
+    assert sorted(map(str, merge_sources(sources))) == ["0", "1", "2", "a", "b"]
+
+
+def test_profiling_a_source_profiles_its_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "PROFILE_STAGES", {"demo"})
+    sources = {"demo": lambda: iterate_async(lambda: _numbers(5), stage="demo")}
+
+    assert list(merge_sources(sources)) == [0, 1, 2, 3, 4]
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["demo.loop.prof"]
+
+
+def test_iterate_async_raises_what_the_generator_raised():
+    async def failing():
+        yield 1
+        raise RuntimeError("boom")
+
+    items = iterate_async(failing)
+    assert next(items) == 1
+    with pytest.raises(RuntimeError, match="boom"):
+        next(items)
+
+
+def test_batched_keeps_order_and_the_short_tail():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+
+from benchmark.fake_firestore import FakeFirestore
+from scoring import (
+    BREAKDOWN_KEYS,
+    FACTORS,
+    RANK_MULTIPLIERS,
+    RANKINGS_COLLECTION,
+    SCORE_OFFSET,
+    _merge_ranked,
+    live_event_ids,
+    score_events,
+)
+
+NOW = datetime(2025, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def test_live_event_ids_drops_ended_and_deleted_events():
+    db = FakeFirestore()
+    events = db.collection("eventsFormatted")
+    events.document("upcoming").set({"name": "a", "endDate": NOW + timedelta(days=1)})
+    events.document("ended").set({"name": "b", "endDate": NOW - timedelta(days=1)})
+    events.document("undated").set({"name": "c", "endDate": None})
+
+    live = live_event_ids(db, ["upcoming", "ended", "undated", "deleted"], now=NOW)
+
+    assert live == {"upcoming", "undated"}
+
+
+def test_merge_ranked_replaces_rescored_and_drops_events_no_longer_live():
+    current = [{"id": "a", "score": 90}, {"id": "ended", "score": 80}, {"id": "b", "score": 50}]
+    fresh = [{"id": "b", "score": 70}, {"id": "c", "score": 60}]
+
+    merged = _merge_ranked(current, fresh, 10, live_ids={"a", "b", "c"})
+
+    assert merged == [
+        {"id": "a", "score": 90},
+        {"id": "b", "score": 70},
+        {"id": "c", "score": 60},
+    ]
+
+
+def test_merge_ranked_keeps_top_n():
+    current = [{"id": "a", "score": 90}, {"id": "b", "score": 80}]
+    fresh = [{"id": "c", "score": 85}]
+
+    assert [item["id"] for item in _merge_ranked(current, fresh, 2, {"a", "b"})] == ["a", "c"]
+
+
+VENDOR = {
+    "eventPreference": ["Art fair"],
+    "cities": ["Hudson"],
+    "demographic": ["Families"],
+    "categories": ["Jewelry"],
+    "schedule": {"preferredDays": ["Saturday"]},
+    "preferredEventSize": {"min": 20, "max": 80},
+    "budget": {"maxVendorFee": 100},
+    "eventPriorityFactors": [name for name, _ in FACTORS],
+}
+
+
+def formatted_event(**fields):
+    return {
+        "name": "Market",
+        "category_tags": ["Art fair"],
+        "location": {"city": "Hudson", "state": "NY"},
+        "booth_fees": "$50",
+        "demographic_guess": ["Families"],
+        "vendor_categories": ["Jewelry"],
+        "num_vendors": 40,
+        "estimated_headcount": 500,
+        # a saturday
+        "startDate": datetime(2099, 6, 6, 16, tzinfo=timezone.utc),
+        "endDate": datetime(2099, 6, 6, 22, tzinfo=timezone.utc),
+        "timestamp": NOW,
+        **fields,
+    }
+
+
+def ranking_db():
+    db = FakeFirestore()
+    db.collection("vendorProfile").document("vendor").set(VENDOR)
+    formatted = db.collection("eventsFormatted")
+    formatted.document("match").set(formatted_event())
+    formatted.document("elsewhere").set(
+        formatted_event(location={"city": "Boston", "state": "MA"}, vendor_categories=["Food"])
+    )
+    return db
+
+
+def test_score_events_ranks_formatted_events_with_their_breakdown():
+    db = ranking_db()
+
+    assert score_events(db) == 1
+
+    ranked = db.collection(RANKINGS_COLLECTION).document("vendor").get().to_dict()["rankedEvents"]
+    assert [item["id"] for item in ranked] == ["match", "elsewhere"]
+    best = ranked[0]["scoreBreakdown"]
+    assert best["locationScoreRaw"] == best["locationScoreMax"] == 20
+    assert best["productsScoreRaw"] == best["productsScoreMax"] == 10
+    assert ranked[1]["scoreBreakdown"]["locationScoreRaw"] == 0
+    assert ranked[1]["scoreBreakdown"]["productsScoreRaw"] == 0
+
+
+def test_breakdown_adds_up_to_the_score():
+    db = ranking_db()
+    score_events(db)
+
+    ranking = db.collection(RANKINGS_COLLECTION).document("vendor").get().to_dict()
+    for item in ranking["rankedEvents"]:
+        breakdown = item["scoreBreakdown"]
+        weighted = sum(
+            breakdown[f"{key}Raw"] * multiplier
+            for key, multiplier in zip(BREAKDOWN_KEYS, RANK_MULTIPLIERS)
+        )
+        most = sum(
+            breakdown[f"{key}Max"] * multiplier
+            for key, multiplier in zip(BREAKDOWN_KEYS, RANK_MULTIPLIERS)
+        )
+        expected = min(100, weighted / most * 100 + SCORE_OFFSET)
+        assert abs(expected - item["score"]) <= 0.51
+        assert breakdown["total"] == item["score"]
+
+
+def test_incremental_run_reaches_back_to_the_last_ranking():
+    db = ranking_db()
+    score_events(db)
+    # formatted after that ranking but before this run started
+    db.collection("eventsFormatted").document("late").set(
+        formatted_event(timestamp=datetime.now(timezone.utc))
+    )
+
+    score_events(db, since=datetime.now(timezone.utc) + timedelta(hours=1))
+
+    ranked = db.collection(RANKINGS_COLLECTION).document("vendor").get().to_dict()["rankedEvents"]
+    assert {item["id"] for item in ranked} == {"match", "elsewhere", "late"}
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+from sinks import SQLiteSink, store_event, sync_staged
+
+SCRAPED_AT = datetime(2025, 10, 18, tzinfo=timezone.utc)
+
+NYC = {"city": "New York", "state": "NY"}
+HUDSON = {"city": "Hudson", "state": "NY"}
+
+
+def event(**fields):
+    return {
+        "id": "market",
+        "name": "Market",
+        "source": "zapp",
+        "scrapedAt": SCRAPED_AT,
+        "location": NYC,
+        **fields,
+    }
+
+
+def rerun(path, again):
+    with SQLiteSink(path) as sink:
+        result = store_event(sink, sink.known_events(), again)
+        [(_, stored)] = sink.events()
+    return result, stored
+
+
+def test_geo_is_kept_when_the_run_did_not_geocode(tmp_path):
+    path = str(tmp_path / "staging.sqlite")
+    with SQLiteSink(path) as sink:
+        located = event(geo={"lat": 40.7, "lng": -74.0}, geohash="dr5regw")
+        store_event(sink, sink.known_events(), located)
+
+    result, stored = rerun(path, event())
+
+    assert result == "unchanged"
+    assert stored["geo"] == {"lat": 40.7, "lng": -74.0}
+    assert stored["geohash"] == "dr5regw"
+
+
+def test_geo_is_updated_when_the_run_computed_a_new_one(tmp_path):
+    path = str(tmp_path / "staging.sqlite")
+    with SQLiteSink(path) as sink:
+        store_event(sink, sink.known_events(), event(geo={"lat": 40.7, "lng": -74.0}))
+
+    result, stored = rerun(path, event(geo={"lat": 40.71, "lng": -74.01}))
+
+    assert result == "updated"
+    assert stored["geo"] == {"lat": 40.71, "lng": -74.01}
+
+
+def test_geo_is_cleared_when_the_location_moved_and_was_not_geocoded(tmp_path):
+    path = str(tmp_path / "staging.sqlite")
+    with SQLiteSink(path) as sink:
+        store_event(sink, sink.known_events(), event(geo={"lat": 40.7, "lng": -74.0}))
+
+    result, stored = rerun(path, event(location=HUDSON))
+
+    assert result == "updated"
+    assert stored["location"] == HUDSON
+    assert stored["geo"] is None
+
+
+def test_thumbnail_is_kept_when_the_run_did_not_make_one(tmp_path):
+    path = str(tmp_path / "staging.sqlite")
+    image = "https://cdn.example.com/market.jpg"
+    with SQLiteSink(path) as sink:
+        thumbnailed = event(image=image, thumbnail="/thumbnails/ab/ab.webp")
+        store_event(sink, sink.known_events(), thumbnailed)
+
+    result, stored = rerun(path, event(image=image))
+
+    assert result == "unchanged"
+    assert stored["thumbnail"] == "/thumbnails/ab/ab.webp"
+
+
+def test_thumbnail_is_cleared_when_the_image_changed_and_was_not_thumbnailed(tmp_path):
+    path = str(tmp_path / "staging.sqlite")
+    with SQLiteSink(path) as sink:
+        old = "https://cdn.example.com/old.jpg"
+        thumbnailed = event(image=old, thumbnail="/thumbnails/ab/ab.webp")
+        store_event(sink, sink.known_events(), thumbnailed)
+
+    result, stored = rerun(path, event(image="https://cdn.example.com/new.jpg"))
+
+    assert result == "updated"
+    assert stored["thumbnail"] is None
+
+
+def test_sync_leaves_out_local_thumbnail_paths(tmp_path):
+    staged = event(image="https://cdn.example.com/market.jpg", thumbnail="/thumbnails/ab/ab.webp")
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as staging:
+        store_event(staging, staging.known_events(), staged)
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as staging:
+        with SQLiteSink(str(tmp_path / "target.sqlite")) as target:
+            sync_staged(staging, target)
+            [(_, synced)] = target.events()
+
+    assert synced["image"] == "https://cdn.example.com/market.jpg"
+    assert "thumbnail" not in synced
+
+
+def test_sync_keeps_the_sources_of_a_merged_event(tmp_path):
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as staging:
+        known = staging.known_events()
+        store_event(staging, known, event(startDate=SCRAPED_AT))
+        duplicate = event(id="market-eventbrite", source="eventbrite", startDate=SCRAPED_AT)
+        assert store_event(staging, known, duplicate) == "merged"
+    with SQLiteSink(str(tmp_path / "staging.sqlite")) as staging:
+        with SQLiteSink(str(tmp_path / "target.sqlite")) as target:
+            sync_staged(staging, target)
+            [(_, synced)] = target.events()
+
+    assert synced["sources"] == ["zapp", "eventbrite"]
@@ -0,0 +1,38 @@
+import asyncio
+import os
+
+import fetcher
+from benchmark.replay_server import FIXTURES_DIR, VARIANT, ReplayServer
+from fetcher import AsyncFetcher
+from zapp_http import fetch_zapp_description, parse_zapp_event_page
+
+
+def recorded_event_page(variant="spring-fair"):
+    with open(os.path.join(FIXTURES_DIR, "zapp_event.html"), encoding="utf-8") as f:
+        return f.read().replace(VARIANT, variant).encode("utf-8")
+
+
+def test_parse_zapp_event_page_joins_every_section():
+    description = parse_zapp_event_page(recorded_event_page())
+
+    assert description.startswith("Annual outdoor fine art and craft festival.")
+    for section in ("General Information for", "Booth Information for", "Rules/Regulations for"):
+        assert f"{section} spring-fair" in description
+    # sections stay apart, same as the selenium path
+    assert description.count("\n\n") >= 3
+
+
+def test_parse_zapp_event_page_is_none_for_other_pages():
+    assert parse_zapp_event_page(b"<html><body><h1>Event not found</h1></body></html>") is None
+
+
+def test_fetch_zapp_description_over_http(monkeypatch):
+    async def fetch():
+        async with AsyncFetcher() as client:
+            return await fetch_zapp_description(client, "12345")
+
+    with ReplayServer(latency=0) as server:
+        monkeypatch.setattr(fetcher, "ORIGIN_OVERRIDES", server.origin_overrides())
+        description = asyncio.run(fetch())
+
+    assert "General Information for 12345" in description
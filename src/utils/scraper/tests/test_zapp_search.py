@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+import driver_pool
+import scraper
+from frontier import CrawlFrontier
+from known_events import KnownEvents
+
+
+class FakeLink:
+    def __init__(self, name, event_id):
+        self.text = name
+        self.event_id = event_id
+
+    def get_attribute(self, name):
+        return f"event-info.php?ID={self.event_id}"
+
+
+class FakeCard:
+    def __init__(self, name, event_id):
+        self.link = FakeLink(name, event_id)
+        self.stale = False
+
+    def is_enabled(self):
+        if self.stale:
+            raise StaleElementReferenceException()
+        return True
+
+    def find_element(self, by, selector):
+        if selector == "a.font-weight-bold.text":
+            return self.link
+        raise NoSuchElementException()
+
+
+class FakeSearchBox:
+    def __init__(self, driver):
+        self.driver = driver
+        self.typed = ""
+
+    def clear(self):
+        self.typed = ""
+
+    def send_keys(self, keys):
+        if keys == Keys.RETURN:
+            self.driver.search(self.typed)
+        else:
+            self.typed += keys
+
+
+class FakeDriver:
+    """
+    participating-events.php, vue mounts the listing after listing_polls
+    looks, a search sent before that is lost
+    """
+
+    def __init__(self, listing_polls=0, rerenders=True):
+        self.listing_polls = listing_polls
+        self.rerenders = rerenders
+        self.cards = [FakeCard("Spring Makers Market", "7100")]
+        self.search_box = FakeSearchBox(self)
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, selector):
+        if by == By.ID:
+            return self.search_box
+        cards = self.find_elements(by, selector)
+        if not cards:
+            raise NoSuchElementException()
+        return cards[0]
+
+    def find_elements(self, by, selector):
+        if self.listing_polls:
+            self.listing_polls -= 1
+            return []
+        return list(self.cards)
+
+    def search(self, keyword):
+        if self.listing_polls or not self.rerenders:
+            return
+        for card in self.cards:
+            card.stale = True
+        self.cards = [FakeCard(f"Holiday {keyword}", "7101")]
+
+
+class FakePool:
+    def __init__(self, driver):
+        self._driver = driver
+
+    @contextmanager
+    def driver(self):
+        yield self._driver
+
+
+@pytest.fixture
+def search(tmp_path, monkeypatch):
+    frontier = CrawlFrontier(str(tmp_path / "frontier.sqlite"))
+    frontier.start_run()
+    monkeypatch.setattr(scraper, "frontier", frontier)
+    # real waits, just short
+    monkeypatch.setattr(
+        scraper, "wait_for", lambda *args: driver_pool.wait_for(*args, timeout=2)
+    )
+    monkeypatch.setattr(
+        scraper,
+        "wait_until_stale",
+        lambda *args: driver_pool.wait_until_stale(*args, timeout=0.5),
+    )
+
+    def run(driver, keyword="market"):
+        found = scraper._search_zapp(FakePool(driver), keyword, KnownEvents())
+        return found, frontier.page_result("zapp", keyword)
+
+    return run
+
+
+def test_results_are_read_once_the_listing_is_replaced(search):
+    found, stored = search(FakeDriver(listing_polls=2))
+
+    assert [(event["name"], event["id"]) for event in found] == [("Holiday market", "7101")]
+    assert stored == found
+
+
+def test_listing_that_never_goes_stale_fails_the_search(search):
+    found, stored = search(FakeDriver(rerenders=False))
+
+    # not the unfiltered listing, and searched again next run
+    assert found == []
+    assert stored is None
+
+
+def test_listing_that_never_loads_fails_the_search(search):
+    driver = FakeDriver(listing_polls=10**6)
+    found, stored = search(driver)
+
+    assert found == []
+    assert stored is None
+    assert driver.search_box.typed == ""
@@ -0,0 +1,57 @@
+"""
+Plain HTTP side of the Zapplication scraper
+the participating events search is a Vue app, so keyword searches go through
+Selenium (scraper._search_zapp). event-info.php is rendered server side, so
+event pages come over plain http and are parsed here. The parser takes raw
+response bytes so it runs against recorded pages offline. A page that doesnt
+come back in the expected shape returns None and scrape_zapp visits it with
+Selenium instead
+"""
+
+from html_parser import make_soup
+
+ZAPP_EVENT_URL = "https://www.zapplication.org/event-info.php?ID={event_id}"
+
+# h2 headings whose next div makes up the description, same as the selenium path
+ZAPP_DESCRIPTION_HEADINGS = ["GENERAL INFORMATION", "BOOTH INFORMATION", "RULES/REGULATIONS"]
+
+
+def _next_div_text(heading):
+    div = heading.find_next_sibling("div")
+    return div.get_text("\n", strip=True) if div else ""
+
+
+# event-info.php html -> description, None if the page isnt what we expect
+def parse_zapp_event_page(content):
+    soup = make_soup(content)
+
+    description_sections = []
+    event_info = soup.find("h2", id="event-info")
+    if event_info:
+        description_sections.append(_next_div_text(event_info))
+
+    for heading in soup.find_all("h2"):
+        text = heading.get_text(strip=True)
+        if any(title in text for title in ZAPP_DESCRIPTION_HEADINGS):
+            description_sections.append(_next_div_text(heading))
+
+    # combine all, cuz zapp split them into different div
+    description = "\n\n".join(section for section in description_sections if section)
+
+    # use old method
+    if not description:
+        description = "\n\n".join(
+            div.get_text(strip=True)
+            for div in soup.select("div.my-4 div")
+            if div.get_text(strip=True)
+        )
+
+    return description or None
+
+
+async def fetch_zapp_description(fetcher, event_id):
+    url = ZAPP_EVENT_URL.format(event_id=event_id)
+    response = await fetcher.fetch(url)
+    if response is None or response.status_code != 200:
+        return None
+    return fetcher.parse_once(url, response, lambda r: parse_zapp_event_page(r.content))